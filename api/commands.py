@@ -0,0 +1,206 @@
+"""
+Per-device command queue
+Commands are stored as DeviceCommand rows. Devices fetch them by long-polling
+(deliver / wait_for_commands) and confirm each with acknowledge(). A command
+delivered but not acknowledged within COMMAND_ACK_TIMEOUT seconds is
+delivered again, up to COMMAND_MAX_ATTEMPTS times, then expires. The
+enqueue, delivery and ack times of every command give the per-device
+round-trip latency histograms of latency_report(). Commands are delivered
+highest priority first; preempt() queues a command ahead of everything and
+cancels what it supersedes.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from dashboard.channel_layers import device_group, get_channel_layer, group_send_sync
+
+from .models import DeviceCommand
+from .state import require_device
+
+# DeviceCommand.priority of commands that go ahead of everything else
+PRIORITY_EMERGENCY = 100
+
+# Upper bucket edges (ms, inclusive) of the round-trip histograms; the last bucket is open
+LATENCY_BUCKETS_MS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def ack_timeout() -> float:
+    return getattr(settings, 'COMMAND_ACK_TIMEOUT', 2.0)
+
+
+def max_attempts() -> int:
+    return getattr(settings, 'COMMAND_MAX_ATTEMPTS', 3)
+
+
+def command_group(device_id: str) -> str:
+    """Channel layer group of the long-polls waiting for a device's commands"""
+    return 'commands.' + device_group(device_id)
+
+
+def command_dict(command: DeviceCommand) -> Dict:
+    """JSON-ready view of a command, with its latencies (ms) once known"""
+    data = {
+        'command_id': command.pk,
+        'device_id': command.device_id,
+        'command': command.command,
+        'payload': command.payload,
+        'status': command.status,
+        'attempts': command.attempts,
+        'priority': command.priority,
+        'requested_at': command.requested_at,
+        'enqueued_at': command.enqueued_at,
+        'delivered_at': command.delivered_at,
+        'acked_at': command.acked_at,
+        'result': command.result,
+    }
+    if command.acked_at is not None:
+        data['round_trip_ms'] = round((command.acked_at - command.enqueued_at) * 1000, 2)
+    return data
+
+
+def enqueue(device_id: str, command: str, payload: Optional[Dict] = None, priority: int = 0,
+            requested_at: Optional[float] = None) -> DeviceCommand:
+    """Queue a command for a device and wake its waiting long-polls; UnknownDevice for an unregistered device"""
+    require_device(device_id)
+    queued = DeviceCommand.objects.create(device_id=device_id, command=command, payload=payload or {},
+                                          priority=priority, requested_at=requested_at, enqueued_at=time.time())
+    group_send_sync(command_group(device_id), {'type': 'command.queued', 'command_id': queued.pk})
+    return queued
+
+
+def preempt(device_id: str, command: str, payload: Optional[Dict] = None,
+            requested_at: Optional[float] = None) -> DeviceCommand:
+    """
+    Queue a command at PRIORITY_EMERGENCY, cancelling the device's lower-priority commands not yet acknowledged
+
+    Cancelled commands are neither delivered nor redelivered after it, so
+    nothing queued before an emergency stop can undo it.
+    """
+    with transaction.atomic():
+        DeviceCommand.objects.filter(device_id=device_id, status__in=('pending', 'delivered'),
+                                     priority__lt=PRIORITY_EMERGENCY).update(status='cancelled')
+        queued = DeviceCommand.objects.create(device_id=device_id, command=command, payload=payload or {},
+                                              priority=PRIORITY_EMERGENCY, requested_at=requested_at,
+                                              enqueued_at=time.time())
+    group_send_sync(command_group(device_id), {'type': 'command.queued', 'command_id': queued.pk})
+    return queued
+
+
+def deliver(device_id: str, limit: int = 20) -> List[DeviceCommand]:
+    """
+    Claim the device's commands that are due, highest priority then oldest first
+
+    Due are pending commands and delivered ones whose ack timed out. Each is
+    claimed with a compare-and-set on its attempt count, so concurrent polls
+    never hand out the same delivery twice. Commands out of attempts expire.
+    """
+    now = time.time()
+    overdue = Q(status='delivered', delivered_at__lt=now - ack_timeout())
+    DeviceCommand.objects.filter(overdue, device_id=device_id, attempts__gte=max_attempts()) \
+        .update(status='expired')
+    claimed = []
+    due = DeviceCommand.objects.filter(Q(status='pending') | overdue, device_id=device_id).order_by('-priority', 'id')
+    for command in due[:limit]:
+        if DeviceCommand.objects.filter(pk=command.pk, attempts=command.attempts, acked_at=None,
+                                        status__in=('pending', 'delivered')) \
+                .update(status='delivered', delivered_at=now, attempts=command.attempts + 1):
+            command.status, command.delivered_at, command.attempts = 'delivered', now, command.attempts + 1
+            claimed.append(command)
+    return claimed
+
+
+async def wait_for_commands(device_id: str, timeout: float, limit: int = 20) -> List[DeviceCommand]:
+    """
+    deliver(), waiting up to timeout seconds for a command to be due
+
+    Enqueued commands wake the wait through the channel layer (only within
+    the process with InMemoryChannelLayer); as a fallback the queue is
+    polled every COMMAND_POLL_INTERVAL seconds.
+    """
+    poll_interval = getattr(settings, 'COMMAND_POLL_INTERVAL', 0.25)
+    layer = get_channel_layer()
+    channel = await layer.new_channel()
+    await layer.group_add(command_group(device_id), channel)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            commands = await sync_to_async(deliver)(device_id, limit)
+            remaining = deadline - time.monotonic()
+            if commands or remaining <= 0:
+                return commands
+            try:
+                await asyncio.wait_for(layer.receive(channel), min(poll_interval, remaining))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await layer.group_discard(command_group(device_id), channel)
+
+
+def acknowledge(device_id: str, command_id: int, result: Optional[Dict] = None) -> Optional[DeviceCommand]:
+    """
+    Mark a delivered command acknowledged, returning it (None if the device has no such command)
+
+    Only the first ack counts; repeated acks after a redelivery are ignored,
+    and so are acks of commands that were cancelled or expired meanwhile.
+    """
+    now = time.time()
+    DeviceCommand.objects.filter(pk=command_id, device_id=device_id, status='delivered') \
+        .update(status='acked', acked_at=now, result=result)
+    return DeviceCommand.objects.filter(pk=command_id, device_id=device_id).first()
+
+
+def latency_report(device_ids: Optional[Sequence[str]] = None, since: Optional[float] = None) -> Dict[str, Dict]:
+    """
+    Round-trip latency (enqueue to ack, ms) histograms of acknowledged commands per device
+
+    Each device gets its count, quantiles, the share within
+    COMMAND_LATENCY_BUDGET_MS and counts per LATENCY_BUCKETS_MS bucket,
+    plus the delivery-to-ack quantiles (time spent on the device and the
+    way back).
+    """
+    budget = getattr(settings, 'COMMAND_LATENCY_BUDGET_MS', 100.0)
+    commands = DeviceCommand.objects.exclude(acked_at=None)
+    if device_ids:
+        commands = commands.filter(device_id__in=device_ids)
+    if since is not None:
+        commands = commands.filter(acked_at__gte=since)
+    rows = list(commands.order_by('device_id').values_list('device_id', 'enqueued_at', 'delivered_at', 'acked_at'))
+    if not rows:
+        return {}
+
+    devices = np.array([row[0] for row in rows], dtype=object)
+    times = np.array([row[1:] for row in rows], dtype=np.float64)
+    round_trip = (times[:, 2] - times[:, 0]) * 1000
+    ack = (times[:, 2] - times[:, 1]) * 1000
+    edges = np.array(LATENCY_BUCKETS_MS, dtype=np.float64)
+    labels = [f'<={bound}' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}']
+
+    report = {}
+    starts = np.flatnonzero(np.r_[True, devices[1:] != devices[:-1]])
+    for start, stop in zip(starts, np.r_[starts[1:], len(rows)]):
+        device_round_trip = round_trip[start:stop]
+        device_ack = ack[start:stop]
+        # Bucket i holds latencies up to and including edges[i] (np.histogram's bins are half-open)
+        counts = np.bincount(np.searchsorted(edges, device_round_trip, side='left'), minlength=len(labels))
+        p50, p95, p99 = np.percentile(device_round_trip, [50, 95, 99])
+        report[devices[start]] = {
+            'count': int(stop - start),
+            'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2),
+            'p99_ms': round(float(p99), 2),
+            'max_ms': round(float(device_round_trip.max()), 2),
+            'ack_p50_ms': round(float(np.percentile(device_ack, 50)), 2),
+            'ack_p95_ms': round(float(np.percentile(device_ack, 95)), 2),
+            'within_budget': round(float(np.mean(device_round_trip <= budget)), 4),
+            'budget_ms': budget,
+            'histogram': dict(zip(labels, counts.tolist())),
+        }
+    return report
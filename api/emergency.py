@@ -0,0 +1,190 @@
+"""
+Emergency-stop fast lane
+POST /api/emergency-stop/ is answered by a small handler in front of
+Django, in both the ASGI and WSGI applications: no middleware, URL
+resolution or session work. Under ASGI the stop runs on a thread reserved
+for it, so it never waits behind image analyses or PDF extraction in the
+shared thread pool of sync views. The stop is applied to the control state,
+broadcast to the device's WebSockets and queued ahead of everything else
+for the device. Every stop records when the request arrived, and
+emergency_timing() reports the server, delivery and end-to-end latencies.
+
+The endpoint takes {"device": "<device_id>"} (or ?device=) and, like the
+view it replaces, requires no session or CSRF token.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Sequence
+from urllib.parse import parse_qs
+
+import numpy as np
+from django.db import close_old_connections
+
+from dashboard.channel_layers import broadcast_state
+
+from .commands import command_dict, preempt
+from .models import DeviceCommand
+from .state import UnknownDevice, apply_command, default_device_id
+
+logger = logging.getLogger(__name__)
+
+EMERGENCY_STOP_PATH = '/api/emergency-stop/'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """The thread reserved for emergency stops in this process"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='emergency-stop')
+        return _executor
+
+
+def trigger(device_id: str, requested_at: Optional[float] = None) -> Dict:
+    """
+    Stop a device: control state, WebSocket broadcast and pre-empting queue entry
+
+    Returns the response payload, with the time spent since requested_at.
+    """
+    requested_at = requested_at or time.time()
+    success, message, state = apply_command(device_id, 'emergency_stop')
+    command = preempt(device_id, 'emergency_stop', requested_at=requested_at)
+    broadcast_state(device_id, state)
+    return {
+        'status': 'success' if success else 'error',
+        'message': message,
+        'device_state': state,
+        'command': command_dict(command),
+        'timing': {'server_ms': round((time.time() - requested_at) * 1000, 3)},
+    }
+
+
+def reserved_trigger(device_id: str, requested_at: float) -> Dict:
+    """trigger() as run on the reserved thread (get_executor())"""
+    # The reserved thread keeps its own connection; drop it if it went stale
+    close_old_connections()
+    return trigger(device_id, requested_at)
+
+
+def _request_device(body: bytes, query_string: str) -> str:
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        data = {}
+    device_id = data.get('device') if isinstance(data, dict) else None
+    return device_id or parse_qs(query_string).get('device', [None])[0] or default_device_id()
+
+
+METHOD_NOT_ALLOWED = (405, {'status': 'error', 'message': 'Invalid request method'})
+
+
+def _failure(device_id: str, error: Exception):
+    logger.exception(f"Emergency stop of {device_id} failed")
+    return 500, {'status': 'error', 'message': f'Emergency stop failed: {error}'}
+
+
+async def emergency_stop_asgi(scope, receive, send):
+    """ASGI handler of EMERGENCY_STOP_PATH; the stop runs on the reserved thread"""
+    requested_at = time.time()
+    body = b''
+    while True:
+        event = await receive()
+        body += event.get('body', b'')
+        if not event.get('more_body'):
+            break
+
+    if scope['method'] != 'POST':
+        status, payload = METHOD_NOT_ALLOWED
+    else:
+        device_id = _request_device(body, scope.get('query_string', b'').decode())
+        try:
+            payload = await asyncio.get_running_loop().run_in_executor(
+                get_executor(), reserved_trigger, device_id, requested_at)
+            status = 200
+        except UnknownDevice as e:
+            status, payload = 404, {'status': 'error', 'message': str(e)}
+        except Exception as e:
+            status, payload = _failure(device_id, e)
+    content = json.dumps(payload).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(content)).encode()),
+                            (b'cache-control', b'no-store')]})
+    await send({'type': 'http.response.body', 'body': content})
+
+
+def emergency_stop_wsgi(environ, start_response):
+    """WSGI handler of EMERGENCY_STOP_PATH; the stop runs in the request's own worker thread"""
+    requested_at = time.time()
+    if environ['REQUEST_METHOD'] != 'POST':
+        status, payload = METHOD_NOT_ALLOWED
+    else:
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        body = environ['wsgi.input'].read(length) if length else b''
+        device_id = _request_device(body, environ.get('QUERY_STRING', ''))
+        try:
+            status, payload = 200, trigger(device_id, requested_at)
+        except UnknownDevice as e:
+            status, payload = 404, {'status': 'error', 'message': str(e)}
+        except Exception as e:
+            status, payload = _failure(device_id, e)
+    content = json.dumps(payload).encode()
+    reasons = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+    start_response(f'{status} {reasons[status]}', [('Content-Type', 'application/json'),
+                                                   ('Content-Length', str(len(content))),
+                                                   ('Cache-Control', 'no-store')])
+    return [content]
+
+
+def emergency_timing(device_ids: Optional[Sequence[str]] = None, since: Optional[float] = None) -> Dict[str, Dict]:
+    """
+    Latencies (ms) of the timed emergency stops per device
+
+    server: request arrival to queued (state applied); delivery: queued to
+    handed to the device; end_to_end: request arrival to the device's ack.
+    Each has count, p50, p99 and max (worst case).
+    """
+    commands = DeviceCommand.objects.filter(command='emergency_stop').exclude(requested_at=None)
+    if device_ids:
+        commands = commands.filter(device_id__in=device_ids)
+    if since is not None:
+        commands = commands.filter(requested_at__gte=since)
+    rows = list(commands.order_by('device_id').values_list('device_id', 'requested_at', 'enqueued_at',
+                                                           'delivered_at', 'acked_at'))
+    if not rows:
+        return {}
+
+    # Rows are sorted by device: one set of arrays, sliced at the device boundaries (as in latency_report)
+    devices = np.array([row[0] for row in rows], dtype=object)
+    times = np.array([row[1:] for row in rows], dtype=np.float64)  # None (not yet delivered / acked) -> NaN
+    spans = {
+        'server': times[:, 1] - times[:, 0],
+        'delivery': times[:, 2] - times[:, 1],
+        'end_to_end': times[:, 3] - times[:, 0],
+    }
+    report = {}
+    starts = np.flatnonzero(np.r_[True, devices[1:] != devices[:-1]])
+    for start, stop in zip(starts, np.r_[starts[1:], len(rows)]):
+        device_id = devices[start]
+        report[device_id] = {'count': int(stop - start)}
+        for name, all_seconds in spans.items():
+            seconds = all_seconds[start:stop]
+            measured = seconds[~np.isnan(seconds)] * 1000
+            report[device_id][name] = {
+                'count': int(len(measured)),
+                'p50_ms': round(float(np.percentile(measured, 50)), 3) if len(measured) else None,
+                'p99_ms': round(float(np.percentile(measured, 99)), 3) if len(measured) else None,
+                'max_ms': round(float(measured.max()), 3) if len(measured) else None,
+            }
+    return report
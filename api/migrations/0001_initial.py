@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceControlState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=50, unique=True)),
+                ('is_running', models.BooleanField(default=False)),
+                ('power_level', models.IntegerField(default=85)),
+                ('calibrated', models.BooleanField(default=True)),
+                ('emergency_stop', models.BooleanField(default=False)),
+                ('last_command', models.CharField(blank=True, default='', max_length=20)),
+                ('last_command_time', models.FloatField(default=0)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceCommand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=50)),
+                ('command', models.CharField(max_length=50)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('delivered', 'Delivered'), ('acked', 'Acknowledged'), ('expired', 'Expired')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('enqueued_at', models.FloatField()),
+                ('delivered_at', models.FloatField(blank=True, null=True)),
+                ('acked_at', models.FloatField(blank=True, null=True)),
+                ('result', models.JSONField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['device_id', 'status', 'id'], name='api_devicec_device__c9f645_idx'), models.Index(fields=['device_id', 'acked_at'], name='api_devicec_device__6d326e_idx')],
+            },
+        ),
+    ]
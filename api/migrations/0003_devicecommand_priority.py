@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_devicecommand'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicecommand',
+            name='priority',
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='devicecommand',
+            name='requested_at',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='devicecommand',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('delivered', 'Delivered'), ('acked', 'Acknowledged'), ('expired', 'Expired'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+    ]
@@ -1,3 +1,52 @@
 from django.db import models
 
-# Create your models here.
+# Per-device control state shared by every worker (see api.state)
+class DeviceControlState(models.Model):
+    device_id = models.CharField(max_length=50, unique=True)  # BionicDevice.device_id
+    is_running = models.BooleanField(default=False)  # Start with device stopped
+    power_level = models.IntegerField(default=85)
+    calibrated = models.BooleanField(default=True)
+    emergency_stop = models.BooleanField(default=False)
+    last_command = models.CharField(max_length=20, blank=True, default='')
+    last_command_time = models.FloatField(default=0)  # epoch seconds
+
+    # Bumped by every transition; updates compare-and-set on it
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Control state v{self.version} - Device {self.device_id}"
+
+
+# Commands queued for delivery to a device (see api.commands)
+class DeviceCommand(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('acked', 'Acknowledged'),
+        ('expired', 'Expired'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    device_id = models.CharField(max_length=50)  # BionicDevice.device_id
+    command = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)  # deliveries so far
+    priority = models.SmallIntegerField(default=0)  # delivered highest first
+
+    # Epoch seconds, like DeviceControlState.last_command_time
+    requested_at = models.FloatField(null=True, blank=True)  # request arrival, when timed end to end
+    enqueued_at = models.FloatField()
+    delivered_at = models.FloatField(null=True, blank=True)  # last delivery
+    acked_at = models.FloatField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)  # reported by the device with its ack
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['device_id', 'status', 'id']),
+            models.Index(fields=['device_id', 'acked_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.command} #{self.pk} - Device {self.device_id} ({self.status})"
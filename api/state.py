@@ -0,0 +1,130 @@
+"""
+Per-device control state shared by all workers
+State lives in one DeviceControlState row per device_id instead of a
+module-level dict, so a command handled by one worker is seen by every
+other. Commands are applied as compare-and-set updates on the row version.
+Rows are only created for registered BionicDevices and the default device.
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+from dashboard.models import BionicDevice
+
+from .models import DeviceControlState
+
+# Keys of the device_state dict returned to clients
+STATE_FIELDS = ('device_id', 'is_running', 'power_level', 'calibrated', 'emergency_stop',
+                'last_command', 'last_command_time', 'version')
+
+# command: (precondition, failure message, field updates, success message)
+TRANSITIONS = {
+    'start': (lambda state: not state['emergency_stop'],
+              "Cannot start - Emergency stop is active. Please reset first.",
+              {'is_running': True},
+              "Bionic hand started successfully"),
+    'stop': (None, None,
+             {'is_running': False},
+             "Bionic hand stopped successfully"),
+    'emergency_stop': (None, None,
+                       {'is_running': False, 'emergency_stop': True},
+                       "Emergency stop activated"),
+    # Require explicit start after reset
+    'reset': (None, None,
+              {'emergency_stop': False, 'is_running': False},
+              "System reset completed. Ready to start."),
+    'calibrate': (lambda state: state['is_running'],
+                  "Device must be running to calibrate",
+                  {'calibrated': True},
+                  "Calibration completed successfully"),
+}
+
+# Attempts before a command that keeps losing the compare-and-set gives up
+MAX_ATTEMPTS = 20
+
+
+class StateConflict(Exception):
+    """Raised when a command names a state version that is no longer current"""
+
+
+class UnknownDevice(Exception):
+    """Raised for a device id that is neither a BionicDevice nor the default device"""
+
+
+def default_device_id() -> str:
+    """Device addressed by requests that do not name one"""
+    return getattr(settings, 'CONTROL_DEFAULT_DEVICE', 'default')
+
+
+def require_device(device_id: str):
+    """Raise UnknownDevice unless device_id is a registered BionicDevice or the default device"""
+    if device_id != default_device_id() and not BionicDevice.objects.filter(device_id=device_id).exists():
+        raise UnknownDevice(f"Unknown device {device_id}")
+
+
+def _select_sql() -> str:
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(DeviceControlState._meta.get_field(name).column) for name in STATE_FIELDS)
+    return f'SELECT {columns} FROM {quote(DeviceControlState._meta.db_table)} WHERE {quote("device_id")} = %s'
+
+
+_SELECT_SQL = None
+
+
+def _read(device_id: str) -> Optional[Dict]:
+    global _SELECT_SQL
+    if _SELECT_SQL is None:
+        _SELECT_SQL = _select_sql()
+    # Plain cursor: building the equivalent ORM query costs more than running it
+    with connection.cursor() as cursor:
+        cursor.execute(_SELECT_SQL, [device_id])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    state = dict(zip(STATE_FIELDS, row))
+    for name in ('is_running', 'calibrated', 'emergency_stop'):
+        state[name] = bool(state[name])
+    return state
+
+
+def get_state(device_id: str) -> Dict:
+    """Current control state of a device as a dict, created stopped on first use; UnknownDevice if there is none"""
+    state = _read(device_id)
+    if state is None:
+        require_device(device_id)
+        DeviceControlState.objects.get_or_create(device_id=device_id, defaults={'last_command_time': time.time()})
+        state = _read(device_id)
+    return state
+
+
+def apply_command(device_id: str, command: str, expected_version: Optional[int] = None) -> Tuple[bool, str, Dict]:
+    """
+    Apply a control command atomically, returning (success, message, state)
+
+    The precondition is checked against the state read, and the update only
+    succeeds if the row still has that version; otherwise the state is
+    re-read and the command re-evaluated. With expected_version the command
+    fails with StateConflict instead of being re-evaluated, for clients that
+    decided on the command from a state they saw.
+    """
+    if command not in TRANSITIONS:
+        raise KeyError(command)
+    precondition, refusal, updates, message = TRANSITIONS[command]
+    for _ in range(MAX_ATTEMPTS):
+        state = get_state(device_id)
+        if expected_version is not None and state['version'] != expected_version:
+            raise StateConflict(f"Device state is at version {state['version']}, not {expected_version}")
+        if precondition is not None and not precondition(state):
+            return False, refusal, state
+
+        changes = dict(updates, last_command=command, last_command_time=time.time(),
+                       version=state['version'] + 1)
+        if DeviceControlState.objects.filter(device_id=device_id, version=state['version']).update(**changes):
+            state.update(changes)
+            return True, message, state
+        if expected_version is not None:
+            raise StateConflict('Device state changed concurrently')
+    raise StateConflict(f'Could not apply {command}: device state kept changing')
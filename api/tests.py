@@ -1,3 +1,297 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from bionic_site.asgi import application
+
+from dashboard.tests import make_device
+
+from .commands import PRIORITY_EMERGENCY, acknowledge, deliver, enqueue, latency_report, preempt, wait_for_commands
+from .emergency import EMERGENCY_STOP_PATH, emergency_stop_wsgi, emergency_timing, trigger
+from .models import DeviceCommand, DeviceControlState
+from .state import StateConflict, UnknownDevice, apply_command, get_state
+
+
+class DeviceStateTests(TestCase):
+    """Per-device control state rows and their transitions"""
+
+    def setUp(self):
+        make_device('D1')
+
+    def test_rows_are_only_created_for_known_devices(self):
+        self.assertFalse(get_state('default')['is_running'])
+        self.assertEqual(get_state('D1')['version'], 0)
+        with self.assertRaises(UnknownDevice):
+            get_state('D9')
+        self.assertEqual(sorted(DeviceControlState.objects.values_list('device_id', flat=True)), ['D1', 'default'])
+
+    def test_transitions_and_preconditions(self):
+        self.assertEqual(apply_command('D1', 'calibrate')[:2],
+                         (False, "Device must be running to calibrate"))
+        success, _, state = apply_command('D1', 'start')
+        self.assertTrue(success and state['is_running'])
+        apply_command('D1', 'emergency_stop')
+        self.assertFalse(apply_command('D1', 'start')[0])
+        success, _, state = apply_command('D1', 'reset')
+        self.assertEqual((state['emergency_stop'], state['is_running'], state['version']), (False, False, 3))
+        # Devices do not share state
+        self.assertEqual(get_state('default')['version'], 0)
+
+    def test_expected_version_is_compared_and_set(self):
+        apply_command('D1', 'start', expected_version=0)
+        with self.assertRaises(StateConflict):
+            apply_command('D1', 'stop', expected_version=0)
+        self.assertTrue(get_state('D1')['is_running'])
+
+
+class DeviceControlApiTests(TestCase):
+    """The control and sensor endpoints addressing a device"""
+
+    def setUp(self):
+        make_device('D1')
+
+    def control(self, **data):
+        return self.client.post('/api/control/', json.dumps(data), content_type='application/json')
+
+    def test_commands_change_the_device_state(self):
+        result = self.control(device='D1', command='start').json()
+        self.assertTrue(result['success'])
+        self.assertEqual(result['device_state']['version'], 1)
+        self.assertTrue(self.client.get('/api/sensors/', {'device': 'D1'}).json()['is_running'])
+        self.assertFalse(self.client.get('/api/sensors/').json()['is_running'])
+
+    def test_stale_version_conflicts(self):
+        self.control(device='D1', command='start', version=0)
+        response = self.control(device='D1', command='stop', version=0)
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.json()['device_state']['is_running'])
+
+    def test_unknown_devices_get_404_without_a_state_row(self):
+        self.assertEqual(self.control(device='D9', command='start').status_code, 404)
+        self.assertEqual(self.client.get('/api/sensors/', {'device': 'D9'}).status_code, 404)
+        self.assertEqual(self.client.post('/dashboard/api/emergency-stop/', json.dumps({'device': 'D9'}),
+                                          content_type='application/json').status_code, 404)
+        self.assertFalse(DeviceControlState.objects.filter(device_id='D9').exists())
+
+
+class CommandQueueTests(TestCase):
+    """Delivery, acknowledgement and latency of queued device commands"""
+
+    def setUp(self):
+        make_device('D1')
+        make_device('D2')
+
+    def test_commands_are_only_queued_for_known_devices(self):
+        self.assertEqual(enqueue('default', 'start').device_id, 'default')
+        with self.assertRaises(UnknownDevice):
+            enqueue('D9', 'start')
+        self.assertFalse(DeviceCommand.objects.filter(device_id='D9').exists())
+
+    def test_delivery_order_and_claims(self):
+        low = enqueue('D1', 'calibrate')
+        high = enqueue('D1', 'stop', priority=5)
+        enqueue('D2', 'start')
+        self.assertEqual([command.pk for command in deliver('D1')], [high.pk, low.pk])
+        # Claimed commands are not handed out again until their ack is overdue
+        self.assertEqual(deliver('D1'), [])
+
+    @override_settings(COMMAND_ACK_TIMEOUT=-1, COMMAND_MAX_ATTEMPTS=2)
+    def test_unacknowledged_commands_are_redelivered_then_expire(self):
+        command = enqueue('D1', 'start')
+        self.assertEqual(len(deliver('D1')), 1)
+        self.assertEqual(deliver('D1')[0].attempts, 2)
+        self.assertEqual(deliver('D1'), [])
+        command.refresh_from_db()
+        self.assertEqual(command.status, 'expired')
+
+    def test_only_delivered_commands_are_acknowledged_once(self):
+        command = enqueue('D1', 'start')
+        self.assertIsNone(acknowledge('D1', command.pk).acked_at)
+        deliver('D1')
+        acked = acknowledge('D1', command.pk, {'ok': True})
+        self.assertEqual((acked.status, acked.result), ('acked', {'ok': True}))
+        self.assertEqual(acknowledge('D1', command.pk, {'ok': False}).acked_at, acked.acked_at)
+        self.assertIsNone(acknowledge('D2', command.pk))
+
+    def test_preempted_commands_stay_cancelled(self):
+        pending = enqueue('D1', 'start')
+        deliver('D1')
+        stop = preempt('D1', 'emergency_stop')
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'cancelled')
+        self.assertEqual(acknowledge('D1', pending.pk).status, 'cancelled')
+        self.assertEqual([command.pk for command in deliver('D1')], [stop.pk])
+
+    def test_latency_report(self):
+        for index, round_trip in enumerate((0.004, 0.030, 0.250)):
+            DeviceCommand.objects.create(device_id='D1', command='start', status='acked', enqueued_at=1000.0,
+                                         delivered_at=1000.0 + round_trip / 2, acked_at=1000.0 + round_trip)
+        enqueue('D1', 'stop')
+        with override_settings(COMMAND_LATENCY_BUDGET_MS=50.0):
+            report = latency_report()['D1']
+        self.assertEqual((report['count'], report['max_ms'], report['within_budget']), (3, 250.0, 0.6667))
+        self.assertEqual((report['histogram']['<=5'], report['histogram']['<=50'], report['histogram']['<=500']),
+                         (1, 1, 1))
+        self.assertEqual(latency_report(['D2']), {})
+        self.assertEqual(latency_report(since=2000.0), {})
+
+    def test_latencies_on_a_bucket_edge_count_in_that_bucket(self):
+        for round_trip in (0.5, 1.0, 6.0):
+            DeviceCommand.objects.create(device_id='D1', command='start', status='acked', enqueued_at=1000.0,
+                                         delivered_at=1000.0, acked_at=1000.0 + round_trip)
+        histogram = latency_report()['D1']['histogram']
+        self.assertEqual((histogram['<=500'], histogram['<=1000'], histogram['<=2000'], histogram['>5000']),
+                         (1, 1, 0, 1))
+        self.assertEqual(sum(histogram.values()), 3)
+
+
+@override_settings(COMMAND_POLL_INTERVAL=10)
+class CommandApiTests(TestCase):
+    """Command endpoints: control, long-poll, ack, status and latency"""
+
+    def setUp(self):
+        make_device('D1')
+
+    async def test_long_poll_wakes_on_enqueue(self):
+        waiting = asyncio.ensure_future(wait_for_commands('D1', 5))
+        await asyncio.sleep(0.05)
+        command = await sync_to_async(enqueue)('D1', 'start')
+        started = time.monotonic()
+        self.assertEqual([queued.pk for queued in await asyncio.wait_for(waiting, 5)], [command.pk])
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_control_round_trip(self):
+        response = self.client.post('/api/control/', json.dumps({'device': 'D1', 'command': 'start'}),
+                                    content_type='application/json')
+        queued = response.json()['command']
+        self.assertEqual((queued['command'], queued['status']), ('start', 'pending'))
+
+        polled = self.client.get('/api/commands/poll/', {'device': 'D1', 'timeout': 0}).json()['commands']
+        self.assertEqual([command['command_id'] for command in polled], [queued['command_id']])
+        ack_url = f"/api/commands/{queued['command_id']}/ack/"
+        response = self.client.post(ack_url, json.dumps({'device': 'D1', 'result': {'ok': True}}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['command']['status'], 'acked')
+        self.assertIn('round_trip_ms', response.json()['command'])
+        status = self.client.get(f"/api/commands/{queued['command_id']}/").json()['command']
+        self.assertEqual(status['result'], {'ok': True})
+        latency = self.client.get('/api/commands/latency/', {'device': 'D1'}).json()
+        self.assertEqual(latency['devices']['D1']['count'], 1)
+
+    def ack(self, command_id, body=''):
+        return self.client.post(f'/api/commands/{command_id}/ack/?device=D1', body, content_type='application/json')
+
+    def test_control_of_unknown_devices_is_refused(self):
+        response = self.client.post('/dashboard/api/device-control/', json.dumps({'device': 'D9', 'type': 'grip'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/dashboard/api/device/reconnect/', json.dumps({'device': 'D9'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(DeviceCommand.objects.exists())
+        response = self.client.post('/dashboard/api/device-control/', json.dumps({'device': 'D1', 'type': 'grip'}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['command']['payload'], {'value': None})
+
+    def test_ack_errors(self):
+        command = enqueue('D1', 'start')
+        response = self.ack(command.pk)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['message'], 'Command is pending, not delivered')
+        self.assertEqual(self.ack(999).status_code, 404)
+        self.assertEqual(self.ack(command.pk, 'x').status_code, 400)
+        self.assertEqual(self.client.get('/api/commands/999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/commands/poll/', {'timeout': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/commands/latency/', {'window': 'day'}).status_code, 400)
+
+
+def wsgi_request(method='POST', body=b'', query=''):
+    """Call the WSGI emergency-stop handler, returning (status line, JSON payload)"""
+    started = {}
+    environ = {'REQUEST_METHOD': method, 'CONTENT_LENGTH': str(len(body)), 'QUERY_STRING': query,
+               'wsgi.input': io.BytesIO(body)}
+    content = b''.join(emergency_stop_wsgi(environ, lambda status, headers: started.update(status=status)))
+    return started['status'], json.loads(content)
+
+
+class EmergencyStopTests(TestCase):
+    """The emergency-stop fast lane under WSGI and its timing report"""
+
+    def setUp(self):
+        make_device('D1')
+
+    def test_stop_preempts_queued_commands(self):
+        apply_command('D1', 'start')
+        pending = enqueue('D1', 'calibrate')
+        status, payload = wsgi_request(body=json.dumps({'device': 'D1'}).encode())
+        self.assertEqual((status, payload['status']), ('200 OK', 'success'))
+        self.assertTrue(payload['device_state']['emergency_stop'])
+        self.assertEqual(payload['command']['priority'], PRIORITY_EMERGENCY)
+        self.assertGreaterEqual(payload['timing']['server_ms'], 0)
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'cancelled')
+        self.assertEqual([command.command for command in deliver('D1')], ['emergency_stop'])
+
+    def test_method_and_device_errors(self):
+        self.assertEqual(wsgi_request('GET')[0], '405 Method Not Allowed')
+        self.assertEqual(wsgi_request(query='device=D9')[0], '404 Not Found')
+        self.assertEqual(wsgi_request(body=b'not json', query='device=D1')[1]['device_state']['device_id'], 'D1')
+        self.assertFalse(DeviceControlState.objects.filter(device_id='D9').exists())
+
+    def test_timing_report(self):
+        rows = [('D1', 100.0, 100.002, 100.010, 100.050), ('D1', 200.0, 200.004, None, None),
+                ('D2', 300.0, 300.001, 300.003, 300.020)]
+        for device_id, requested, enqueued, delivered, acked in rows:
+            DeviceCommand.objects.create(device_id=device_id, command='emergency_stop', priority=PRIORITY_EMERGENCY,
+                                         requested_at=requested, enqueued_at=enqueued, delivered_at=delivered,
+                                         acked_at=acked)
+        enqueue('D1', 'emergency_stop')  # not timed
+        report = emergency_timing()
+        self.assertEqual(set(report), {'D1', 'D2'})
+        self.assertEqual(report['D1']['count'], 2)
+        self.assertEqual(report['D1']['server']['max_ms'], 4.0)
+        self.assertEqual((report['D1']['delivery']['count'], report['D1']['end_to_end']['max_ms']), (1, 50.0))
+        self.assertEqual(report['D2']['end_to_end']['p50_ms'], 20.0)
+        self.assertEqual(set(emergency_timing(['D2'])), {'D2'})
+        self.assertEqual(emergency_timing(since=250.0)['D2']['count'], 1)
+
+        response = self.client.get('/api/emergency-stop/timing/', {'device': 'D2'})
+        self.assertEqual(set(response.json()['devices']), {'D2'})
+        self.assertEqual(self.client.get('/api/emergency-stop/timing/', {'window': 'hour'}).status_code, 400)
+
+
+class EmergencyStopAsgiTests(TransactionTestCase):
+    """The ASGI fast lane, whose stops run on the reserved thread"""
+
+    def setUp(self):
+        make_device('D1')
+
+    async def request(self, method='POST', body=b''):
+        events = []
+        receive = mock.AsyncMock(return_value={'type': 'http.request', 'body': body})
+        scope = {'type': 'http', 'method': method, 'path': EMERGENCY_STOP_PATH, 'query_string': b''}
+
+        async def send(event):
+            events.append(event)
+        await application(scope, receive, send)
+        return events[0]['status'], json.loads(events[1]['body'])
+
+    async def test_stop_runs_on_the_reserved_thread(self):
+        threads = []
+
+        def recorded_trigger(*args):
+            threads.append(threading.current_thread().name)
+            return trigger(*args)
+        with mock.patch('api.emergency.trigger', side_effect=recorded_trigger):
+            status, payload = await self.request(body=b'{"device": "D1"}')
+        self.assertEqual((status, payload['device_state']['emergency_stop']), (200, True))
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('emergency-stop'))
+        self.assertEqual((await self.request(body=b'{"device": "D9"}'))[0], 404)
+        self.assertEqual((await self.request('GET'))[0], 405)
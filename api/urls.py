@@ -4,4 +4,10 @@ from . import views
 urlpatterns = [
     path('sensors/', views.sensor_data, name='sensor_data'),
     path('control/', views.device_control, name='device_control'),
+    # POST emergency-stop/ itself is served ahead of Django (api.emergency)
+    path('emergency-stop/timing/', views.emergency_stop_timing, name='emergency_stop_timing'),
+    path('commands/poll/', views.command_poll, name='command_poll'),
+    path('commands/latency/', views.command_latency, name='command_latency'),
+    path('commands/<int:command_id>/', views.command_status, name='command_status'),
+    path('commands/<int:command_id>/ack/', views.command_ack, name='command_ack'),
 ]
@@ -5,18 +5,35 @@ import json
 import random
 import time
 
-# Global device state
-device_state = {
-    "is_running": False,  # Start with device stopped
-    "power_level": 85,
-    "calibrated": True,
-    "emergency_stop": False,
-    "last_command_time": time.time()
-}
+from dashboard.channel_layers import broadcast_state
+from dashboard.live import latest_reading
+from dashboard.telemetry import FINGER_CHANNELS
+
+from .commands import acknowledge, command_dict, enqueue, latency_report, wait_for_commands
+from .emergency import emergency_timing, trigger
+from .models import DeviceCommand
+from .state import StateConflict, TRANSITIONS, UnknownDevice, apply_command, default_device_id, get_state
+
+# Longest a command long-poll may wait (seconds)
+COMMAND_POLL_MAX_TIMEOUT = 30.0
+
+def _unknown_device(error):
+    return JsonResponse({"success": False, "message": str(error)}, status=404)
+
+def _current_state(device_id):
+    """get_state for error responses, None for an unknown device"""
+    try:
+        return get_state(device_id)
+    except UnknownDevice:
+        return None
 
 def sensor_data(request):
     """Returns dummy IoT sensor data for the bionic hand"""
-    global device_state
+    device_id = request.GET.get('device') or default_device_id()
+    try:
+        device_state = get_state(device_id)
+    except UnknownDevice as e:
+        return _unknown_device(e)
     
     # If device is stopped, return static/minimal data
     if not device_state["is_running"] or device_state["emergency_stop"]:
@@ -32,12 +49,29 @@ def sensor_data(request):
         }
         return JsonResponse(data)
     
-    # Normal operation - return dynamic sensor data
+    # Normal operation - latest ingested reading of ?device=<device_id> if there is one
+    reading = latest_reading(device_id) if request.GET.get('device') else None
+    if reading is not None:
+        grip_force = reading["grip_force"]
+        data = {
+            "flex_sensor": [reading[finger] for finger in FINGER_CHANNELS],
+            "emg_signal": reading["emg_signal"],
+            "grip_force": grip_force,
+            "temperature": reading["temperature"],
+            "hand_status": "Open" if grip_force < 10 else "Closing" if grip_force < 50 else "Closed",
+            "timestamp": reading["timestamp"],
+            "device_state": device_state,
+            "is_running": device_state["is_running"],
+            "emergency_stop": device_state["emergency_stop"]
+        }
+        return JsonResponse(data)
+
+    # No live data - return dynamic demo sensor data
     data = {
         "flex_sensor": [random.randint(0, 90) for _ in range(5)],  # 5 fingers
         "emg_signal": random.randint(100, 500),
         "grip_force": random.randint(0, 100),
-        "temperature": random.uniform(25.0, 40.0),
+        "temperature": round(random.uniform(25.0, 40.0), 1),
         "hand_status": random.choice(["Open", "Closing", "Closed"]),
         "device_state": device_state,
         "is_running": device_state["is_running"],
@@ -49,87 +83,126 @@ def sensor_data(request):
 @require_http_methods(["POST"])
 def device_control(request):
     """Handle device control commands"""
-    global device_state
-    
+    device_id = request.GET.get('device') or default_device_id()
     try:
         data = json.loads(request.body)
+        device_id = data.get('device') or device_id
         command = data.get('command')
-        
-        if command == 'start':
-            if device_state["emergency_stop"]:
-                return JsonResponse({
-                    "success": False, 
-                    "message": "Cannot start - Emergency stop is active. Please reset first.",
-                    "device_state": device_state
-                })
-            device_state["is_running"] = True
-            device_state["last_command_time"] = time.time()
-            return JsonResponse({
-                "success": True, 
-                "message": "Bionic hand started successfully",
-                "device_state": device_state
-            })
-            
-        elif command == 'stop':
-            device_state["is_running"] = False
-            device_state["last_command_time"] = time.time()
-            return JsonResponse({
-                "success": True, 
-                "message": "Bionic hand stopped successfully",
-                "device_state": device_state
-            })
-            
-        elif command == 'emergency_stop':
-            device_state["is_running"] = False
-            device_state["emergency_stop"] = True
-            device_state["last_command_time"] = time.time()
-            return JsonResponse({
-                "success": True, 
-                "message": "Emergency stop activated",
-                "device_state": device_state
-            })
-            
-        elif command == 'reset':
-            device_state["emergency_stop"] = False
-            device_state["is_running"] = False  # Require explicit start after reset
-            device_state["last_command_time"] = time.time()
-            return JsonResponse({
-                "success": True, 
-                "message": "System reset completed. Ready to start.",
-                "device_state": device_state
-            })
-            
-        elif command == 'calibrate':
-            if not device_state["is_running"]:
-                return JsonResponse({
-                    "success": False, 
-                    "message": "Device must be running to calibrate",
-                    "device_state": device_state
-                })
-            device_state["calibrated"] = True
-            device_state["last_command_time"] = time.time()
-            return JsonResponse({
-                "success": True, 
-                "message": "Calibration completed successfully",
-                "device_state": device_state
-            })
-            
-        else:
+        if command not in TRANSITIONS:
             return JsonResponse({
                 "success": False, 
                 "message": "Unknown command",
-                "device_state": device_state
+                "device_state": get_state(device_id)
             })
+
+        if command == 'emergency_stop':
+            stop = trigger(device_id)
+            return JsonResponse({
+                "success": stop["status"] == "success",
+                "message": stop["message"],
+                "device_state": stop["device_state"],
+                "command": stop["command"]
+            })
+
+        version = int(data['version']) if data.get('version') is not None else None
+        success, message, device_state = apply_command(device_id, command, version)
+        queued = None
+        if success:
+            # The device gets the change through its command queue and acks it there
+            queued = command_dict(enqueue(device_id, command))
+            broadcast_state(device_id, device_state)
+        return JsonResponse({
+            "success": success, 
+            "message": message,
+            "device_state": device_state,
+            "command": queued
+        })
             
+    except UnknownDevice as e:
+        return _unknown_device(e)
+    except StateConflict as e:
+        return JsonResponse({
+            "success": False, 
+            "message": str(e),
+            "device_state": _current_state(device_id)
+        }, status=409)
     except json.JSONDecodeError:
         return JsonResponse({
             "success": False, 
             "message": "Invalid JSON data",
-            "device_state": device_state
+            "device_state": _current_state(device_id)
         })
     except Exception as e:
         return JsonResponse({
             "success": False, 
             "message": f"Error: {str(e)}",
-            "device_state": device_state
+            "device_state": _current_state(device_id)
         })
+
+@require_http_methods(["GET"])
+async def command_poll(request):
+    """Long-poll for a device's due commands; returns as soon as there are any, or empty after ?timeout= seconds"""
+    device_id = request.GET.get('device') or default_device_id()
+    try:
+        timeout = min(max(float(request.GET.get('timeout', 25)), 0.0), COMMAND_POLL_MAX_TIMEOUT)
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({"success": False, "message": "timeout and limit must be numbers"}, status=400)
+
+    commands = await wait_for_commands(device_id, timeout, limit)
+    return JsonResponse({
+        "success": True,
+        "device_id": device_id,
+        "commands": [command_dict(command) for command in commands]
+    })
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def command_ack(request, command_id):
+    """Acknowledge a delivered command, optionally with the device's result"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return JsonResponse({"success": False, "message": "Invalid JSON data"}, status=400)
+    device_id = data.get('device') or request.GET.get('device') or default_device_id()
+    command = acknowledge(device_id, command_id, data.get('result'))
+    if command is None:
+        return JsonResponse({"success": False, "message": "Unknown command"}, status=404)
+    if command.acked_at is None:
+        return JsonResponse({"success": False, "message": f"Command is {command.status}, not delivered",
+                             "command": command_dict(command)}, status=409)
+    return JsonResponse({"success": True, "command": command_dict(command)})
+
+@require_http_methods(["GET"])
+def command_status(request, command_id):
+    """Status and timestamps of a queued command"""
+    command = DeviceCommand.objects.filter(pk=command_id).first()
+    if command is None:
+        return JsonResponse({"success": False, "message": "Unknown command"}, status=404)
+    return JsonResponse({"success": True, "command": command_dict(command)})
+
+@require_http_methods(["GET"])
+def command_latency(request):
+    """Per-device command round-trip latency histograms (?device= repeatable, ?window= seconds)"""
+    try:
+        window = float(request.GET['window']) if request.GET.get('window') else None
+    except ValueError:
+        return JsonResponse({"success": False, "message": "window must be a number of seconds"}, status=400)
+    since = time.time() - window if window is not None else None
+    return JsonResponse({
+        "success": True,
+        "devices": latency_report(request.GET.getlist('device'), since)
+    })
+
+@require_http_methods(["GET"])
+def emergency_stop_timing(request):
+    """Server, delivery and end-to-end latency of timed emergency stops per device (?device=, ?window= seconds)"""
+    try:
+        window = float(request.GET['window']) if request.GET.get('window') else None
+    except ValueError:
+        return JsonResponse({"success": False, "message": "window must be a number of seconds"}, status=400)
+    since = time.time() - window if window is not None else None
+    return JsonResponse({
+        "success": True,
+        "devices": emergency_timing(request.GET.getlist('device'), since)
+    })
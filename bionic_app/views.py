@@ -8,7 +8,10 @@ from django.http import JsonResponse
 from datetime import datetime
 import json
 
+from dashboard.writer import bulk_insert
+
 from .forms import ContactForm, ComponentForm, ResearchUploadForm
+from .models import SimulationLog
 from . import firebase_config as fb
 
 def home(request):
@@ -92,6 +95,9 @@ def simulation(request):
         
         # Save to Firestore
         doc_id = fb.add_document('simulation_logs', log_data)
+
+        # Local copy for the admin, queued to the batching writer without waiting
+        bulk_insert([SimulationLog(action=action, user=log_data['user'], firestore_id=doc_id)], wait=False)
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({
@@ -13,4 +13,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bionic_site.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from api.emergency import EMERGENCY_STOP_PATH, emergency_stop_asgi  # noqa: E402
+from dashboard.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    HTTP (and lifespan) go to Django, WebSocket connections to the device
+    endpoint and emergency stops to their fast lane, ahead of any middleware
+    """
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    elif scope['type'] == 'http' and scope['path'] == EMERGENCY_STOP_PATH:
+        await emergency_stop_asgi(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
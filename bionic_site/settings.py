@@ -43,6 +43,8 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'bionic_app',
+    'dashboard',
+    'api',
 ]
 
 MIDDLEWARE = [
@@ -85,6 +87,25 @@ DATABASES = {
     }
 }
 
+# SQLite tuning applied to every connection, see dashboard/db_profile.py:
+# 'default' (SQLite defaults) or 'performance' (WAL, synchronous=NORMAL, mmap,
+# 64 MB page cache, telemetry inserts through one batching writer thread)
+DB_PROFILE = os.getenv('BIONIC_DB_PROFILE', 'default')
+
+# 'notifications' holds the per-user poll state (ETag token, unread count) of
+# dashboard/notification_store.py; it must be shared by all worker processes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'notifications': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        # Inside the project (Django creates it owner-only), not the shared system temp dir
+        'LOCATION': os.getenv('NOTIFICATIONS_CACHE_DIR', str(BASE_DIR / 'cache' / 'notifications')),
+        'TIMEOUT': 24 * 3600,
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -8,6 +8,8 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/', include('api.urls')),
+    path('dashboard/', include('dashboard.urls')),
     path('', include('bionic_app.urls')),
 ]
 
@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     Patient, Doctor, BionicDevice, SensorReading,
     MedicalRecord, Prescription, Appointment,
-    DeviceAnalytics, Notification
+    DeviceAnalytics, DeviceRollup, Notification, ReadingPartition
 )
 
 # Patient Admin
@@ -36,6 +36,11 @@ class SensorReadingAdmin(admin.ModelAdmin):
     search_fields = ['device__device_id']
     date_hierarchy = 'timestamp'
 
+    def changelist_view(self, request, extra_context=None):
+        # Only the default partition; monthly partitions are listed under Reading partitions
+        extra_context = {'title': 'Sensor readings stored before partitioning', **(extra_context or {})}
+        return super().changelist_view(request, extra_context)
+
 # Medical Record Admin
 @admin.register(MedicalRecord)
 class MedicalRecordAdmin(admin.ModelAdmin):
@@ -68,6 +73,20 @@ class DeviceAnalyticsAdmin(admin.ModelAdmin):
     search_fields = ['device__device_id']
     date_hierarchy = 'date'
 
+# Device Rollup Admin
+@admin.register(DeviceRollup)
+class DeviceRollupAdmin(admin.ModelAdmin):
+    list_display = ['device', 'resolution', 'bucket_start', 'reading_count', 'grip_count', 'error_count']
+    list_filter = ['resolution', 'bucket_start']
+    search_fields = ['device__device_id']
+    date_hierarchy = 'bucket_start'
+
+# Readings Partition Admin
+@admin.register(ReadingPartition)
+class ReadingPartitionAdmin(admin.ModelAdmin):
+    list_display = ['table_name', 'month', 'first_id', 'min_timestamp', 'max_timestamp', 'sealed_at']
+    readonly_fields = ['table_name', 'month', 'first_id', 'min_timestamp', 'max_timestamp', 'sealed_at']
+
 # Notification Admin
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
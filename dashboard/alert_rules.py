@@ -0,0 +1,235 @@
+"""
+Declarative alert rules over telemetry batches
+A rule names a channel, a comparator and a threshold, how long (seconds)
+the condition must hold before it alerts and how long (seconds) the rule
+stays quiet for a device afterwards. The rule set is compiled once into
+arrays, so one batch is checked against every rule for every device with a
+few NumPy operations over a (readings x rules) matrix: adding rules adds
+columns, not Python work per reading.
+"""
+
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .models import BionicDevice, Notification
+from .notification_dispatch import dispatch
+from .telemetry import now_epoch
+
+COMPARATORS = ('<', '<=', '>', '>=', '==', '!=')
+
+
+class AlertRule(NamedTuple):
+    """One alert condition: channel <comparator> threshold held for duration seconds"""
+    name: str
+    channel: str
+    comparator: str
+    threshold: float
+    duration: float = 0.0
+    cooldown: float = 300.0
+    notification_type: str = 'error'
+    title: str = ''
+
+
+DEFAULT_ALERT_RULES = (
+    AlertRule('battery_low', 'battery_level', '<', 20.0, cooldown=1800.0,
+              notification_type='battery_low', title='Low battery'),
+    AlertRule('overheating', 'temperature', '>', 40.0, duration=5.0, title='High temperature'),
+    AlertRule('grip_overload', 'grip_force', '>', 95.0, duration=1.0, title='Grip force overload'),
+    AlertRule('slow_response', 'response_time_ms', '>', 100.0, duration=10.0, title='Slow control response'),
+    # Server metrics, checked by SystemHealthView rather than on telemetry
+    AlertRule('high_cpu', 'cpu_usage', '>', 80.0, title='High CPU usage'),
+)
+
+
+def rules_from_settings() -> List[AlertRule]:
+    """ALERT_RULES (AlertRule objects or dicts of their fields), or DEFAULT_ALERT_RULES"""
+    return [rule if isinstance(rule, AlertRule) else AlertRule(**rule)
+            for rule in getattr(settings, 'ALERT_RULES', DEFAULT_ALERT_RULES)]
+
+
+class RuleSet:
+    """
+    Rules compiled into column arrays
+
+    values() lays a {channel: values} batch out as a (readings x rules)
+    matrix and match() checks all of it at once; channels a batch does not
+    carry (and NaN readings) never match.
+    """
+
+    def __init__(self, rules: Sequence[AlertRule]):
+        for rule in rules:
+            if rule.comparator not in COMPARATORS:
+                raise ValueError(f"Alert rule {rule.name}: unknown comparator {rule.comparator!r}")
+        self.rules = list(rules)
+        self.channels = list(dict.fromkeys(rule.channel for rule in self.rules))
+        self.columns = np.array([self.channels.index(rule.channel) for rule in self.rules], dtype=np.intp)
+        self.thresholds = np.array([rule.threshold for rule in self.rules], dtype=np.float64)
+        self.durations = np.array([rule.duration for rule in self.rules], dtype=np.float64)
+        self.cooldowns = np.array([rule.cooldown for rule in self.rules], dtype=np.float64)
+        comparators = np.array([rule.comparator for rule in self.rules])
+        # One mask per sign of value - threshold: which rules accept below / equal / above
+        self.below = np.isin(comparators, ('<', '<=', '!='))
+        self.equal = np.isin(comparators, ('<=', '>=', '=='))
+        self.above = np.isin(comparators, ('>', '>=', '!='))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def values(self, channels: Dict[str, np.ndarray], size: int) -> np.ndarray:
+        """(size x rules) matrix of each rule's channel"""
+        values = np.full((size, len(self.channels)), np.nan)
+        for index, channel in enumerate(self.channels):
+            if channel in channels:
+                values[:, index] = channels[channel]
+        return values[:, self.columns]
+
+    def match(self, values: np.ndarray) -> np.ndarray:
+        """Which of values() meet their rule's condition"""
+        sign = np.sign(values - self.thresholds)
+        return ((sign < 0) & self.below) | ((sign == 0) & self.equal) | ((sign > 0) & self.above)
+
+
+class RuleEngine:
+    """
+    Stateful evaluation of a RuleSet on the ingest stream
+
+    Per device and rule it keeps when the condition started to hold (NaN
+    while it does not), so durations span batches, and the wall-clock time
+    before which the rule stays quiet. A rule raises at most one alert per
+    device per batch, for the first reading at which it had held long enough.
+
+    The state lives in this process, like the anomaly detector's.
+    """
+
+    def __init__(self, rules: Optional[Sequence[AlertRule]] = None):
+        self.ruleset = RuleSet(rules if rules is not None else rules_from_settings())
+        self._rows: Dict[int, int] = {}
+        self.since = np.zeros((0, len(self.ruleset)))
+        self.quiet_until = np.zeros((0, len(self.ruleset)))
+        self._lock = threading.Lock()
+
+    def _state_rows(self, device_pks: np.ndarray) -> np.ndarray:
+        rows = np.array([self._rows.setdefault(pk, len(self._rows)) for pk in device_pks.tolist()], dtype=np.intp)
+        if len(self._rows) > len(self.since):
+            grow = max(16, len(self._rows), len(self.since))
+            self.since = np.vstack([self.since, np.full((grow, len(self.ruleset)), np.nan)])
+            self.quiet_until = np.vstack([self.quiet_until, np.zeros((grow, len(self.ruleset)))])
+        return rows
+
+    def observe(self, device_pks: np.ndarray, timestamps: np.ndarray, channels: Dict[str, np.ndarray]) -> List[Dict]:
+        """Check a batch against every rule and fold it into the state; returns the alerts raised"""
+        if not len(device_pks) or not len(self.ruleset):
+            return []
+        order = np.lexsort((timestamps, device_pks))
+        pks = np.asarray(device_pks)[order]
+        times = np.asarray(timestamps, dtype=np.float64)[order]
+        values = self.ruleset.values({name: np.asarray(column, dtype=np.float64)[order]
+                                      for name, column in channels.items()}, len(pks))
+        matched = self.ruleset.match(values)
+
+        rule_columns = np.arange(len(self.ruleset))
+        device_starts = np.r_[0, np.flatnonzero(np.diff(pks)) + 1]
+        device_stops = np.r_[device_starts[1:], len(pks)]
+        first = np.zeros(len(pks), dtype=bool)
+        first[device_starts] = True
+        now = now_epoch()
+
+        with self._lock:
+            device_rows = self._state_rows(pks[device_starts])
+            rows = np.repeat(device_rows, device_stops - device_starts)
+
+            # Each reading's run of matches started at the latest reading that matched
+            # after one that did not (or at the device's first reading in the batch)
+            starts = matched.copy()
+            starts[1:] &= ~matched[:-1] | first[1:, None]
+            start = np.maximum.accumulate(np.where(starts, np.arange(len(pks))[:, None], 0), axis=0)
+            run_since = times[start]
+            # A run open at the device's first reading may have started in an earlier batch
+            carried = self.since[rows[start], rule_columns]
+            run_since = np.where(first[start] & ~np.isnan(carried), carried, run_since)
+            run_since[~matched] = np.nan
+            held = matched & (times[:, None] - run_since >= self.ruleset.durations)
+
+            self.since[device_rows] = run_since[device_stops - 1]
+
+            # Per device and rule: held readings and the first of them
+            counts = np.add.reduceat(held.astype(np.int64), device_starts, axis=0)
+            firsts = np.minimum.reduceat(np.where(held, np.arange(len(pks))[:, None], len(pks)), device_starts, axis=0)
+            raise_ = (counts > 0) & (now >= self.quiet_until[device_rows])
+            self.quiet_until[device_rows] = np.where(raise_, now + self.ruleset.cooldowns,
+                                                     self.quiet_until[device_rows])
+
+        alerts = []
+        for device, column in zip(*np.nonzero(raise_)):
+            at = firsts[device, column]
+            rule = self.ruleset.rules[column]
+            alerts.append({
+                'device': int(pks[at]),
+                'rule': rule,
+                'value': float(values[at, column]),
+                'since': float(run_since[at, column]),
+                'timestamp': float(times[at]),
+                'count': int(counts[device, column]),
+            })
+        return alerts
+
+
+def snapshot_alerts(metrics: Dict[str, float], ruleset: Optional[RuleSet] = None) -> List[Dict]:
+    """
+    Rules met by one set of current values (e.g. the system health
+    components), without durations, cooldowns or state
+    """
+    ruleset = ruleset or get_engine().ruleset
+    values = ruleset.values({name: np.array([value], dtype=np.float64) for name, value in metrics.items()}, 1)
+    return [{'rule': ruleset.rules[column], 'value': float(values[0, column])}
+            for column in np.flatnonzero(ruleset.match(values)[0])]
+
+
+def describe(rule: AlertRule, value: float) -> str:
+    """One-line message of an alert"""
+    return f"{rule.channel.replace('_', ' ').capitalize()} is {value:g} ({rule.comparator} {rule.threshold:g})"
+
+
+def rule_notifications(alerts: List[Dict]) -> List[Tuple[str, Notification]]:
+    """(device id, Notification) events for the patients of the alerting devices (one query)"""
+    if not alerts:
+        return []
+    devices = {pk: (device_id, user_id) for pk, device_id, user_id in
+               BionicDevice.objects.filter(pk__in={alert['device'] for alert in alerts})
+               .values_list('pk', 'device_id', 'patient__user_id')}
+    notifications = []
+    for alert in alerts:
+        if alert['device'] not in devices:
+            continue
+        device_id, user_id = devices[alert['device']]
+        rule = alert['rule']
+        held = f" for {alert['timestamp'] - alert['since']:.0f} s" if rule.duration else ''
+        notifications.append((device_id, Notification(
+            user_id=user_id,
+            notification_type=rule.notification_type,
+            title=f"{rule.title or rule.name} on {device_id}",
+            message=f"{describe(rule, alert['value'])}{held} "
+                    f"({alert['count']} reading(s) in this batch).",
+        )))
+    return notifications
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> RuleEngine:
+    """The rule engine of this process, created on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RuleEngine()
+        return _engine
+
+
+def check_rules(device_pks: np.ndarray, timestamps: np.ndarray, channels: Dict[str, np.ndarray]) -> int:
+    """Check an ingested batch against the alert rules and dispatch their Notifications; returns how many"""
+    return dispatch(rule_notifications(get_engine().observe(device_pks, timestamps, channels)))
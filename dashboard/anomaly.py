@@ -0,0 +1,218 @@
+"""
+Online anomaly detection on the telemetry ingest stream
+Keeps exponentially weighted mean and variance per device per channel in
+flat NumPy arrays and scores every ingested batch against them, so the cost
+per reading is constant and no reading history is ever queried
+"""
+
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .models import BionicDevice, Notification
+from .notification_dispatch import dispatch
+from .telemetry import now_epoch
+
+ANOMALY_CHANNELS = ('temperature', 'grip_force', 'emg_signal', 'battery_level')
+
+# Hard limits per channel as (low, high); None disables that side. Fixed
+# thresholds are alert rules by default (dashboard.alert_rules), so none here
+DEFAULT_LIMITS = {}
+
+# Smallest standard deviation used for z-scores, about one sensor step, so a
+# channel that sat still (e.g. an integer battery level) does not flag every change
+MIN_STD = {
+    'temperature': 0.2,
+    'grip_force': 1.0,
+    'emg_signal': 5.0,
+    'battery_level': 2.0,
+}
+
+CHANNEL_LABELS = {
+    'temperature': ('Temperature', '°C'),
+    'grip_force': ('Grip force', 'N'),
+    'emg_signal': ('EMG signal', 'µV'),
+    'battery_level': ('Battery level', '%'),
+}
+
+
+def _linear_recurrence(drive: np.ndarray, beta: float, initial: np.ndarray, block: int) -> np.ndarray:
+    """Solve y[t] = beta * y[t - 1] + drive[t] along axis 0, starting from y[-1] = initial"""
+    out = np.empty_like(drive)
+    state = initial
+    for start in range(0, len(drive), block):
+        segment = drive[start:start + block]
+        powers = beta ** np.arange(1, len(segment) + 1)[:, None]
+        values = powers * (state + np.cumsum(segment / powers, axis=0))
+        out[start:start + len(segment)] = values
+        state = values[-1]
+    return out
+
+
+class AnomalyDetector:
+    """
+    EWMA z-score and hard-limit detector for ANOMALY_CHANNELS
+
+    For every device the detector holds, per channel, the EWMA mean and
+    variance and the wall-clock time before which no new alert is raised.
+    A batch is scored reading by reading against the state just before it
+    (computed for the whole batch at once as a first-order linear
+    recurrence), then folded into the state. At most one Notification per
+    device and channel is created per batch, and none inside the cooldown.
+
+    The state lives in this process; with several workers each one learns
+    from the batches it ingests.
+    """
+
+    def __init__(self, alpha: Optional[float] = None, z_threshold: Optional[float] = None,
+                 warmup: Optional[int] = None, cooldown: Optional[float] = None,
+                 limits: Optional[Dict] = None):
+        self.alpha = alpha or getattr(settings, 'ANOMALY_EWMA_ALPHA', 0.02)
+        self.z_threshold = z_threshold or getattr(settings, 'ANOMALY_Z_THRESHOLD', 5.0)
+        # Readings seen before z-scores are trusted
+        self.warmup = warmup if warmup is not None else getattr(settings, 'ANOMALY_WARMUP', 100)
+        self.cooldown = cooldown if cooldown is not None else getattr(settings, 'ANOMALY_COOLDOWN', 300.0)
+        limits = limits or getattr(settings, 'ANOMALY_LIMITS', DEFAULT_LIMITS)
+        self.low = np.array([_limit(limits, channel, 0, -np.inf) for channel in ANOMALY_CHANNELS])
+        self.high = np.array([_limit(limits, channel, 1, np.inf) for channel in ANOMALY_CHANNELS])
+        self.min_std = np.array([MIN_STD[channel] for channel in ANOMALY_CHANNELS])
+        # Keep beta ** -block well inside float64 range
+        self._block = max(1, int(200 / -math.log(1 - self.alpha)))
+
+        self._rows: Dict[int, int] = {}
+        self.mean = np.zeros((0, len(ANOMALY_CHANNELS)))
+        self.var = np.zeros((0, len(ANOMALY_CHANNELS)))
+        self.count = np.zeros(0, dtype=np.int64)
+        self.quiet_until = np.zeros((0, len(ANOMALY_CHANNELS)))
+        self._lock = threading.Lock()
+
+    def _row(self, device_pk: int) -> int:
+        row = self._rows.get(device_pk)
+        if row is None:
+            row = self._rows[device_pk] = len(self._rows)
+            if row == len(self.count):
+                grow = max(16, len(self.count))
+                self.mean = np.vstack([self.mean, np.zeros((grow, len(ANOMALY_CHANNELS)))])
+                self.var = np.vstack([self.var, np.zeros((grow, len(ANOMALY_CHANNELS)))])
+                self.count = np.concatenate([self.count, np.zeros(grow, dtype=np.int64)])
+                self.quiet_until = np.vstack([self.quiet_until, np.zeros((grow, len(ANOMALY_CHANNELS)))])
+        return row
+
+    def observe(self, device_pks: np.ndarray, timestamps: np.ndarray, channels: Dict[str, np.ndarray]) -> List[Dict]:
+        """Score a batch and fold it into the state; returns the alerts raised (already cooled down)"""
+        if not len(device_pks):
+            return []
+        order = np.lexsort((timestamps, device_pks))
+        pks = np.asarray(device_pks)[order]
+        values = np.column_stack([np.asarray(channels[name], dtype=np.float64)[order] for name in ANOMALY_CHANNELS])
+        times = np.asarray(timestamps)[order]
+        boundaries = np.flatnonzero(np.diff(pks)) + 1
+
+        alerts = []
+        now = now_epoch()
+        with self._lock:
+            for start, stop in zip(np.r_[0, boundaries], np.r_[boundaries, len(pks)]):
+                alerts.extend(self._score_device(int(pks[start]), values[start:stop], times[start:stop], now))
+        return alerts
+
+    def _score_device(self, device_pk: int, x: np.ndarray, times: np.ndarray, now: float) -> List[Dict]:
+        row = self._row(device_pk)
+        alpha, beta = self.alpha, 1 - self.alpha
+        seen = self.count[row]
+        if seen == 0:
+            self.mean[row] = x[0]
+
+        # Mean after each reading, and the mean each reading was predicted from
+        means = _linear_recurrence(alpha * x, beta, self.mean[row], self._block)
+        prior_means = np.vstack([self.mean[row], means[:-1]])
+        deviation = x - prior_means
+        # Incremental EW variance: v[t] = beta * (v[t - 1] + alpha * d[t] ** 2)
+        variances = _linear_recurrence(alpha * beta * deviation ** 2, beta, self.var[row], self._block)
+        prior_vars = np.vstack([self.var[row], variances[:-1]])
+
+        z = np.abs(deviation) / np.maximum(np.sqrt(prior_vars), self.min_std)
+        trusted = (seen + np.arange(len(x)) >= self.warmup)[:, None]
+        spike = trusted & (z > self.z_threshold)
+        breach = (x < self.low) | (x > self.high)
+
+        self.mean[row] = means[-1]
+        self.var[row] = variances[-1]
+        self.count[row] = seen + len(x)
+
+        alerts = []
+        for column in np.flatnonzero((spike | breach).any(axis=0)):
+            if now < self.quiet_until[row, column]:
+                continue
+            hits = np.flatnonzero(breach[:, column] | spike[:, column])
+            # Report a limit breach over a z-score spike when the batch has both
+            breaches = np.flatnonzero(breach[:, column])
+            first = breaches[0] if len(breaches) else hits[0]
+            self.quiet_until[row, column] = now + self.cooldown
+            alerts.append({
+                'device': device_pk,
+                'channel': ANOMALY_CHANNELS[column],
+                'kind': 'limit' if breach[first, column] else 'zscore',
+                'value': float(x[first, column]),
+                'expected': float(prior_means[first, column]),
+                'z': float(z[first, column]),
+                'timestamp': float(times[first]),
+                'count': int(len(hits)),
+            })
+        return alerts
+
+
+def _limit(limits: Dict, channel: str, side: int, default: float) -> float:
+    value = limits.get(channel, (None, None))[side]
+    return default if value is None else value
+
+
+def alert_notifications(alerts: List[Dict]) -> List[Tuple[str, Notification]]:
+    """(device id, Notification) events for the patients of the alerting devices (one query)"""
+    if not alerts:
+        return []
+    devices = {pk: (device_id, user_id) for pk, device_id, user_id in
+               BionicDevice.objects.filter(pk__in={alert['device'] for alert in alerts})
+               .values_list('pk', 'device_id', 'patient__user_id')}
+    notifications = []
+    for alert in alerts:
+        if alert['device'] not in devices:
+            continue
+        device_id, user_id = devices[alert['device']]
+        label, unit = CHANNEL_LABELS[alert['channel']]
+        if alert['channel'] == 'battery_level' and alert['kind'] == 'limit':
+            notification_type, title = 'battery_low', f'Low battery on {device_id}'
+        else:
+            notification_type, title = 'error', f'{label} anomaly on {device_id}'
+        if alert['kind'] == 'limit':
+            detail = 'outside the safe range'
+        else:
+            detail = f"{alert['z']:.1f} standard deviations from the usual {alert['expected']:.1f} {unit}"
+        notifications.append((device_id, Notification(
+            user_id=user_id,
+            notification_type=notification_type,
+            title=title,
+            message=f"{label} read {alert['value']:.1f} {unit}, {detail} "
+                    f"({alert['count']} reading(s) in this batch).",
+        )))
+    return notifications
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector() -> AnomalyDetector:
+    """The detector of this process, created on first use"""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = AnomalyDetector()
+        return _detector
+
+
+def check_batch(device_pks: np.ndarray, timestamps: np.ndarray, channels: Dict[str, np.ndarray]) -> int:
+    """Score an ingested batch and dispatch a Notification per new alert; returns how many were raised"""
+    return dispatch(alert_notifications(get_detector().observe(device_pks, timestamps, channels)))
@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+
+        from .db_profile import apply_pragmas
+        from .models import BionicDevice, Notification
+        from .notification_store import notification_deleted, notification_saved
+        from .partitions import create_partitions, delete_device_readings
+
+        connection_created.connect(apply_pragmas, dispatch_uid='dashboard.apply_pragmas')
+        pre_delete.connect(delete_device_readings, sender=BionicDevice, dispatch_uid='dashboard.delete_device_readings')
+        post_migrate.connect(create_partitions, sender=self, dispatch_uid='dashboard.create_partitions')
+        post_save.connect(notification_saved, sender=Notification, dispatch_uid='dashboard.notification_saved')
+        post_delete.connect(notification_deleted, sender=Notification, dispatch_uid='dashboard.notification_deleted')
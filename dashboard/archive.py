@@ -0,0 +1,238 @@
+"""
+Tiered retention for sensor readings
+Expired SensorReading partitions are moved into compressed columnar files,
+one per device per UTC day:
+
+    <TELEMETRY_ARCHIVE_DIR>/<device pk>/<YYYY-MM-DD>.npz
+
+Each file holds one array per column (id, timestamp, the float32 channels,
+battery_level, is_calibrated, error_code) sorted by timestamp. The files are
+deflate-compressed, so a reader decompresses only the columns it asks for.
+"""
+
+import os
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max, QuerySet
+
+from .models import ReadingPartition, SensorReading
+from .partitions import expired_default_rows, get_router, partition_model
+from .rollups import RollupEngine
+from .telemetry import ERROR_CODE_DTYPE, SENSOR_CHANNELS, datetimes_to_epoch, epoch_to_datetimes
+
+ARCHIVE_COLUMNS = ('id', 'timestamp') + SENSOR_CHANNELS + ('battery_level', 'is_calibrated', 'error_code')
+DAY_SECONDS = 86400
+
+
+def archive_root() -> str:
+    return str(getattr(settings, 'TELEMETRY_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'telemetry_archive')))
+
+
+def day_path(device_pk: int, day: date) -> str:
+    return os.path.join(archive_root(), str(device_pk), f'{day.isoformat()}.npz')
+
+
+def archived_days(device_pk: int, start: Optional[float] = None, end: Optional[float] = None) -> List[date]:
+    """Archived UTC days of a device overlapping [start, end), oldest first"""
+    directory = os.path.join(archive_root(), str(device_pk))
+    if not os.path.isdir(directory):
+        return []
+    first = _epoch_day(start) if start is not None else date.min
+    last = _epoch_day(end) if end is not None else date.max
+    days = []
+    for name in os.listdir(directory):
+        if not name.endswith('.npz'):
+            continue
+        try:
+            day = date.fromisoformat(name[:-4])
+        except ValueError:
+            continue
+        if first <= day <= last:
+            days.append(day)
+    return sorted(days)
+
+
+def read_day(device_pk: int, day: date, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Requested columns of one archived device-day"""
+    with np.load(day_path(device_pk, day)) as data:
+        return {column: data[column] for column in columns}
+
+
+def iter_range(device_pk: int, start: float, end: float, columns: Sequence[str]) -> Iterator[Dict[str, np.ndarray]]:
+    """Archived columns of a device in [start, end), one device-day at a time, oldest first"""
+    wanted = ['id', 'timestamp'] + [column for column in columns if column not in ('id', 'timestamp')]
+    for day in archived_days(device_pk, start, end):
+        data = read_day(device_pk, day, wanted)
+        inside = (data['timestamp'] >= start) & (data['timestamp'] < end)
+        yield {column: data[column][inside] for column in wanted}
+
+
+def read_range(device_pk: int, start: float, end: float, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Archived columns of a device in [start, end), oldest first; always includes id and timestamp"""
+    wanted = ['id', 'timestamp'] + [column for column in columns if column not in ('id', 'timestamp')]
+    parts = {column: [] for column in wanted}
+    for data in iter_range(device_pk, start, end, columns):
+        for column in wanted:
+            parts[column].append(data[column])
+    return {column: np.concatenate(values) if values else np.empty(0) for column, values in parts.items()}
+
+
+def _epoch_day(timestamp: float) -> date:
+    return datetime.fromtimestamp(timestamp, timezone.utc).date()
+
+
+def _write_day(device_pk: int, day: date, columns: Dict[str, np.ndarray]):
+    """Write (or merge into) a device-day file; rows already archived are kept once"""
+    path = day_path(device_pk, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        existing = read_day(device_pk, day, ARCHIVE_COLUMNS)
+        columns = {column: np.concatenate([existing[column], columns[column]]) for column in ARCHIVE_COLUMNS}
+        _, unique = np.unique(columns['id'], return_index=True)
+        columns = {column: values[unique] for column, values in columns.items()}
+
+    order = np.argsort(columns['timestamp'], kind='stable')
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(handle, 'wb') as output:
+        np.savez_compressed(output, **{column: values[order] for column, values in columns.items()})
+    os.replace(temporary, path)
+
+
+class RetentionPolicy:
+    """
+    Moves expired reading partitions into the per-device-day archive
+
+    Retention works on whole partitions (see dashboard.partitions): a sealed
+    month whose newest reading is older than the cutoff is rolled up device
+    by device, written to the archive one device-day at a time and then
+    dropped as a table, so no rows are ever deleted one by one. In the
+    default partition only the expired readings that existed when the run
+    started are archived, and exactly those are then deleted. Re-running
+    after an interruption merges into the existing files without
+    duplicating rows.
+    """
+
+    def __init__(self, retain_days: Optional[int] = None, chunk_size: Optional[int] = None):
+        self.retain_days = retain_days if retain_days is not None else \
+            getattr(settings, 'TELEMETRY_RETENTION_DAYS', 30)
+        self.chunk_size = chunk_size or 20000
+
+    def cutoff(self, now: Optional[float] = None) -> float:
+        """Start of the oldest UTC day kept in the hot partitions, as epoch seconds"""
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        return (now // DAY_SECONDS - self.retain_days) * DAY_SECONDS
+
+    def expired(self, cutoff: float) -> List[Tuple[Optional[ReadingPartition], QuerySet]]:
+        """
+        (partition, readings) of every partition holding only readings before
+        cutoff, then (None, expired readings) of the default partition
+        """
+        expired = []
+        for partition in get_router().partitions():
+            if partition.sealed_at is None:
+                continue
+            if partition.max_timestamp is None or partition.max_timestamp.timestamp() < cutoff:
+                expired.append((partition, partition_model(partition.table_name).objects.all()))
+        last_id = SensorReading.objects.aggregate(last=Max('id'))['last']
+        if last_id is not None:
+            rows = expired_default_rows(epoch_to_datetimes([cutoff])[0], last_id)
+            if rows.exists():
+                expired.append((None, rows))
+        return expired
+
+    def run(self, dry_run: bool = False) -> Dict:
+        cutoff = self.cutoff()
+        expired = self.expired(cutoff)
+        summary = {
+            'cutoff': epoch_to_datetimes([cutoff])[0].isoformat(),
+            'partitions': [readings.model._meta.db_table for _, readings in expired],
+            'devices': 0, 'days': 0, 'readings': 0,
+        }
+        if dry_run:
+            summary['readings'] = sum(readings.count() for _, readings in expired)
+            return summary
+
+        rollups = RollupEngine()
+        devices = set()
+        for partition, rows in expired:
+            for device_pk in sorted(rows.order_by().values_list('device_id', flat=True).distinct()):
+                rollups.rollup_device(device_pk)
+                days, readings = self.archive_device(rows, device_pk)
+                devices.add(device_pk)
+                summary['days'] += days
+                summary['readings'] += readings
+            if partition is None:
+                # Exactly the rows archived above, in one DELETE
+                rows.delete()
+            else:
+                get_router().drop(partition)
+        summary['devices'] = len(devices)
+        return summary
+
+    def archive_device(self, readings: QuerySet, device_pk: int) -> Tuple[int, int]:
+        """
+        Write the readings of one device in a partition's queryset to the archive, returning (days, readings)
+
+        Rows stream in timestamp order, so each device-day is complete (and
+        written) as soon as the next day starts; memory holds one device-day.
+        """
+        rows = (readings
+                .filter(device_id=device_pk)
+                .order_by('timestamp', 'id')
+                .values_list(*ARCHIVE_COLUMNS)
+                .iterator(chunk_size=self.chunk_size))
+        days = readings = 0
+        pending, pending_day = [], None
+        for batch in _chunked(rows, self.chunk_size):
+            columns = self._columns(batch)
+            day_numbers = (columns['timestamp'] // DAY_SECONDS).astype(np.int64)
+            cuts = np.flatnonzero(np.diff(day_numbers)) + 1
+            for start, stop in zip(np.r_[0, cuts].tolist(), np.r_[cuts, len(day_numbers)].tolist()):
+                day = int(day_numbers[start])
+                if pending and day != pending_day:
+                    readings += self._write_pending(device_pk, pending_day, pending)
+                    days += 1
+                    pending = []
+                pending_day = day
+                pending.append({column: values[start:stop] for column, values in columns.items()})
+        if pending:
+            readings += self._write_pending(device_pk, pending_day, pending)
+            days += 1
+        return days, readings
+
+    def _write_pending(self, device_pk: int, day_number: int, parts: List[Dict[str, np.ndarray]]) -> int:
+        columns = _concat(parts)
+        _write_day(device_pk, date(1970, 1, 1) + timedelta(days=day_number), columns)
+        return len(columns['id'])
+
+    def _columns(self, batch: List[tuple]) -> Dict[str, np.ndarray]:
+        values = list(zip(*batch))
+        columns = {
+            'id': np.array(values[0], dtype=np.int64),
+            'timestamp': datetimes_to_epoch(values[1]),
+        }
+        for channel, column in zip(SENSOR_CHANNELS, values[2:2 + len(SENSOR_CHANNELS)]):
+            columns[channel] = np.array(column, dtype=np.float64).astype(np.float32)
+        columns['battery_level'] = np.array(values[-3], dtype=np.uint8)
+        columns['is_calibrated'] = np.array(values[-2], dtype=bool)
+        columns['error_code'] = np.array([code or '' for code in values[-1]], dtype=ERROR_CODE_DTYPE)
+        return columns
+
+
+def _chunked(rows, size: int) -> Iterator[List[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _concat(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    return {column: np.concatenate([part[column] for part in parts]) for column in ARCHIVE_COLUMNS}
@@ -0,0 +1,134 @@
+"""
+Channel layers for the device WebSocket endpoint
+A channel layer delivers messages to named channels and to groups of them;
+the WebSocket of each connection has one channel, in the group of its
+device. InMemoryChannelLayer only reaches connections in the same process.
+Multi-process deployments set CHANNEL_LAYER to a layer with the same
+interface, for example
+    CHANNEL_LAYER = {'BACKEND': 'channels_redis.core.RedisChannelLayer',
+                     'CONFIG': {'hosts': [('localhost', 6379)]}}
+"""
+
+import asyncio
+import hashlib
+import threading
+import uuid
+from typing import Dict, Set, Tuple
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class InMemoryChannelLayer:
+    """
+    Channel layer of one process
+
+    Each channel is an asyncio queue of capacity messages bound to the event
+    loop that created it; when a receiver falls behind its oldest message is
+    dropped. Messages can be sent from any thread. A channel is forgotten
+    once it is discarded from its last group.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self._channels: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = {}
+        self._groups: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    async def new_channel(self, prefix: str = 'specific') -> str:
+        name = f'{prefix}.inmemory!{uuid.uuid4().hex}'
+        with self._lock:
+            self._channels[name] = (asyncio.get_running_loop(), asyncio.Queue(self.capacity))
+        return name
+
+    async def send(self, channel: str, message: Dict):
+        self.deliver(channel, message)
+
+    async def receive(self, channel: str) -> Dict:
+        with self._lock:
+            _, queue = self._channels[channel]
+        return await queue.get()
+
+    async def group_add(self, group: str, channel: str):
+        with self._lock:
+            self._groups.setdefault(group, set()).add(channel)
+
+    async def group_discard(self, group: str, channel: str):
+        with self._lock:
+            members = self._groups.get(group)
+            if members is not None:
+                members.discard(channel)
+                if not members:
+                    del self._groups[group]
+            if not any(channel in members for members in self._groups.values()):
+                self._channels.pop(channel, None)
+
+    async def group_send(self, group: str, message: Dict):
+        self.deliver_group(group, message)
+
+    async def flush(self):
+        with self._lock:
+            self._channels.clear()
+            self._groups.clear()
+
+    def deliver(self, channel: str, message: Dict):
+        """send() without an event loop; messages to unknown channels are dropped"""
+        with self._lock:
+            target = self._channels.get(channel)
+        if target is not None and not target[0].is_closed():
+            loop, queue = target
+            loop.call_soon_threadsafe(_put_latest, queue, message)
+
+    def deliver_group(self, group: str, message: Dict):
+        """group_send() without an event loop"""
+        with self._lock:
+            members = list(self._groups.get(group, ()))
+        for channel in members:
+            self.deliver(channel, message)
+
+
+def _put_latest(queue: asyncio.Queue, message: Dict):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+def device_group(device_id: str) -> str:
+    """
+    Group of the connections of a device
+
+    Group names allow only [A-Za-z0-9_.-] and fewer than 100 characters, so
+    the name carries a digest of the id: one group per device, whatever
+    characters or length the id has.
+    """
+    return 'device.' + hashlib.sha1(device_id.encode()).hexdigest()
+
+
+_layer = None
+_layer_lock = threading.Lock()
+
+
+def get_channel_layer():
+    """The configured channel layer of this process (InMemoryChannelLayer by default)"""
+    global _layer
+    with _layer_lock:
+        if _layer is None:
+            config = getattr(settings, 'CHANNEL_LAYER', {})
+            backend = import_string(config.get('BACKEND', 'dashboard.channel_layers.InMemoryChannelLayer'))
+            _layer = backend(**config.get('CONFIG', {}))
+        return _layer
+
+
+def group_send_sync(group: str, message: Dict):
+    """group_send() from sync code"""
+    layer = get_channel_layer()
+    if isinstance(layer, InMemoryChannelLayer):
+        layer.deliver_group(group, message)
+    else:
+        async_to_sync(layer.group_send)(group, message)
+
+
+def broadcast_state(device_id: str, device_state: Dict):
+    """Push a device's new control state to its WebSocket connections, from sync code"""
+    group_send_sync(device_group(device_id), {'type': 'device.state', 'device_state': device_state})
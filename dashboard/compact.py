@@ -0,0 +1,252 @@
+"""
+Compact live telemetry frames
+Live views can ask for readings as delta-encoded fixed-point rows instead
+of one JSON object per reading. A stream's first frame names the fields
+and their decimal places; after that every row is
+
+    [dt, mask, value, ...]
+
+with dt the milliseconds since the previous row (since the epoch for the
+first), mask the bit set of fields (bit i for fields[i]) that changed and,
+in field order, the change of each of them as an integer in units of
+10**-decimals. A field going from or to unmeasured (NaN, e.g. IMU channels)
+is sent as null or as its full value. The binary variant packs the same
+rows as varints (see encode_binary); decode and decode_binary invert them.
+
+error_code is an index into the stream's table of error codes (0 for
+none): a frame that uses a code for the first time lists it under
+"codes", and the codes of a stream are numbered from 1 in that order.
+"""
+
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .telemetry import CHANNEL_DECIMALS, SENSOR_CHANNELS
+
+COMPACT_FIELDS = SENSOR_CHANNELS + ('battery_level', 'is_calibrated', 'error_code')
+COMPACT_DECIMALS = tuple(CHANNEL_DECIMALS.get(field, 0) for field in COMPACT_FIELDS)
+ERROR_CODE_FIELD = COMPACT_FIELDS.index('error_code')
+
+# Binary body: header, the new error codes, then the rows as varints (see encode_binary)
+COMPACT_MAGIC = b'QXCF'
+COMPACT_VERSION = 2
+COMPACT_HEADER = struct.Struct('<4sBBIH')
+COMPACT_CONTENT_TYPE = 'application/x-quantumix-compact'
+
+_SCALES = np.array([10.0 ** decimals for decimals in COMPACT_DECIMALS])
+
+
+class CompactError(ValueError):
+    """Raised when a binary compact frame is malformed"""
+
+
+def quantize(readings: np.ndarray, codes: Dict[bytes, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+    """
+    Timestamps (ms) and fixed-point field values (rows x fields) of
+    SENSOR_DTYPE readings, with the NaN mask and the error codes added to
+    codes (code: index) for them
+    """
+    timestamps = np.round(readings['timestamp'] * 1000).astype(np.int64)
+    values = np.empty((len(readings), len(COMPACT_FIELDS)), dtype=np.float64)
+    for index, channel in enumerate(SENSOR_CHANNELS):
+        values[:, index] = readings[channel]
+    base = len(SENSOR_CHANNELS)
+    values[:, base] = readings['battery_level']
+    values[:, base + 1] = readings['is_calibrated']
+    added = []
+    unique, inverse = np.unique(readings['error_code'], return_inverse=True)
+    for code in unique.tolist():
+        if code and code not in codes:
+            codes[code] = len(codes) + 1
+            added.append(code.decode())
+    values[:, ERROR_CODE_FIELD] = np.array([codes.get(code, 0) for code in unique.tolist()],
+                                           dtype=np.float64)[inverse.reshape(-1)]
+    nulls = np.isnan(values)
+    fixed = np.round(np.where(nulls, 0.0, values) * _SCALES).astype(np.int64)
+    return timestamps, fixed, nulls, added
+
+
+class CompactEncoder:
+    """
+    Delta encoder of one stream
+
+    Keeps the last row sent and the error codes numbered so far, so each
+    frame only carries what changed since the previous frame of the same
+    stream. header() is sent with the first frame.
+    """
+
+    def __init__(self):
+        self.last_timestamp = 0
+        self.last_values = np.zeros(len(COMPACT_FIELDS), dtype=np.int64)
+        self.last_nulls = np.ones(len(COMPACT_FIELDS), dtype=bool)
+        self.codes: Dict[bytes, int] = {}
+        self.started = False
+
+    @staticmethod
+    def header() -> Dict:
+        return {'fields': list(COMPACT_FIELDS), 'decimals': list(COMPACT_DECIMALS)}
+
+    def _deltas(self, readings: np.ndarray):
+        timestamps, values, nulls, added = quantize(readings, self.codes)
+        previous = np.vstack([self.last_values, values[:-1]])
+        previous_nulls = np.vstack([self.last_nulls, nulls[:-1]])
+        changed = (values != previous) | (nulls != previous_nulls)
+        # Full value after an unmeasured one, change otherwise
+        deltas = np.where(previous_nulls, values, values - previous)
+        dt = np.diff(timestamps, prepend=self.last_timestamp)
+        masks = (changed.astype(np.int64) << np.arange(len(COMPACT_FIELDS))).sum(axis=1)
+        null_masks = ((changed & nulls).astype(np.int64) << np.arange(len(COMPACT_FIELDS))).sum(axis=1)
+        if len(readings):
+            self.last_timestamp = int(timestamps[-1])
+            self.last_values, self.last_nulls = values[-1], nulls[-1]
+        return dt, masks, null_masks, changed, nulls, deltas, added
+
+    def encode(self, readings: np.ndarray) -> Dict:
+        """
+        JSON-ready frame: {'rows': [...]}, plus the header on the stream's
+        first frame and 'codes' when it uses new error codes
+        """
+        frame = {} if self.started else self.header()
+        self.started = True
+        dt, masks, _, changed, nulls, deltas, added = self._deltas(readings)
+        if added:
+            frame['codes'] = added
+        rows = []
+        for row_dt, mask, row_changed, row_nulls, row_deltas in zip(dt.tolist(), masks.tolist(), changed,
+                                                                   nulls.tolist(), deltas.tolist()):
+            row = [row_dt, mask]
+            if mask:
+                row.extend(None if row_nulls[index] else row_deltas[index]
+                           for index in np.flatnonzero(row_changed).tolist())
+            rows.append(row)
+        frame['rows'] = rows
+        return frame
+
+    def encode_binary(self, readings: np.ndarray) -> bytes:
+        """
+        Binary frame: COMPACT_HEADER (magic, version, field count, row
+        count, new error code count), each new error code as its UTF-8
+        length (varint) and bytes, then per row dt, the changed mask, the
+        mask of fields that became null and the change of each other
+        changed field, as LEB128 varints (dt and changes zigzag-encoded)
+        """
+        self.started = True
+        dt, masks, null_masks, changed, nulls, deltas, added = self._deltas(readings)
+        table = np.column_stack([_zigzag(dt), masks, null_masks, _zigzag(deltas)]).astype(np.uint64)
+        keep = np.column_stack([np.ones((len(readings), 3), dtype=bool), changed & ~nulls])
+        header = COMPACT_HEADER.pack(COMPACT_MAGIC, COMPACT_VERSION, len(COMPACT_FIELDS), len(readings), len(added))
+        codes = b''.join(_varints(np.array([len(code)], dtype=np.uint64)) + code
+                         for code in (code.encode() for code in added))
+        return header + codes + _varints(table[keep])
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _varints(values: np.ndarray) -> bytes:
+    """LEB128 encoding of unsigned 64-bit integers, 7 bits per byte, low groups first"""
+    groups = values[:, None] >> (np.arange(10, dtype=np.uint64) * np.uint64(7))
+    more = np.zeros(groups.shape, dtype=bool)
+    more[:, :-1] = groups[:, 1:] != 0
+    keep = more.copy()
+    keep[:, 0] = True
+    keep[:, 1:] |= more[:, :-1]
+    encoded = (groups & np.uint64(0x7F)) | np.where(more, np.uint64(0x80), np.uint64(0))
+    return encoded[keep].astype(np.uint8).tobytes()
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _unvarints(data: np.ndarray) -> List[int]:
+    """Integers of a run of LEB128 varints (inverse of _varints)"""
+    if not len(data):
+        return []
+    ends = np.flatnonzero(data < 0x80)
+    if not len(ends) or ends[-1] != len(data) - 1:
+        raise CompactError('Truncated varint')
+    starts = np.r_[0, ends[:-1] + 1]
+    positions = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    groups = (data & 0x7F).astype(np.uint64) << (positions * 7).astype(np.uint64)
+    return np.add.reduceat(groups, starts).tolist()
+
+
+def _reading(fields: Sequence[str], scales: Sequence[float], values: List[Optional[int]],
+             timestamp: int, codes: List[Optional[str]]) -> Dict:
+    reading = {field: None if value is None else round(value * scale, 6)
+               for field, value, scale in zip(fields, values, scales)}
+    if 'error_code' in reading:
+        reading['error_code'] = codes[int(reading['error_code'] or 0)]
+    reading['timestamp'] = timestamp / 1000
+    return reading
+
+
+def decode(frames: List[Dict]) -> List[Dict]:
+    """Readings (field: value, plus 'timestamp' in epoch seconds) of a stream's JSON frames, in order"""
+    fields, scales = frames[0]['fields'], [10.0 ** -decimals for decimals in frames[0]['decimals']]
+    timestamp, values, codes = 0, [None] * len(fields), [None]
+    readings = []
+    for frame in frames:
+        codes.extend(frame.get('codes', ()))
+        for row in frame['rows']:
+            timestamp += row[0]
+            changes = iter(row[2:])
+            for index in range(len(fields)):
+                if row[1] >> index & 1:
+                    change = next(changes)
+                    values[index] = None if change is None else \
+                        change if values[index] is None else values[index] + change
+            readings.append(_reading(fields, scales, values, timestamp, codes))
+    return readings
+
+
+def decode_binary(bodies: Sequence[bytes], fields: Sequence[str] = COMPACT_FIELDS,
+                  decimals: Sequence[int] = COMPACT_DECIMALS) -> List[Dict]:
+    """Readings of a stream's binary frames, in order, like decode(); fields and decimals are the stream's header"""
+    scales = [10.0 ** -places for places in decimals]
+    timestamp, values, codes = 0, [None] * len(fields), [None]
+    readings = []
+    for body in bodies:
+        if len(body) < COMPACT_HEADER.size:
+            raise CompactError('Body shorter than the compact header')
+        magic, version, field_count, row_count, code_count = COMPACT_HEADER.unpack_from(body)
+        if magic != COMPACT_MAGIC or version != COMPACT_VERSION:
+            raise CompactError(f'Not a version {COMPACT_VERSION} compact frame')
+        if field_count != len(fields):
+            raise CompactError(f'Frame has {field_count} fields, expected {len(fields)}')
+        data = np.frombuffer(body, dtype=np.uint8, offset=COMPACT_HEADER.size)
+        position = 0
+        for _ in range(code_count):
+            end = position + int(np.argmax(data[position:] < 0x80)) + 1
+            length = _unvarints(data[position:end])[0]
+            if end + length > len(data):
+                raise CompactError('Truncated error code')
+            codes.append(data[end:end + length].tobytes().decode())
+            position = end + length
+        numbers = _unvarints(data[position:])
+        index = 0
+        try:
+            for _ in range(row_count):
+                timestamp += _unzigzag(numbers[index])
+                mask, null_mask = numbers[index + 1], numbers[index + 2]
+                index += 3
+                for field in range(field_count):
+                    if not mask >> field & 1:
+                        continue
+                    if null_mask >> field & 1:
+                        values[field] = None
+                        continue
+                    change = _unzigzag(numbers[index])
+                    index += 1
+                    values[field] = change if values[field] is None else values[field] + change
+                readings.append(_reading(fields, scales, values, timestamp, codes))
+        except IndexError:
+            raise CompactError(f'Frame ends before its {row_count} rows') from None
+        if index != len(numbers):
+            raise CompactError('Trailing data after the rows')
+    return readings
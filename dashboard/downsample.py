@@ -0,0 +1,80 @@
+"""
+Server-side downsampling of sensor time series for charts
+Both methods keep the output size bounded by the requested point count
+regardless of how many raw readings the time range holds
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+def _bucket_edges(n: int, buckets: int) -> np.ndarray:
+    """Start offsets of `buckets` near-equal slices of range(n), plus n"""
+    return np.linspace(0, n, buckets + 1).astype(np.intp)
+
+
+def minmax_buckets(x: np.ndarray, y: np.ndarray, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Keep the minimum and maximum of each of points // 2 buckets, in time order
+
+    Fully vectorized with ufunc.reduceat; spikes survive, which is what a
+    chart of a noisy signal needs.
+    """
+    n = len(x)
+    buckets = max(1, points // 2)
+    if n <= points:
+        return x, y
+
+    edges = _bucket_edges(n, buckets)[:-1]
+    positions = np.arange(n)
+    lows = np.minimum.reduceat(y, edges)
+    highs = np.maximum.reduceat(y, edges)
+    bucket_of = np.repeat(np.arange(buckets), np.diff(np.append(edges, n)))
+    is_low = y == lows[bucket_of]
+    is_high = y == highs[bucket_of]
+    # First position reaching the extreme in each bucket
+    low_index = np.minimum.reduceat(np.where(is_low, positions, n), edges)
+    high_index = np.minimum.reduceat(np.where(is_high, positions, n), edges)
+
+    chosen = np.unique(np.concatenate([low_index, high_index]))
+    return x[chosen], y[chosen]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets downsampling to `points` samples
+
+    Keeps the first and last sample; for every bucket in between picks the
+    sample forming the largest triangle with the previously kept sample and
+    the average of the next bucket. One NumPy pass per bucket.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return x, y
+
+    edges = _bucket_edges(n - 2, points - 2) + 1
+    # Averages of every bucket, used as the third triangle vertex
+    sums_x = np.add.reduceat(x, edges[:-1])
+    sums_y = np.add.reduceat(y, edges[:-1])
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    chosen = np.empty(points, dtype=np.intp)
+    chosen[0], chosen[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        cx, cy = avg_x[bucket + 1], avg_y[bucket + 1]
+        area = np.abs((ax - cx) * (y[start:stop] - ay) - (ax - x[start:stop]) * (cy - ay))
+        previous = start + int(np.argmax(area))
+        chosen[bucket + 1] = previous
+    return x[chosen], y[chosen]
+
+
+METHODS = {
+    'lttb': lttb,
+    'minmax': minmax_buckets,
+}
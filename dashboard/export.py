@@ -0,0 +1,158 @@
+"""
+Streaming export of device telemetry
+Rows are produced oldest first, chunk by chunk, from the archive files and
+then the SensorReading partitions, and rendered as CSV or NDJSON text, optionally
+gzip-compressed, without ever holding more than one chunk in memory
+"""
+
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .archive import archived_days, read_day
+from .pagination import READING_FIELDS, after_key
+from .partitions import reading_querysets
+from .telemetry import CHANNEL_DECIMALS, SENSOR_CHANNELS, epoch_to_datetimes, timestamps_to_iso
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def parse_export_cursor(value: Optional[str]) -> Tuple[Optional[datetime], Optional[int]]:
+    """
+    (timestamp, id) from a resume cursor, the "timestamp,id" of the last row received
+
+    Every exported row starts with its id and ISO timestamp, so a client
+    whose download broke off resumes with the values of its last complete row.
+    """
+    if not value:
+        return None, None
+    try:
+        timestamp, reading_id = value.rsplit(',', 1)
+        moment = datetime.fromisoformat(timestamp.strip().replace('Z', '+00:00'))
+        return epoch_to_datetimes([moment.timestamp()])[0], int(reading_id)
+    except ValueError:
+        raise ValueError('cursor must be "<ISO timestamp>,<id>" of the last row received')
+
+
+def iter_rows(device_pk: int, start: float, end: float, fields: Sequence[str] = READING_FIELDS,
+              cursor: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Chunks of (id, ISO timestamp, *fields) tuples of one device in [start, end)
+
+    Order is (timestamp asc, id desc), the reverse scan of the (device,
+    -timestamp) index, for the archived days and then for the hot
+    partitions, whose ordered streams are merged.
+    """
+    after_timestamp, after_id = parse_export_cursor(cursor)
+    resume = after_timestamp.timestamp() if after_timestamp is not None else None
+    yield from _archived_rows(device_pk, start, end, fields, resume, after_id, chunk_size)
+
+    start_at, end_at = epoch_to_datetimes([start, end])
+    partitions = [after_key(queryset.filter(device_id=device_pk), after_timestamp, after_id, newest_first=False)
+                  .values_list('id', 'timestamp', *fields)
+                  .iterator(chunk_size=chunk_size)
+                  for queryset in reading_querysets(start_at, end_at)]
+    rows = heapq.merge(*partitions, key=lambda row: (row[1], -row[0]))
+    batch = []
+    for row in rows:
+        batch.append((row[0], row[1].isoformat()) + row[2:])
+        if len(batch) == chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _archived_rows(device_pk, start, end, fields, resume, after_id, chunk_size) -> Iterator[List[tuple]]:
+    for day in archived_days(device_pk, start, end):
+        data = read_day(device_pk, day, ('id', 'timestamp') + tuple(fields))
+        timestamps, ids = data['timestamp'], data['id']
+        keep = (timestamps >= start) & (timestamps < end)
+        if resume is not None:
+            keep &= (timestamps > resume) | ((timestamps == resume) & (ids < after_id))
+        rows = np.flatnonzero(keep)
+        rows = rows[np.lexsort((-ids[rows], timestamps[rows]))]
+        for offset in range(0, len(rows), chunk_size):
+            part = rows[offset:offset + chunk_size]
+            columns = [ids[part].tolist(), timestamps_to_iso(timestamps[part])]
+            columns += [_archive_column(name, data[name][part]) for name in fields]
+            yield list(zip(*columns))
+
+
+def _archive_column(name: str, values: np.ndarray) -> list:
+    """Archive column values as the Python types the ORM returns"""
+    if name in SENSOR_CHANNELS:
+        rounded = np.round(values.astype(np.float64), CHANNEL_DECIMALS[name])
+        return [None if value != value else value for value in rounded.tolist()]
+    if name == 'error_code':
+        return [code.decode() or None for code in values.tolist()]
+    return values.tolist()
+
+
+def render_csv(chunks: Iterator[List[tuple]], fields: Sequence[str], header: bool = True) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(('id', 'timestamp') + tuple(fields))
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def render_ndjson(chunks: Iterator[List[tuple]], fields: Sequence[str], header: bool = True) -> Iterator[str]:
+    keys = ('id', 'timestamp') + tuple(fields)
+    dumps = json.JSONEncoder(separators=(',', ':')).encode
+    for chunk in chunks:
+        yield ''.join(dumps(dict(zip(keys, row))) + '\n' for row in chunk)
+
+
+RENDERERS = {
+    'csv': render_csv,
+    'ndjson': render_ndjson,
+}
+
+
+def gzip_stream(parts: Iterator[str]) -> Iterator[bytes]:
+    """Compress text parts into one gzip member, yielding as data becomes available"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for part in parts:
+        data = compressor.compress(part.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(device_pk: int, start: float, end: float, fmt: str = 'ndjson',
+                  fields: Sequence[str] = READING_FIELDS, cursor: Optional[str] = None,
+                  compress: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator:
+    """
+    Rendered export of one device, as str parts or gzip bytes when compress is set
+
+    A resumed export (cursor given) has no CSV header, so it can be appended
+    to the part already received.
+    """
+    parts = RENDERERS[fmt](iter_rows(device_pk, start, end, fields, cursor, chunk_size), fields,
+                           header=cursor is None)
+    return gzip_stream(parts) if compress else parts
+
+
+def last_row_cursor(line: str, fmt: str) -> Optional[str]:
+    """Resume cursor from the last complete line of an uncompressed export"""
+    if fmt == 'ndjson':
+        row = json.loads(line)
+        return f"{row['timestamp']},{row['id']}"
+    reading_id, timestamp = next(csv.reader([line]))[:2]
+    return None if reading_id == 'id' else f'{timestamp},{reading_id}'
@@ -0,0 +1,275 @@
+"""
+In-process telemetry fan-out
+Each device watched by at least one stream (SSE or WebSocket) has a single
+producer task that follows its live ring and turns new readings into
+frames once. Subscribers get the frames through bounded queues: one that
+falls behind loses its oldest frames (and is told how many readings it
+missed) and receives what is left coalesced into one batch, so a slow
+browser costs neither memory nor delay for the others. If a producer
+fails, its subscribers' streams end with FeedError and the next subscriber
+starts a new producer.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+import weakref
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .live import raw_since, reading_records, ring_cursor
+from .telemetry import SENSOR_DTYPE
+
+logger = logging.getLogger(__name__)
+
+# Most readings read from a ring (and sent to a subscriber) at once
+SSE_BATCH_LIMIT = 256
+
+# Ring reads take a flock and map files, so they run off the event loop
+# (they touch no database, hence not in the thread-sensitive executor)
+async_ring_cursor = sync_to_async(ring_cursor, thread_sensitive=False)
+async_raw_since = sync_to_async(raw_since, thread_sensitive=False)
+
+
+class FeedError(RuntimeError):
+    """Raised to the subscribers of a device feed whose producer failed"""
+
+
+async def follow_ring(device_id, cursor):
+    """
+    Batches (readings, cursor, lost) from a device's live ring from cursor on
+
+    readings are SENSOR_DTYPE rows, cursor is the ring cursor after them and lost the count of readings
+    overwritten before they could be read. Yields None after SSE_KEEPALIVE
+    seconds without readings, so callers can keep idle connections alive.
+    A cursor of None starts at the newest reading.
+    """
+    poll_interval = getattr(settings, 'SSE_POLL_INTERVAL', 0.05)
+    keepalive = getattr(settings, 'SSE_KEEPALIVE', 15.0)
+
+    if cursor is None:
+        # New viewer: start at the newest reading so the client has something to show
+        cursor = max(await async_ring_cursor(device_id) - 1, 0)
+    last_sent = time.monotonic()
+    while True:
+        if await async_ring_cursor(device_id) != cursor:
+            readings, cursor, lost = await async_raw_since(device_id, cursor, SSE_BATCH_LIMIT)
+            if len(readings) or lost:
+                yield readings, cursor, lost
+                last_sent = time.monotonic()
+                continue
+        if time.monotonic() - last_sent >= keepalive:
+            yield None
+            last_sent = time.monotonic()
+        await asyncio.sleep(poll_interval)
+
+
+class Frame:
+    """Readings [start, cursor) of a device's ring; their JSON-ready dicts are built once, on first use"""
+
+    __slots__ = ('device_id', 'start', 'cursor', 'rows', '_records')
+
+    def __init__(self, device_id: str, start: int, cursor: int, rows: np.ndarray):
+        self.device_id = device_id
+        self.start = start
+        self.cursor = cursor
+        self.rows = rows
+        self._records = None
+
+    def records(self) -> List[Dict]:
+        if self._records is None:
+            self._records = reading_records(self.device_id, self.rows)
+        return self._records
+
+
+class Batch(NamedTuple):
+    """What a subscriber gets at once: the unsent tails of one or more frames"""
+    parts: List[Tuple[Frame, int]]  # (frame, offset of the first unsent reading)
+    cursor: int
+    lost: int
+
+    def rows(self) -> np.ndarray:
+        """The readings as SENSOR_DTYPE rows"""
+        return np.concatenate([frame.rows[offset:] for frame, offset in self.parts]) if self.parts else \
+            np.empty(0, dtype=SENSOR_DTYPE)
+
+    def records(self) -> List[Dict]:
+        """The readings as JSON-ready dicts"""
+        return [record for frame, offset in self.parts for record in frame.records()[offset:]]
+
+
+class Subscriber:
+    """A stream's view of a device feed: bounded frame queue and counters"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, cursor: int, max_frames: int):
+        self.id = next(self._ids)
+        self.cursor = cursor
+        self.frames = deque()
+        self.max_frames = max_frames
+        self.ready = asyncio.Event()
+        self.delivered = 0  # batches handed to the stream
+        self.dropped = 0  # frames discarded because the queue was full
+        self.lost = 0  # readings the stream never got
+        self.since = time.time()
+
+    def put(self, frame: Frame):
+        if len(self.frames) >= self.max_frames:
+            self.frames.popleft()
+            self.dropped += 1
+        self.frames.append(frame)
+        self.ready.set()
+
+    def take(self) -> Optional[Batch]:
+        """Queued frames coalesced into one batch, or None if none are new"""
+        parts, lost = [], 0
+        while self.frames:
+            frame = self.frames.popleft()
+            if frame.cursor <= self.cursor:
+                continue
+            if frame.start > self.cursor:
+                lost += frame.start - self.cursor
+                self.cursor = frame.start
+            parts.append((frame, self.cursor - frame.start))
+            self.cursor = frame.cursor
+        self.ready.clear()
+        if not parts and not lost:
+            return None
+        self.delivered += 1
+        self.lost += lost
+        return Batch(parts, self.cursor, lost)
+
+    def stats(self, head: int) -> Dict:
+        return {
+            'id': self.id,
+            'cursor': self.cursor,
+            'lag': max(head - self.cursor, 0),  # readings published but not yet taken
+            'queued_frames': len(self.frames),
+            'delivered': self.delivered,
+            'dropped_frames': self.dropped,
+            'lost_readings': self.lost,
+            'connected_seconds': round(time.time() - self.since, 1),
+        }
+
+
+class DeviceFeed:
+    """The producer of one device: reads its ring once for every subscriber, from head on"""
+
+    def __init__(self, device_id: str, head: int):
+        self.device_id = device_id
+        self.head = head
+        self.subscribers: Dict[int, Subscriber] = {}
+        self.frames = 0
+        self.error = None
+        self.task = asyncio.ensure_future(self._produce())
+        self.task.add_done_callback(self._stopped)
+
+    async def _produce(self):
+        async for batch in follow_ring(self.device_id, self.head):
+            if batch is None:
+                continue
+            readings, cursor, _ = batch
+            frame = Frame(self.device_id, cursor - len(readings), cursor, readings)
+            self.head = cursor
+            self.frames += 1
+            for subscriber in list(self.subscribers.values()):
+                subscriber.put(frame)
+
+    def _stopped(self, task):
+        if task.cancelled() or task.exception() is None:
+            return
+        self.error = task.exception()
+        logger.error(f"Telemetry feed of {self.device_id} failed", exc_info=self.error)
+        # Wake the subscribers so they see the failure rather than wait for frames
+        for subscriber in self.subscribers.values():
+            subscriber.ready.set()
+
+    def stats(self) -> Dict:
+        return {
+            'head': self.head,
+            'frames': self.frames,
+            'subscribers': [subscriber.stats(self.head) for subscriber in self.subscribers.values()],
+        }
+
+
+class TelemetryHub:
+    """Device feeds of one event loop, started by the first subscriber and stopped after the last"""
+
+    def __init__(self, max_frames: Optional[int] = None):
+        self.max_frames = max_frames or getattr(settings, 'HUB_QUEUE_FRAMES', 8)
+        self.feeds: Dict[str, DeviceFeed] = {}
+
+    async def subscribe(self, device_id: str, cursor: Optional[int] = None):
+        """
+        Batches of the device's readings from cursor on (newest reading if
+        None), and None after SSE_KEEPALIVE seconds without any
+
+        Readings before the feed's head (a resumed stream) are read from the
+        ring by the subscriber itself, then it continues with the feed.
+        """
+        keepalive = getattr(settings, 'SSE_KEEPALIVE', 15.0)
+        feed = self.feeds.get(device_id)
+        if feed is None or feed.task.done():
+            head = await async_ring_cursor(device_id)
+            # Another subscriber may have started one meanwhile
+            feed = self.feeds.get(device_id)
+            if feed is None or feed.task.done():
+                feed = self.feeds[device_id] = DeviceFeed(device_id, head)
+        if cursor is None:
+            cursor = max(feed.head - 1, 0)
+        subscriber = Subscriber(cursor, self.max_frames)
+        feed.subscribers[subscriber.id] = subscriber
+        try:
+            # Catch up from the ring to where the feed was; frames queued meanwhile that overlap are trimmed by take()
+            head = feed.head
+            while subscriber.cursor < head:
+                readings, next_cursor, lost = await async_raw_since(device_id, subscriber.cursor, SSE_BATCH_LIMIT)
+                if next_cursor <= subscriber.cursor and not lost:
+                    break
+                subscriber.cursor = next_cursor
+                subscriber.delivered += 1
+                subscriber.lost += lost
+                frame = Frame(device_id, next_cursor - len(readings), next_cursor, readings)
+                yield Batch([(frame, 0)], next_cursor, lost)
+            while True:
+                if feed.error is not None:
+                    raise FeedError(f"Telemetry feed of {device_id} failed") from feed.error
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if feed.error is not None:
+                    continue
+                batch = subscriber.take()
+                if batch is not None:
+                    yield batch
+        finally:
+            del feed.subscribers[subscriber.id]
+            if not feed.subscribers:
+                feed.task.cancel()
+                if self.feeds.get(device_id) is feed:
+                    del self.feeds[device_id]
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per device: feed head, frames produced and each subscriber's lag and drop counters"""
+        return {device_id: feed.stats() for device_id, feed in self.feeds.items()}
+
+
+# One hub per event loop: feeds and queues belong to the loop that runs them
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub() -> TelemetryHub:
+    """The hub of the running event loop"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = TelemetryHub()
+    return hub
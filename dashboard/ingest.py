@@ -0,0 +1,390 @@
+"""
+Bulk telemetry ingestion for SensorReading
+Batches are parsed into NumPy columns, range-checked in one vectorized pass
+against the model validators and written with chunked bulk_create
+"""
+
+import json
+import logging
+import warnings
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
+
+from .alert_rules import check_rules
+from .anomaly import check_batch
+from .latency import get_recorder
+from .live import publish
+from .models import BionicDevice, SensorReading
+from .partitions import get_router
+from .writer import bulk_insert
+from .telemetry import (
+    CHANNEL_DECIMALS, FLAG_CALIBRATED, FLAG_ERROR, SENSOR_CHANNELS,
+    empty_readings, epoch_to_datetimes, now_epoch,
+)
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+class IngestError(ValueError):
+    """Raised when a request body cannot be parsed as telemetry"""
+
+
+def _field_bounds(name: str) -> Tuple[float, float, bool]:
+    """(min, max, nullable) of a SensorReading field, read from its validators"""
+    field = SensorReading._meta.get_field(name)
+    low, high = -np.inf, np.inf
+    for validator in field.validators:
+        if isinstance(validator, MinValueValidator):
+            low = float(validator.limit_value)
+        elif isinstance(validator, MaxValueValidator):
+            high = float(validator.limit_value)
+    return low, high, field.null
+
+
+# Optional values a device may report that are aggregated but not stored on
+# SensorReading: control response time in ms (see dashboard.latency)
+REPORTED_BOUNDS = {'response_time_ms': (0.0, 60000.0, True)}
+
+# Numeric columns checked on ingest, with bounds mirroring the model validators
+FIELD_BOUNDS = {name: _field_bounds(name) for name in SENSOR_CHANNELS + ('battery_level',)}
+FIELD_BOUNDS.update(REPORTED_BOUNDS)
+
+logger = logging.getLogger(__name__)
+
+ERROR_CODE_MAX_LENGTH = SensorReading._meta.get_field('error_code').max_length
+
+# Accepted reading times, epoch seconds [2000-01-01, 2100-01-01): rejects NaT
+# and epochs sent in milliseconds
+TIMESTAMP_BOUNDS = (946684800.0, 4102444800.0)
+
+
+def parse_body(body: bytes, content_type: str = 'application/json') -> List[Dict]:
+    """
+    Decode an ingest request body into a flat list of reading dicts
+
+    Accepts NDJSON (one reading per line), a JSON array of readings, or a
+    JSON object {"device_id": ..., "readings": [...]} / list of such objects.
+    A device_id given on the envelope applies to readings without their own.
+    """
+    try:
+        text = body.decode('utf-8')
+    except UnicodeDecodeError as exc:
+        raise IngestError('Body is not valid UTF-8') from exc
+
+    try:
+        if content_type in NDJSON_CONTENT_TYPES:
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            items = json.loads(text)
+    except json.JSONDecodeError as exc:
+        raise IngestError(f'Invalid JSON: {exc.msg} (line {exc.lineno})') from exc
+
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        raise IngestError('Expected a JSON array, an object or NDJSON lines')
+
+    records = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise IngestError('Every reading must be a JSON object')
+        if 'readings' in item:
+            envelope_device = item.get('device_id')
+            for reading in item['readings'] or []:
+                if not isinstance(reading, dict):
+                    raise IngestError('Every reading must be a JSON object')
+                if envelope_device is not None and 'device_id' not in reading:
+                    reading = dict(reading, device_id=envelope_device)
+                records.append(reading)
+        else:
+            records.append(item)
+    return records
+
+
+def _numeric_column(records: List[Dict], key: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Float column for key plus a mask of values that were not JSON numbers (strings, lists, booleans)"""
+    values = [record.get(key) for record in records]
+    if {type(value) for value in values} <= {int, float, type(None)}:
+        # Fast path: only numbers and nulls, converted in one call
+        return np.array(values, dtype=np.float64), np.zeros(len(values), dtype=bool)
+    column = np.full(len(values), np.nan)
+    malformed = np.zeros(len(values), dtype=bool)
+    for index, value in enumerate(values):
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            malformed[index] = True
+        else:
+            column[index] = value
+    return column, malformed
+
+
+def _parse_timestamps(values: List) -> Tuple[np.ndarray, np.ndarray]:
+    """Epoch seconds for ISO strings or numbers; missing values become now"""
+    result = np.full(len(values), now_epoch())
+    invalid = np.zeros(len(values), dtype=bool)
+    strings, string_rows = [], []
+    for index, value in enumerate(values):
+        if value is None:
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            result[index] = value
+        elif isinstance(value, str):
+            strings.append(value)
+            string_rows.append(index)
+        else:
+            invalid[index] = True
+    if not strings:
+        return result, invalid
+
+    # Fast path: UTC timestamps parsed by NumPy in one call
+    trimmed = [value[:-6] if value.endswith('+00:00') else value[:-1] if value.endswith('Z') else value
+               for value in strings]
+    try:
+        with warnings.catch_warnings():
+            # NumPy only warns on (and may misread) non-UTC offsets; use the slow path for those
+            warnings.simplefilter('error')
+            parsed = np.array(trimmed, dtype='datetime64[us]').astype(np.int64) / 1e6
+        result[string_rows] = parsed
+        return result, invalid
+    except (ValueError, Warning):
+        pass
+    for index, value in zip(string_rows, strings):
+        try:
+            moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            invalid[index] = True
+            continue
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=dt_timezone.utc)
+        result[index] = moment.timestamp()
+    return result, invalid
+
+
+class ReadingColumns:
+    """
+    Validated column-oriented view of one ingest batch
+
+    Holds float64 channel columns, the owning device primary key and epoch
+    timestamp of every row, and the accept mask with rejection reasons.
+    """
+
+    def __init__(self, device_pks: np.ndarray, device_ids: List[Optional[str]], timestamps: np.ndarray,
+                 channels: Dict[str, np.ndarray], is_calibrated: np.ndarray, error_codes: List[Optional[str]],
+                 invalid: Optional[Dict[str, np.ndarray]] = None):
+        self.device_pks = device_pks
+        self.device_ids = device_ids
+        self.timestamps = timestamps
+        self.channels = channels
+        self.is_calibrated = is_calibrated
+        self.error_codes = error_codes
+        self.reasons = Counter()
+        self.accepted = self._validate(invalid or {})
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _validate(self, invalid: Dict[str, np.ndarray]) -> np.ndarray:
+        """Vectorized range checks matching the SensorReading validators"""
+        accepted = np.ones(len(self), dtype=bool)
+        checks = dict(invalid)
+        checks['unknown_device'] = self.device_pks < 0
+        low, high = TIMESTAMP_BOUNDS
+        with np.errstate(invalid='ignore'):
+            out_of_range = ~((self.timestamps >= low) & (self.timestamps < high))
+        checks['timestamp'] = checks.get('timestamp', np.zeros(len(self), dtype=bool)) | out_of_range
+        for name, (low, high, nullable) in FIELD_BOUNDS.items():
+            values = self.channels[name]
+            missing = np.isnan(values)
+            bad = ~missing & ((values < low) | (values > high) | np.isinf(values))
+            if not nullable:
+                bad |= missing
+            if name in checks:
+                bad |= checks[name]
+            checks[name] = bad
+        if self.error_codes:
+            # Counted in UTF-8 bytes, as the ring and archive store them
+            too_long = np.fromiter((code is not None and len(code.encode()) > ERROR_CODE_MAX_LENGTH
+                                    for code in self.error_codes), dtype=bool, count=len(self))
+            checks['error_code'] = checks.get('error_code', np.zeros(len(self), dtype=bool)) | too_long
+        for name, bad in checks.items():
+            count = int(bad.sum())
+            if count:
+                self.reasons[name] += count
+                accepted &= ~bad
+        return accepted
+
+    def subset(self, mask: np.ndarray) -> 'ReadingColumns':
+        """Rows selected by mask, without re-validating"""
+        rows = np.flatnonzero(mask)
+        part = ReadingColumns.__new__(ReadingColumns)
+        part.device_pks = self.device_pks[rows]
+        part.device_ids = [self.device_ids[row] for row in rows.tolist()]
+        part.timestamps = self.timestamps[rows]
+        part.channels = {name: values[rows] for name, values in self.channels.items()}
+        part.is_calibrated = self.is_calibrated[rows]
+        part.error_codes = [self.error_codes[row] for row in rows.tolist()] if self.error_codes else []
+        part.reasons = Counter()
+        part.accepted = np.ones(len(rows), dtype=bool)
+        return part
+
+    def to_sensor_array(self) -> np.ndarray:
+        """SENSOR_DTYPE array of the rows (device column holds the device pk)"""
+        readings = empty_readings(len(self))
+        readings['device'] = self.device_pks
+        readings['timestamp'] = self.timestamps
+        for name in SENSOR_CHANNELS:
+            readings[name] = self.channels[name]
+        readings['battery_level'] = np.nan_to_num(self.channels['battery_level'])
+        readings['is_calibrated'] = self.is_calibrated
+        readings['error_code'] = [(code or '').encode() for code in self.error_codes] \
+            if self.error_codes else b''
+        return readings
+
+
+def resolve_devices(device_ids: Iterable[Optional[str]]) -> Dict[str, int]:
+    """Map BionicDevice.device_id to primary key with one query"""
+    wanted = {device_id for device_id in device_ids if device_id is not None}
+    return dict(BionicDevice.objects.filter(device_id__in=wanted).values_list('device_id', 'pk'))
+
+
+def columns_from_records(records: List[Dict]) -> ReadingColumns:
+    """Build and validate columns from parsed reading dicts"""
+    device_ids = [record.get('device_id') for record in records]
+    device_ids = [str(value) if value is not None else None for value in device_ids]
+    lookup = resolve_devices(device_ids)
+    device_pks = np.array([lookup.get(device_id, -1) for device_id in device_ids], dtype=np.int64)
+
+    timestamps, bad_timestamps = _parse_timestamps([record.get('timestamp') for record in records])
+    invalid = {'timestamp': bad_timestamps}
+    channels = {}
+    for name in FIELD_BOUNDS:
+        channels[name], invalid[name] = _numeric_column(records, name)
+
+    is_calibrated = np.array([bool(record.get('is_calibrated', True)) for record in records], dtype=bool)
+    error_codes = [record.get('error_code') or None for record in records]
+    invalid['error_code'] = np.array([code is not None and not isinstance(code, str) for code in error_codes],
+                                     dtype=bool)
+    error_codes = [code if isinstance(code, str) else None for code in error_codes]
+
+    return ReadingColumns(device_pks, device_ids, timestamps, channels, is_calibrated, error_codes, invalid)
+
+
+def columns_from_frames(frames: np.ndarray) -> ReadingColumns:
+    """Build and validate columns from a decoded FRAME_DTYPE array"""
+    device_pks = frames['device'].astype(np.int64)
+    unique_pks = np.unique(device_pks)
+    lookup = dict(BionicDevice.objects.filter(pk__in=unique_pks.tolist()).values_list('pk', 'device_id'))
+    known = np.isin(device_pks, np.fromiter(lookup, dtype=np.int64, count=len(lookup)))
+    device_pks[~known] = -1
+    names = [lookup.get(pk) for pk in unique_pks.tolist()]
+    device_ids = np.array(names, dtype=object)[np.searchsorted(unique_pks, frames['device'])].tolist()
+
+    # float32 on the wire; round back to the precision the JSON path stores
+    channels = {name: np.round(frames[name].astype(np.float64), CHANNEL_DECIMALS[name])
+                for name in SENSOR_CHANNELS}
+    channels['battery_level'] = frames['battery_level'].astype(np.float64)
+    for name in REPORTED_BOUNDS:
+        channels[name] = np.full(len(frames), np.nan)
+
+    flags = frames['flags']
+    has_error = (flags & FLAG_ERROR).astype(bool)
+    error_codes = [None] * len(frames)
+    for row, number in zip(np.flatnonzero(has_error).tolist(), frames['error_number'][has_error].tolist()):
+        error_codes[row] = f'E{number:03d}'
+
+    return ReadingColumns(device_pks, device_ids, frames['timestamp'].astype(np.float64), channels,
+                          (flags & FLAG_CALIBRATED).astype(bool), error_codes)
+
+
+def _nullable_list(values: np.ndarray) -> list:
+    """Python list of a float column with NaN turned into None"""
+    column = values.tolist()
+    for index in np.flatnonzero(np.isnan(values)).tolist():
+        column[index] = None
+    return column
+
+
+def persist_columns(columns: ReadingColumns, chunk_size: Optional[int] = None) -> int:
+    """
+    Write the accepted rows with chunked bulk_create in one transaction
+
+    Rows go to the partition of the current month (see dashboard.partitions).
+    Under a DB profile with the batching writer the transaction is shared
+    with concurrent ingest requests (see dashboard.writer).
+    """
+    chunk_size = chunk_size or getattr(settings, 'TELEMETRY_INGEST_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    rows = columns.subset(columns.accepted) if not columns.accepted.all() else columns
+    if not len(rows):
+        return 0
+
+    timestamps = epoch_to_datetimes(rows.timestamps)
+    device_pks = rows.device_pks.tolist()
+    values = {name: _nullable_list(rows.channels[name]) for name in SENSOR_CHANNELS}
+    battery = np.round(rows.channels['battery_level']).astype(np.int64).tolist()
+    calibrated = rows.is_calibrated.tolist()
+    error_codes = rows.error_codes or [None] * len(rows)
+    model = get_router().current_model()
+
+    return bulk_insert([
+        model(
+            device_id=device_pks[index],
+            timestamp=timestamps[index],
+            battery_level=battery[index],
+            is_calibrated=calibrated[index],
+            error_code=error_codes[index],
+            **{name: values[name][index] for name in SENSOR_CHANNELS}
+        )
+        for index in range(len(rows))
+    ], batch_size=chunk_size)
+
+
+def ingest_records(records: List[Dict], chunk_size: Optional[int] = None) -> Dict:
+    """Validate and store parsed readings, returning accept/reject counts"""
+    return ingest_columns(columns_from_records(records), chunk_size)
+
+
+def ingest_columns(columns: ReadingColumns, chunk_size: Optional[int] = None) -> Dict:
+    """Store the accepted rows of a validated batch, returning accept/reject counts"""
+    accepted = persist_columns(columns, chunk_size)
+    alerts = 0
+    if accepted:
+        stored = columns.subset(columns.accepted)
+        try:
+            publish(stored.device_ids, stored.to_sensor_array())
+        except OSError as exc:
+            # The live view is best effort; the readings are already stored
+            logger.warning(f"Could not update live ring buffers: {exc}")
+        try:
+            alerts = check_batch(stored.device_pks, stored.timestamps, stored.channels)
+        except Exception as exc:
+            logger.error(f"Anomaly check failed for an ingest batch: {exc}")
+        try:
+            alerts += check_rules(stored.device_pks, stored.timestamps, stored.channels)
+        except Exception as exc:
+            logger.error(f"Alert rule check failed for an ingest batch: {exc}")
+        try:
+            get_recorder().record(stored.device_pks, stored.timestamps, stored.channels['response_time_ms'])
+        except Exception as exc:
+            logger.error(f"Could not record response times for an ingest batch: {exc}")
+
+    per_device = {}
+    for device_id, ok in zip(columns.device_ids, columns.accepted.tolist()):
+        counts = per_device.setdefault(device_id or 'unknown', {'accepted': 0, 'rejected': 0})
+        counts['accepted' if ok else 'rejected'] += 1
+
+    return {
+        'received': len(columns),
+        'accepted': accepted,
+        'rejected': len(columns) - accepted,
+        'devices': per_device,
+        'reject_reasons': dict(columns.reasons),
+        'alerts': alerts,
+    }
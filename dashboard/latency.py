@@ -0,0 +1,150 @@
+"""
+Response-time sketches in DeviceAnalytics
+Ingest counts reported response times into in-memory sketches per device
+per day and periodically merges them into DeviceAnalytics.response_time_sketch;
+analytics queries merge the stored sketches across days and devices
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import date
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import QuerySet
+
+from .models import DeviceAnalytics
+from .sketch import DDSketch, merge_all
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# Epoch day number of 1970-01-01 in date.toordinal() terms
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class LatencyRecorder:
+    """
+    Per-process response-time sketches waiting to be stored
+
+    record() only updates memory. At most every flush_interval seconds (and
+    at exit) the pending sketches are merged into the stored ones in one
+    transaction; if that fails, for example on a locked database, they stay
+    pending and are merged on the next flush. Sketches merge exactly, so
+    workers flushing the same device and day in any order lose nothing.
+    """
+
+    def __init__(self, flush_interval: Optional[float] = None):
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            getattr(settings, 'LATENCY_FLUSH_INTERVAL', 10.0)
+        self._pending: Dict[Tuple[int, int], DDSketch] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, device_pks: np.ndarray, timestamps: np.ndarray, values: np.ndarray):
+        """Count response times (ms) of readings by device and UTC day; NaN values are skipped"""
+        values = np.asarray(values, dtype=np.float64)
+        present = np.isfinite(values)
+        if not present.any():
+            return
+        pks = np.asarray(device_pks)[present]
+        days = np.floor(np.asarray(timestamps)[present] / 86400).astype(np.int64)
+        keys, inverse = np.unique(np.column_stack([pks, days]), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+        values = values[present][order]
+
+        with self._lock:
+            for index, (device_pk, day) in enumerate(keys.tolist()):
+                sketch = self._pending.get((device_pk, day))
+                if sketch is None:
+                    sketch = self._pending[(device_pk, day)] = DDSketch()
+                sketch.add(values[bounds[index]:bounds[index + 1]])
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> int:
+        """Merge the pending sketches into DeviceAnalytics; returns the rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            store_sketches(pending)
+        except OperationalError as exc:
+            logger.warning(f"Could not store response-time sketches, retrying on the next flush: {exc}")
+            with self._lock:
+                for key, sketch in pending.items():
+                    if key in self._pending:
+                        sketch.merge(self._pending[key])
+                    self._pending[key] = sketch
+            return 0
+        return len(pending)
+
+
+def store_sketches(sketches: Dict[Tuple[int, int], DDSketch]):
+    """Merge sketches keyed by (device pk, epoch day) into their DeviceAnalytics rows"""
+    with transaction.atomic():
+        dates = {day: date.fromordinal(EPOCH_ORDINAL + day) for _, day in sketches}
+        stored = {}
+        for device_pk, day, blob in (DeviceAnalytics.objects.select_for_update()
+                                     .filter(device_id__in={pk for pk, _ in sketches},
+                                             date__in=set(dates.values()))
+                                     .values_list('device_id', 'date', 'response_time_sketch')):
+            if blob:
+                stored[(device_pk, day.toordinal() - EPOCH_ORDINAL)] = DDSketch.from_bytes(blob)
+        rows = []
+        for key, sketch in sketches.items():
+            if key in stored:
+                stored[key].merge(sketch)
+                sketch = stored[key]
+            rows.append(DeviceAnalytics(
+                device_id=key[0],
+                date=dates[key[1]],
+                response_time_ms=round(sketch.mean, 2),
+                response_time_sketch=sketch.to_bytes(),
+            ))
+        DeviceAnalytics.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['device', 'date'],
+            update_fields=['response_time_ms', 'response_time_sketch', 'updated_at'],
+        )
+
+
+def summarize(sketch: DDSketch, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict:
+    """Count, mean and quantiles (ms) of a sketch as a JSON-ready dict"""
+    summary = {'count': sketch.count, 'mean_ms': round(sketch.mean, 2) if sketch.count else None}
+    for q, value in zip(quantiles, sketch.quantiles(quantiles)):
+        summary[f'p{q * 100:g}_ms'] = round(value, 2) if value is not None else None
+    return summary
+
+
+def response_time_summary(analytics: QuerySet, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict:
+    """Merged response-time quantiles of a DeviceAnalytics queryset (any devices and days)"""
+    blobs = analytics.exclude(response_time_sketch=None).values_list('response_time_sketch', flat=True)
+    return summarize(merge_all(blobs.iterator()), quantiles)
+
+
+def day_summaries(blobs: Iterable[Optional[bytes]], quantiles: Sequence[float] = DEFAULT_QUANTILES):
+    """summarize() of each serialized sketch, None where there is none"""
+    return [summarize(DDSketch.from_bytes(blob), quantiles) if blob else None for blob in blobs]
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> LatencyRecorder:
+    """The recorder of this process, flushed at exit"""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = LatencyRecorder()
+            atexit.register(_recorder.flush)
+        return _recorder
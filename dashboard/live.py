@@ -0,0 +1,251 @@
+"""
+Live telemetry ring buffers
+Every device has a fixed-capacity ring of its most recent readings in a
+memory-mapped file, filled by the ingest path and read by the live sensor
+endpoints. All workers on a host map the same files, so a poll is answered
+from shared memory without touching the database. The files live in
+TELEMETRY_RING_DIR (cache/rings in the project by default), which must be
+a directory of the server's user that nobody else can write to.
+
+File layout (little-endian):
+
+    offset  size               field
+    0       4                  magic, b'QXRB'
+    4       2                  version (1)
+    6       2                  record size (SENSOR_DTYPE.itemsize)
+    8       4                  capacity in records
+    12      4                  reserved
+    16      8                  readings ever written (the write cursor)
+    24      8                  write sequence (odd while a write is in progress)
+    32      capacity * record  SENSOR_DTYPE records, slot = index % capacity
+
+Writers serialize on an exclusive flock and bracket every write by
+incrementing the sequence before and after it (a seqlock). Readers take no
+lock: they copy what they need and keep the copy only if the sequence was
+even and unchanged across it; after a few failed attempts they read under
+a shared flock instead.
+"""
+
+import fcntl
+import mmap
+import os
+import stat
+import struct
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import numpy as np
+from django.conf import settings
+
+from .telemetry import SENSOR_DTYPE, TelemetryBatch, empty_readings
+
+RING_MAGIC = b'QXRB'
+RING_VERSION = 2
+RING_HEADER = struct.Struct('<4sHHI4xQQ')
+CURSOR = struct.Struct('<Q')
+CURSOR_OFFSET = 16
+SEQUENCE_OFFSET = 24
+READ_RETRIES = 3
+
+
+def ring_dir() -> str:
+    return str(getattr(settings, 'TELEMETRY_RING_DIR', os.path.join(settings.BASE_DIR, 'cache', 'rings')))
+
+
+def private_dir(path: str):
+    """Create path owner-only if missing; refuse a directory another user owns or can write to"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.geteuid() or info.st_mode & 0o022:
+        raise PermissionError(f"Ring directory {path} must be a directory owned and only writable by this user")
+
+
+def ring_capacity() -> int:
+    return getattr(settings, 'TELEMETRY_RING_CAPACITY', 1024)
+
+
+class RingBuffer:
+    """Fixed-capacity ring of SENSOR_DTYPE readings in a shared mmap file"""
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        size = RING_HEADER.size + capacity * SENSOR_DTYPE.itemsize
+        private_dir(os.path.dirname(path))
+        # Never follow a planted link: the file is truncated when its header does not match
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if not self._header_matches(size):
+                # New file, or one left by a different capacity/layout
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, RING_HEADER.pack(RING_MAGIC, RING_VERSION, SENSOR_DTYPE.itemsize,
+                                                     capacity, 0, 0), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self._map = mmap.mmap(self._fd, size)
+        self.records = np.ndarray(capacity, dtype=SENSOR_DTYPE, buffer=self._map, offset=RING_HEADER.size)
+
+    def _header_matches(self, size: int) -> bool:
+        if os.fstat(self._fd).st_size != size:
+            return False
+        magic, version, record_size, capacity, _, _ = RING_HEADER.unpack(os.pread(self._fd, RING_HEADER.size, 0))
+        return (magic, version, record_size, capacity) == (RING_MAGIC, RING_VERSION, SENSOR_DTYPE.itemsize,
+                                                           self.capacity)
+
+    @property
+    def written(self) -> int:
+        """Readings ever appended to the ring"""
+        return CURSOR.unpack_from(self._map, CURSOR_OFFSET)[0]
+
+    @property
+    def sequence(self) -> int:
+        return CURSOR.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+
+    def append(self, readings: np.ndarray):
+        """Append readings in order, overwriting the oldest slots"""
+        readings = readings[-self.capacity:]
+        if not len(readings):
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            sequence = self.sequence
+            CURSOR.pack_into(self._map, SEQUENCE_OFFSET, sequence + 1)
+            cursor = self.written
+            slots = (cursor + np.arange(len(readings))) % self.capacity
+            self.records[slots] = readings
+            CURSOR.pack_into(self._map, CURSOR_OFFSET, cursor + len(readings))
+            CURSOR.pack_into(self._map, SEQUENCE_OFFSET, sequence + 2)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _consistent(self, read):
+        """Result of read() over a state no writer touched meanwhile"""
+        for _ in range(READ_RETRIES):
+            before = self.sequence
+            if before & 1:
+                continue
+            result = read()
+            if self.sequence == before:
+                return result
+        fcntl.flock(self._fd, fcntl.LOCK_SH)
+        try:
+            return read()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def latest(self, count: int = 1) -> np.ndarray:
+        """Copy of the newest count readings, oldest first"""
+        count = min(count, self.capacity)
+
+        def read():
+            cursor = self.written
+            available = min(count, cursor)
+            return self.records[(cursor - available + np.arange(available)) % self.capacity]
+        return self._consistent(read)
+
+    def since(self, cursor: int, limit: int) -> Tuple[np.ndarray, int, int]:
+        """
+        Readings appended after the first `cursor` ones, oldest first
+
+        Returns at most limit readings, the cursor after the last of them and
+        how many readings past `cursor` were already overwritten. A cursor
+        beyond the write cursor (the ring was recreated) reads from the start.
+        """
+        def read():
+            written = self.written
+            first = 0 if cursor > written else cursor
+            start = max(first, written - self.capacity)
+            stop = min(written, start + limit)
+            return self.records[np.arange(start, stop) % self.capacity], stop, start - first
+        return self._consistent(read)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+# Rings mapped by this process, keyed by device_id
+_rings: Dict[str, RingBuffer] = {}
+_rings_lock = threading.Lock()
+
+
+def _ring_path(device_id: str) -> str:
+    return os.path.join(ring_dir(), quote(device_id, safe='') + '.ring')
+
+
+def device_ring(device_id: str, create: bool = False) -> Optional[RingBuffer]:
+    """This process's mapping of a device's ring; None if it has none and create is False"""
+    ring = _rings.get(device_id)
+    if ring is None:
+        # Ring reads run in worker threads too; map each file once
+        with _rings_lock:
+            ring = _rings.get(device_id)
+            if ring is None:
+                path = _ring_path(device_id)
+                if not create and not os.path.exists(path):
+                    return None
+                ring = _rings[device_id] = RingBuffer(path, ring_capacity())
+    return ring
+
+
+def publish(device_ids: Sequence[Optional[str]], readings: np.ndarray):
+    """Append ingested readings (SENSOR_DTYPE, parallel to device_ids) to their devices' rings"""
+    if not len(readings):
+        return
+    keys = np.array([device_id or '' for device_id in device_ids], dtype=object)
+    order = np.lexsort((readings['timestamp'], keys.astype(str)))
+    keys, readings = keys[order], readings[order]
+    boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    for start, stop in zip(np.r_[0, boundaries], np.r_[boundaries, len(keys)]):
+        if keys[start]:
+            device_ring(keys[start], create=True).append(readings[start:stop])
+
+
+def reading_records(device_id: str, readings: np.ndarray) -> List[Dict]:
+    """Ring readings as JSON-ready dicts"""
+    records = []
+    for record in TelemetryBatch(readings).iter_records():
+        del record['device']
+        record['device_id'] = device_id
+        # Unmeasured IMU channels are NaN in the ring and null in JSON
+        records.append({key: None if value != value else value for key, value in record.items()})
+    return records
+
+
+def latest_readings(device_id: str, count: int = 1) -> List[Dict]:
+    """Newest readings of a device as JSON-ready dicts, oldest first; [] if none"""
+    ring = device_ring(device_id)
+    if ring is None:
+        return []
+    return reading_records(device_id, ring.latest(count))
+
+
+def raw_since(device_id: str, cursor: int, limit: int) -> Tuple[np.ndarray, int, int]:
+    """SENSOR_DTYPE readings of a device after a ring cursor, with the next cursor and lost count (see RingBuffer.since)"""
+    ring = device_ring(device_id)
+    if ring is None:
+        return empty_readings(0), cursor, 0
+    return ring.since(cursor, limit)
+
+
+def readings_since(device_id: str, cursor: int, limit: int) -> Tuple[List[Dict], int, int]:
+    """raw_since() with the readings as JSON-ready dicts"""
+    readings, cursor, lost = raw_since(device_id, cursor, limit)
+    return reading_records(device_id, readings), cursor, lost
+
+
+def ring_cursor(device_id: str) -> int:
+    """Readings ever published for a device (0 when it has no ring yet)"""
+    ring = device_ring(device_id)
+    return ring.written if ring is not None else 0
+
+
+def latest_reading(device_id: str) -> Optional[Dict]:
+    """Newest reading of a device, or None when nothing has been ingested for it"""
+    readings = latest_readings(device_id, 1)
+    return readings[0] if readings else None
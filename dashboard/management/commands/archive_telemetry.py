@@ -0,0 +1,33 @@
+"""
+Move expired SensorReading partitions into the per-device-day columnar archive
+
+Monthly partitions whose newest reading is older than --days (default
+TELEMETRY_RETENTION_DAYS) whole UTC days are rolled up, written to
+TELEMETRY_ARCHIVE_DIR and dropped; expired readings of the default partition
+are archived and deleted. History queries keep seeing them through the
+archive files.
+
+    python manage.py archive_telemetry [--days 30] [--dry-run]
+"""
+
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard.archive import RetentionPolicy
+
+
+class Command(BaseCommand):
+    help = 'Archive expired sensor reading partitions to compressed per-device-day files and drop them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Whole days of readings kept in the database')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        policy = RetentionPolicy(retain_days=options['days'])
+        summary = policy.run(dry_run=options['dry_run'])
+        summary['elapsed_s'] = round(time.perf_counter() - started, 3)
+        self.stdout.write(json.dumps(summary))
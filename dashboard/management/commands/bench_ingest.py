@@ -0,0 +1,112 @@
+"""
+Throughput comparison of JSON and binary frame telemetry ingestion
+
+Encodes the same simulated batch as NDJSON and as binary frames, then
+times decoding + validation (and optionally the bulk_create write) of each.
+All database work happens inside a transaction that is rolled back.
+
+    python manage.py bench_ingest --readings 100000 --devices 10 --persist
+"""
+
+import json
+import time
+from datetime import date
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dashboard.ingest import columns_from_frames, columns_from_records, parse_body, persist_columns
+from dashboard.ml_utils import SensorDataSimulator
+from dashboard.models import BionicDevice, Patient
+from dashboard.telemetry import TelemetryBatch, decode_frames, encode_frames
+
+
+def create_bench_devices(count):
+    """Throwaway patient and devices for a benchmark; returns (pks, device_ids)"""
+    user = User.objects.create(username=f'bench-ingest-{time.time_ns()}')
+    patient = Patient.objects.create(user=user, patient_id=f'bench-{time.time_ns()}'[:20],
+                                     date_of_birth=date(1980, 1, 1), gender='O', blood_type='O+',
+                                     phone_number='0', emergency_contact='0', address='Benchmark')
+    devices = BionicDevice.objects.bulk_create([
+        BionicDevice(device_id=f'bench-{index:04d}', patient=patient, device_type='standard',
+                     model_name='Benchmark', serial_number=f'BENCH-{time.time_ns()}-{index}',
+                     firmware_version='sim', installation_date=date.today(), warranty_expiry=date.today())
+        for index in range(count)
+    ])
+    if devices[0].pk is None:
+        devices = list(BionicDevice.objects.filter(patient=patient).order_by('device_id'))
+    return [device.pk for device in devices], [device.device_id for device in devices]
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON and binary frame ingestion throughput on simulated telemetry'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readings', type=int, default=100000, help='Readings in the batch')
+        parser.add_argument('--devices', type=int, default=10, help='Devices the readings are spread over')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per format; the best run is reported')
+        parser.add_argument('--persist', action='store_true',
+                            help='Also time the bulk_create write (rolled back afterwards)')
+
+    def handle(self, *args, **options):
+        n_devices = max(1, options['devices'])
+        per_device = max(1, options['readings'] // n_devices)
+
+        with transaction.atomic():
+            device_pks, device_ids = create_bench_devices(n_devices)
+            readings = SensorDataSimulator().generate_batch(n_devices, per_device, 'moderate_activity',
+                                                            rng=np.random.default_rng(0))
+            json_body = ''.join(TelemetryBatch(readings, device_ids).iter_ndjson()).encode()
+            framed = readings.copy()
+            framed['device'] = np.asarray(device_pks, dtype=np.uint32)[readings['device']]
+            binary_body = encode_frames(framed)
+
+            def run_json():
+                return columns_from_records(parse_body(json_body, 'application/x-ndjson'))
+
+            def run_binary():
+                return columns_from_frames(decode_frames(binary_body))
+
+            results = {
+                'json': self.measure(run_json, len(json_body), len(readings), options),
+                'binary': self.measure(run_binary, len(binary_body), len(readings), options),
+            }
+            transaction.set_rollback(True)
+
+        results['speedup'] = {
+            'decode_validate': round(results['json']['decode_validate_s'] / results['binary']['decode_validate_s'], 2),
+            'bytes': round(results['json']['bytes'] / results['binary']['bytes'], 2),
+        }
+        if options['persist']:
+            results['speedup']['end_to_end'] = round(
+                results['json']['end_to_end_s'] / results['binary']['end_to_end_s'], 2)
+        self.stdout.write(json.dumps({'readings': len(readings), 'devices': n_devices, 'results': results},
+                                     indent=2))
+
+    def measure(self, decode, size, count, options):
+        best_decode = best_total = float('inf')
+        for _ in range(max(1, options['repeat'])):
+            started = time.perf_counter()
+            columns = decode()
+            decoded = time.perf_counter()
+            if options['persist']:
+                with transaction.atomic():
+                    persist_columns(columns)
+                    transaction.set_rollback(True)
+            finished = time.perf_counter()
+            best_decode = min(best_decode, decoded - started)
+            best_total = min(best_total, finished - started)
+
+        result = {
+            'bytes': size,
+            'bytes_per_reading': round(size / count, 1),
+            'accepted': int(columns.accepted.sum()),
+            'decode_validate_s': round(best_decode, 4),
+            'decode_validate_readings_per_s': round(count / best_decode),
+        }
+        if options['persist']:
+            result['end_to_end_s'] = round(best_total, 4)
+            result['end_to_end_readings_per_s'] = round(count / best_total)
+        return result
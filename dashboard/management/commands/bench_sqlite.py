@@ -0,0 +1,199 @@
+"""
+Concurrent ingest + dashboard read benchmark for the SQLite DB profiles
+
+Like a multi-worker deployment, several forked processes each run writer
+threads posting small telemetry batches through persist_columns, while
+reader processes poll the newest readings of a device. The run is made
+first with SQLite defaults and then with the 'performance' profile (WAL
+pragmas and the batching writer thread). Benchmark rows are deleted
+afterwards and the journal mode of the configured profile is restored.
+
+    python manage.py bench_sqlite --processes 4 --writers 4 --posts 50 --readers 4
+"""
+
+import json
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from dashboard.db_profile import DB_PROFILES, active_profile
+from dashboard.ingest import columns_from_records, persist_columns
+from dashboard.management.commands.bench_ingest import create_bench_devices
+from dashboard.ml_utils import SensorDataSimulator
+from dashboard.models import BionicDevice
+from dashboard.pagination import keyset_page
+from dashboard.partitions import reading_querysets
+from dashboard.telemetry import TelemetryBatch
+from dashboard.writer import get_writer
+
+
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 2) if values else None
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent ingest/read performance of SQLite defaults and the performance DB profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help='Worker processes running writer threads')
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads per worker process')
+        parser.add_argument('--posts', type=int, default=100, help='Batches posted by each writer')
+        parser.add_argument('--readings-per-post', type=int, default=50, help='Readings per batch')
+        parser.add_argument('--readers', type=int, default=4, help='Dashboard polling processes')
+        parser.add_argument('--poll-interval', type=float, default=0.05, help='Pause between polls of a reader')
+        parser.add_argument('--profile', action='append', dest='profiles', choices=sorted(DB_PROFILES),
+                            help='Profile to run (repeatable; default: default and performance)')
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or ['default', 'performance']
+        device_pks, device_ids = create_bench_devices(options['processes'] * options['writers'])
+        try:
+            posts = self.build_posts(device_ids, options)
+            results = {}
+            for profile in profiles:
+                with override_settings(DB_PROFILE=profile):
+                    results[profile] = self.run(profile, device_pks, posts, options)
+                for queryset in reading_querysets():
+                    queryset.filter(device_id__in=device_pks).delete()
+        finally:
+            patient = BionicDevice.objects.get(pk=device_pks[0]).patient
+            User.objects.filter(pk=patient.user_id).delete()
+            connections.close_all()
+            self.set_journal_mode(active_profile()['pragmas'].get('journal_mode', 'DELETE'))
+
+        if 'default' in results and 'performance' in results:
+            results['speedup'] = {
+                'write_throughput': round(results['performance']['readings_per_s']
+                                          / results['default']['readings_per_s'], 2),
+            }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def build_posts(self, device_ids, options):
+        """Validated columns for every post of every writer, built before timing"""
+        per_post = options['readings_per_post']
+        readings = SensorDataSimulator().generate_batch(len(device_ids), options['posts'] * per_post,
+                                                        rng=np.random.default_rng(0))
+        columns = columns_from_records(list(TelemetryBatch(readings, device_ids).iter_records()))
+        # generate_batch is device-major, so each writer posts consecutive slices of its own device
+        per_writer = options['posts'] * per_post
+        posts = []
+        for writer in range(len(device_ids)):
+            batches = []
+            for start in range(writer * per_writer, (writer + 1) * per_writer, per_post):
+                mask = np.zeros(len(columns), dtype=bool)
+                mask[start:start + per_post] = True
+                batches.append(columns.subset(mask))
+            posts.append(batches)
+        return posts
+
+    def set_journal_mode(self, mode):
+        connections.close_all()
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode = {mode}')
+        connection.close()
+
+    def run(self, profile, device_pks, posts, options):
+        self.set_journal_mode(DB_PROFILES[profile]['pragmas'].get('journal_mode', 'DELETE'))
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        writing = context.Event()
+        writing.set()
+
+        per_process = options['writers']
+        writers = [context.Process(target=_writer_process, args=(posts[index:index + per_process], results))
+                   for index in range(0, len(posts), per_process)]
+        readers = [context.Process(target=_reader_process, args=(device_pks[index % len(device_pks)],
+                                                                 options['poll_interval'], writing, results))
+                   for index in range(options['readers'])]
+        for process in readers:
+            process.start()
+        started = time.perf_counter()
+        for process in writers:
+            process.start()
+
+        write_latencies, read_latencies = [], []
+        errors = {'locked': 0, 'other': 0}
+
+        def collect():
+            kind, latencies, process_errors = results.get()
+            (write_latencies if kind == 'write' else read_latencies).extend(latencies)
+            for key, count in process_errors.items():
+                errors[key] += count
+
+        for _ in writers:
+            collect()
+        elapsed = time.perf_counter() - started
+        writing.clear()
+        for _ in readers:
+            collect()
+        for process in writers + readers:
+            process.join()
+
+        stored = sum(queryset.filter(device_id__in=device_pks).count() for queryset in reading_querysets())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'readings_stored': stored,
+            'readings_per_s': round(stored / elapsed),
+            'write_ms': {'p50': _percentile(write_latencies, 50), 'p95': _percentile(write_latencies, 95),
+                         'p99': _percentile(write_latencies, 99)},
+            'reads': len(read_latencies),
+            'read_ms': {'p50': _percentile(read_latencies, 50), 'p95': _percentile(read_latencies, 95),
+                        'p99': _percentile(read_latencies, 99)},
+            'errors': errors,
+        }
+
+
+def _error_kind(exc):
+    return 'locked' if 'locked' in str(exc) else 'other'
+
+
+def _writer_process(thread_posts, results):
+    """One worker process: a thread per writer, each posting its batches in turn"""
+    latencies, errors = [], {'locked': 0, 'other': 0}
+    lock = threading.Lock()
+
+    def writer(batches):
+        try:
+            for batch in batches:
+                started = time.perf_counter()
+                try:
+                    persist_columns(batch)
+                except OperationalError as exc:
+                    with lock:
+                        errors[_error_kind(exc)] += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=writer, args=(batches,)) for batches in thread_posts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    get_writer().stop()
+    results.put(('write', latencies, errors))
+
+
+def _reader_process(device_pk, poll_interval, writing, results):
+    """Poll the newest readings of a device, like an open dashboard, until the writers finish"""
+    latencies, errors = [], {'locked': 0, 'other': 0}
+    while writing.is_set():
+        started = time.perf_counter()
+        try:
+            keyset_page([queryset.filter(device_id=device_pk) for queryset in reading_querysets()],
+                        None, 100, ('grip_force', 'emg_signal'))
+        except OperationalError as exc:
+            errors[_error_kind(exc)] += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+        time.sleep(poll_interval)
+    connection.close()
+    results.put(('read', latencies, errors))
@@ -0,0 +1,28 @@
+"""
+Create the monthly SensorReading partitions ahead of time
+
+Ingest never creates tables itself, so this must run before a month starts
+(e.g. daily from cron); migrate also runs it.
+
+    python manage.py create_partitions [--months-ahead 2]
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.partitions import get_router
+
+
+class Command(BaseCommand):
+    help = 'Create the sensor reading partitions of the current and the next months'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int,
+                            help='Months after the current one to create (default PARTITION_MONTHS_AHEAD)')
+
+    def handle(self, *args, **options):
+        if options['months_ahead'] is not None and options['months_ahead'] < 0:
+            raise CommandError('--months-ahead must not be negative')
+        created = get_router().ensure(options['months_ahead'])
+        self.stdout.write(json.dumps({'created': [partition.table_name for partition in created]}))
@@ -0,0 +1,88 @@
+"""
+Export a device's sensor readings to a CSV or NDJSON file, optionally gzipped
+
+Rows are streamed chunk by chunk, so memory use does not grow with the size
+of the range. An interrupted uncompressed export can be continued with
+--resume, which picks up after the last complete line of the output file.
+
+    python manage.py export_telemetry DEVICE_ID --output readings.csv [--format csv] [--gzip]
+        [--start 2025-01-01] [--end 2025-02-01] [--fields grip_force,emg_signal] [--resume]
+"""
+
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.export import EXPORT_FORMATS, export_stream, last_row_cursor
+from dashboard.models import BionicDevice
+from dashboard.pagination import parse_fields
+from dashboard.telemetry_views import parse_time_param
+
+
+class Command(BaseCommand):
+    help = 'Stream the sensor readings of a device to a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('device_id')
+        parser.add_argument('--output', required=True, help='File to write')
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--start', help='ISO timestamp or epoch seconds (default: everything)')
+        parser.add_argument('--end', help='ISO timestamp or epoch seconds, exclusive (default: now)')
+        parser.add_argument('--fields', help='Comma-separated reading fields (default: all)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows fetched and written at a time')
+        parser.add_argument('--resume', action='store_true',
+                            help='Append to an existing uncompressed output after its last complete row')
+
+    def handle(self, *args, **options):
+        try:
+            device = BionicDevice.objects.get(device_id=options['device_id'])
+        except BionicDevice.DoesNotExist:
+            raise CommandError(f"Unknown device: {options['device_id']}")
+        try:
+            start = parse_time_param(options['start'], 0)
+            end = parse_time_param(options['end'], time.time() + 1)
+            fields = parse_fields(options['fields'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        path, fmt = options['output'], options['format']
+        cursor = None
+        if options['resume'] and os.path.exists(path):
+            if options['gzip']:
+                raise CommandError('--resume only works for uncompressed output')
+            cursor = self.truncate_to_last_row(path, fmt)
+
+        started = time.perf_counter()
+        stream = export_stream(device.pk, start, end, fmt, fields, cursor, options['gzip'], options['chunk_size'])
+        written = 0
+        with open(path, 'ab' if cursor is not None else 'wb') as output:
+            for part in stream:
+                data = part if isinstance(part, bytes) else part.encode()
+                output.write(data)
+                written += len(data)
+
+        self.stdout.write(json.dumps({
+            'device_id': device.device_id,
+            'output': path,
+            'format': fmt + ('.gz' if options['gzip'] else ''),
+            'resumed_after': cursor,
+            'bytes_written': written,
+            'elapsed_s': round(time.perf_counter() - started, 3),
+        }))
+
+    def truncate_to_last_row(self, path, fmt):
+        """Drop a trailing partial line and return the resume cursor of the last complete row"""
+        with open(path, 'rb+') as output:
+            size = output.seek(0, os.SEEK_END)
+            tail_start = max(0, size - 65536)
+            output.seek(tail_start)
+            tail = output.read()
+            complete = tail.rfind(b'\n') + 1
+            output.truncate(tail_start + complete)
+        lines = tail[:complete].splitlines()
+        if not lines:
+            return None
+        return last_row_cursor(lines[-1].decode(), fmt)
@@ -0,0 +1,316 @@
+"""
+Fleet load generator for the telemetry endpoints
+
+Emulates N devices posting simulated telemetry and M dashboard clients
+polling the live sensor endpoints of a running server, then prints a JSON
+summary of throughput, latency percentiles and error rates per endpoint.
+
+    python manage.py loadgen --devices 500 --clients 50 --duration 30
+"""
+
+import http.client
+import json
+import threading
+import time
+from collections import Counter
+from datetime import date
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.ml_utils import SensorStream
+from dashboard.models import BionicDevice, Patient
+from dashboard.telemetry import FRAME_CONTENT_TYPE, TelemetryBatch, encode_frames
+
+DEFAULT_POLL_PATHS = ['/api/sensors/', '/dashboard/api/sensor-data/']
+DEFAULT_INGEST_PATH = '/dashboard/api/telemetry/ingest/'
+
+
+class EndpointStats:
+    """Latency samples and outcome counters for one endpoint (one thread)"""
+
+    def __init__(self):
+        self.latencies_ms = []
+        self.errors = 0
+        self.status_codes = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.readings_accepted = 0
+        self.readings_rejected = 0
+
+    def merge(self, other):
+        self.latencies_ms.extend(other.latencies_ms)
+        self.errors += other.errors
+        self.status_codes.update(other.status_codes)
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+        self.readings_accepted += other.readings_accepted
+        self.readings_rejected += other.readings_rejected
+
+    def summary(self, elapsed):
+        latencies = np.asarray(self.latencies_ms, dtype=np.float64)
+        percentiles = {}
+        if latencies.size:
+            p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99])
+            percentiles = {
+                'mean': round(float(latencies.mean()), 3),
+                'p50': round(float(p50), 3),
+                'p90': round(float(p90), 3),
+                'p95': round(float(p95), 3),
+                'p99': round(float(p99), 3),
+                'max': round(float(latencies.max()), 3),
+            }
+        attempts = len(latencies) + self.status_codes.get('connection_error', 0)
+        return {
+            'requests': attempts,
+            'errors': self.errors,
+            'error_rate': round(self.errors / attempts, 6) if attempts else 0.0,
+            'throughput_rps': round(attempts / elapsed, 3) if elapsed else 0.0,
+            'latency_ms': percentiles,
+            'status_codes': {str(code): count for code, count in sorted(self.status_codes.items(), key=str)},
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'readings_accepted': self.readings_accepted,
+            'readings_rejected': self.readings_rejected,
+        }
+
+
+class Worker(threading.Thread):
+    """Base worker holding one keep-alive connection and its own stats"""
+
+    def __init__(self, host, port, deadline, timeout):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.deadline = deadline
+        self.timeout = timeout
+        self.connection = None
+        self.stats = {}
+
+    def request(self, label, method, path, body=None, headers=None):
+        stats = self.stats.setdefault(label, EndpointStats())
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            stats.errors += 1
+            stats.status_codes['connection_error'] += 1
+            return None
+        stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+        stats.status_codes[response.status] += 1
+        stats.bytes_sent += len(body) if body else 0
+        stats.bytes_received += len(payload)
+        if response.status >= 400:
+            stats.errors += 1
+        return payload
+
+    def sleep_until(self, moment):
+        delay = moment - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, max(self.deadline - time.monotonic(), 0)))
+
+
+class DeviceWorker(Worker):
+    """Posts telemetry for a slice of the simulated fleet"""
+
+    def __init__(self, host, port, deadline, timeout, ingest_path, device_ids,
+                 post_interval, samples_per_post, sample_rate, seed, device_pks=None):
+        super().__init__(host, port, deadline, timeout)
+        self.ingest_path = ingest_path
+        self.device_ids = device_ids
+        # Binary frames carry primary keys instead of device_id strings
+        self.device_pks = device_pks
+        self.post_interval = post_interval
+        self.stream = SensorStream(n_devices=len(device_ids), sample_rate=sample_rate,
+                                   chunk_size=samples_per_post, activity_level='light_activity', seed=seed)
+
+    def run(self):
+        content_type = FRAME_CONTENT_TYPE if self.device_pks is not None else 'application/x-ndjson'
+        headers = {'Content-Type': content_type}
+        next_post = time.monotonic()
+        while time.monotonic() < self.deadline:
+            chunk = self.stream.next_chunk()
+            per_device = len(chunk) // len(self.device_ids)
+            # Spread this round's posts evenly over the interval
+            spacing = self.post_interval / len(self.device_ids)
+            for index in range(len(self.device_ids)):
+                if time.monotonic() >= self.deadline:
+                    break
+                rows = chunk[index * per_device:(index + 1) * per_device].copy()
+                if self.device_pks is not None:
+                    rows['device'] = self.device_pks[index]
+                    body = encode_frames(rows)
+                else:
+                    rows['device'] = index
+                    body = ''.join(TelemetryBatch(rows, self.device_ids).iter_ndjson()).encode()
+                label = 'ingest ' + self.ingest_path
+                payload = self.request(label, 'POST', self.ingest_path, body, headers)
+                self.count_readings(label, payload)
+                next_post += spacing
+                self.sleep_until(next_post)
+
+    def count_readings(self, label, payload):
+        try:
+            result = json.loads(payload)
+        except (TypeError, ValueError):
+            return
+        if isinstance(result, dict):
+            self.stats[label].readings_accepted += int(result.get('accepted', 0))
+            self.stats[label].readings_rejected += int(result.get('rejected', 0))
+
+
+class ClientWorker(Worker):
+    """Polls the live sensor endpoints like an open dashboard"""
+
+    def __init__(self, host, port, deadline, timeout, poll_paths, poll_interval):
+        super().__init__(host, port, deadline, timeout)
+        self.poll_paths = poll_paths
+        self.poll_interval = poll_interval
+
+    def run(self):
+        next_poll = time.monotonic()
+        while time.monotonic() < self.deadline:
+            for path in self.poll_paths:
+                self.request('poll ' + path, 'GET', path)
+            next_poll += self.poll_interval
+            self.sleep_until(next_poll)
+
+
+class Command(BaseCommand):
+    help = 'Emulate a fleet of devices and dashboards against a running server and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000',
+                            help='Server to load (default: http://127.0.0.1:8000)')
+        parser.add_argument('--devices', type=int, default=500, help='Simulated devices posting telemetry')
+        parser.add_argument('--clients', type=int, default=50, help='Simulated dashboards polling')
+        parser.add_argument('--duration', type=float, default=30.0, help='Test length in seconds')
+        parser.add_argument('--ingest-path', default=DEFAULT_INGEST_PATH,
+                            help=f'Telemetry ingest path (default: {DEFAULT_INGEST_PATH}); '
+                                 'pass an empty value to skip device traffic')
+        parser.add_argument('--poll-path', action='append', dest='poll_paths',
+                            help=f'Path polled by clients (repeatable, default: {", ".join(DEFAULT_POLL_PATHS)})')
+        parser.add_argument('--format', choices=['ndjson', 'binary'], default='ndjson',
+                            help='Device payload encoding; binary needs the devices in the local database')
+        parser.add_argument('--post-interval', type=float, default=1.0,
+                            help='Seconds between posts from one device')
+        parser.add_argument('--samples-per-post', type=int, default=50,
+                            help='Readings in each device post')
+        parser.add_argument('--sample-rate', type=float, default=50.0, help='Simulated sensor rate in Hz')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds between polls from one client')
+        parser.add_argument('--device-workers', type=int, default=16,
+                            help='Threads the device fleet is spread across')
+        parser.add_argument('--device-prefix', default='sim-', help='Prefix of simulated device ids')
+        parser.add_argument('--create-devices', action='store_true',
+                            help='Create BionicDevice rows for the simulated fleet in the local database')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout in seconds')
+        parser.add_argument('--output', help='Also write the JSON summary to this file')
+
+    def handle(self, *args, **options):
+        target = urlsplit(options['base_url'])
+        if target.scheme != 'http' or not target.hostname:
+            raise CommandError('--base-url must be an http:// URL')
+        host, port = target.hostname, target.port or 80
+        poll_paths = options['poll_paths'] or DEFAULT_POLL_PATHS
+        ingest_path = options['ingest_path']
+
+        deadline = time.monotonic() + options['duration']
+        workers = []
+
+        if ingest_path and options['devices'] > 0:
+            device_ids = [f"{options['device_prefix']}{index:04d}" for index in range(options['devices'])]
+            if options['create_devices']:
+                created = self.create_devices(device_ids)
+                self.stderr.write(f'Created {created} simulated devices')
+            pk_lookup = None
+            if options['format'] == 'binary':
+                pk_lookup = dict(BionicDevice.objects.filter(device_id__in=device_ids)
+                                 .values_list('device_id', 'pk'))
+                if len(pk_lookup) != len(device_ids):
+                    raise CommandError('Binary format needs every simulated device registered; '
+                                       'add --create-devices')
+            worker_count = max(1, min(options['device_workers'], len(device_ids)))
+            for index in range(worker_count):
+                subset = device_ids[index::worker_count]
+                workers.append(DeviceWorker(
+                    host, port, deadline, options['timeout'], ingest_path, subset,
+                    options['post_interval'], options['samples_per_post'], options['sample_rate'], seed=index,
+                    device_pks=[pk_lookup[device_id] for device_id in subset] if pk_lookup else None))
+
+        for _ in range(options['clients']):
+            workers.append(ClientWorker(host, port, deadline, options['timeout'],
+                                        poll_paths, options['poll_interval']))
+
+        if not workers:
+            raise CommandError('Nothing to do: give --clients or --ingest-path with --devices')
+
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - started
+
+        merged = {}
+        for worker in workers:
+            for label, stats in worker.stats.items():
+                merged.setdefault(label, EndpointStats()).merge(stats)
+        total = EndpointStats()
+        for stats in merged.values():
+            total.merge(stats)
+
+        summary = {
+            'config': {
+                'base_url': options['base_url'],
+                'devices': options['devices'] if ingest_path else 0,
+                'format': options['format'],
+                'clients': options['clients'],
+                'duration_s': options['duration'],
+                'post_interval_s': options['post_interval'],
+                'samples_per_post': options['samples_per_post'],
+                'poll_interval_s': options['poll_interval'],
+            },
+            'elapsed_s': round(elapsed, 3),
+            'endpoints': {label: stats.summary(elapsed) for label, stats in sorted(merged.items())},
+            'total': total.summary(elapsed),
+        }
+
+        report = json.dumps(summary, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(report + '\n')
+        self.stdout.write(report)
+
+    def create_devices(self, device_ids):
+        """Register the simulated fleet under one placeholder patient"""
+        existing = set(BionicDevice.objects.filter(device_id__in=device_ids).values_list('device_id', flat=True))
+        missing = [device_id for device_id in device_ids if device_id not in existing]
+        if not missing:
+            return 0
+        user, _ = User.objects.get_or_create(username='loadgen-patient')
+        patient, _ = Patient.objects.get_or_create(user=user, defaults={
+            'patient_id': 'loadgen',
+            'date_of_birth': date(1980, 1, 1),
+            'gender': 'O',
+            'blood_type': 'O+',
+            'phone_number': '0000000000',
+            'emergency_contact': '0000000000',
+            'address': 'Load generator',
+        })
+        BionicDevice.objects.bulk_create([
+            BionicDevice(device_id=device_id, patient=patient, device_type='standard',
+                         model_name='Simulated Hand', serial_number=f'LOADGEN-{device_id}',
+                         firmware_version='sim', status='active',
+                         installation_date=date.today(), warranty_expiry=date.today())
+            for device_id in missing
+        ])
+        return len(missing)
@@ -0,0 +1,40 @@
+"""
+Fold new SensorReading rows into the DeviceRollup and DeviceAnalytics tables
+
+Only readings past each device's high-water mark are read, so the command is
+cheap to run often (e.g. every minute from cron).
+
+    python manage.py rollup_telemetry [--device DEVICE_ID ...]
+"""
+
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.models import BionicDevice
+from dashboard.rollups import RollupEngine
+
+
+class Command(BaseCommand):
+    help = 'Incrementally roll up new sensor readings into minute/hour/day aggregates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--device', action='append', dest='devices',
+                            help='Only roll up this device_id (repeatable)')
+        parser.add_argument('--chunk-size', type=int, help='Readings folded per transaction')
+
+    def handle(self, *args, **options):
+        device_pks = None
+        if options['devices']:
+            lookup = dict(BionicDevice.objects.filter(device_id__in=options['devices'])
+                          .values_list('device_id', 'pk'))
+            missing = sorted(set(options['devices']) - set(lookup))
+            if missing:
+                raise CommandError(f"Unknown device(s): {', '.join(missing)}")
+            device_pks = lookup.values()
+
+        started = time.perf_counter()
+        summary = RollupEngine(chunk_size=options['chunk_size']).run(device_pks)
+        summary['elapsed_s'] = round(time.perf_counter() - started, 3)
+        self.stdout.write(json.dumps(summary))
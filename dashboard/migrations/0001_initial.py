@@ -0,0 +1,207 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:49
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Doctor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doctor_id', models.CharField(default=uuid.uuid4, max_length=20, unique=True)),
+                ('specialization', models.CharField(max_length=100)),
+                ('license_number', models.CharField(max_length=50, unique=True)),
+                ('years_of_experience', models.IntegerField(validators=[django.core.validators.MinValueValidator(0)])),
+                ('hospital_affiliation', models.CharField(max_length=200)),
+                ('phone_number', models.CharField(max_length=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='doctor_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user__last_name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('maintenance', 'Maintenance Required'), ('battery_low', 'Low Battery'), ('error', 'Error Alert'), ('appointment', 'Appointment Reminder'), ('prescription', 'Prescription Update'), ('report', 'New Report Available')], max_length=20)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Patient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('patient_id', models.CharField(default=uuid.uuid4, max_length=20, unique=True)),
+                ('date_of_birth', models.DateField()),
+                ('gender', models.CharField(choices=[('M', 'Male'), ('F', 'Female'), ('O', 'Other')], max_length=1)),
+                ('blood_type', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('phone_number', models.CharField(max_length=15)),
+                ('emergency_contact', models.CharField(max_length=15)),
+                ('address', models.TextField()),
+                ('medical_history', models.TextField(blank=True, null=True)),
+                ('allergies', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='patient_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MedicalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_type', models.CharField(choices=[('xray', 'X-Ray'), ('mri', 'MRI'), ('ct_scan', 'CT Scan'), ('blood_test', 'Blood Test'), ('emg_test', 'EMG Test'), ('general', 'General Checkup')], max_length=20)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('file_path', models.FileField(blank=True, null=True, upload_to='medical_records/')),
+                ('ai_analysis', models.JSONField(blank=True, null=True)),
+                ('fracture_detected', models.BooleanField(default=False)),
+                ('bone_density', models.CharField(blank=True, max_length=20, null=True)),
+                ('arthritis_detected', models.BooleanField(default=False)),
+                ('confidence_score', models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('recommendations', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='medical_records', to='dashboard.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='medical_records', to='dashboard.patient')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BionicDevice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(default=uuid.uuid4, max_length=50, unique=True)),
+                ('device_type', models.CharField(choices=[('precision', 'Precision Model'), ('standard', 'Standard Model'), ('lightweight', 'Lightweight Model'), ('comfort_plus', 'Comfort Plus Model'), ('athletic', 'Athletic Performance Model')], max_length=20)),
+                ('model_name', models.CharField(max_length=100)),
+                ('serial_number', models.CharField(max_length=100, unique=True)),
+                ('firmware_version', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive'), ('maintenance', 'Under Maintenance'), ('emergency_stop', 'Emergency Stop')], default='inactive', max_length=20)),
+                ('battery_level', models.IntegerField(default=100, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('last_maintenance', models.DateField(blank=True, null=True)),
+                ('installation_date', models.DateField()),
+                ('warranty_expiry', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='devices', to='dashboard.patient')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Appointment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_date', models.DateTimeField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('rescheduled', 'Rescheduled')], default='scheduled', max_length=20)),
+                ('reason', models.TextField()),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to='dashboard.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to='dashboard.patient')),
+            ],
+            options={
+                'ordering': ['appointment_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Prescription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prescription_id', models.CharField(default=uuid.uuid4, max_length=20, unique=True)),
+                ('diagnosis', models.TextField()),
+                ('medications', models.JSONField()),
+                ('instructions', models.TextField()),
+                ('follow_up_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prescriptions', to='dashboard.doctor')),
+                ('medical_record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='prescriptions', to='dashboard.medicalrecord')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prescriptions', to='dashboard.patient')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeviceAnalytics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_usage_hours', models.FloatField(default=0)),
+                ('active_usage_hours', models.FloatField(default=0)),
+                ('grip_count', models.IntegerField(default=0)),
+                ('average_grip_force', models.FloatField(default=0)),
+                ('response_time_ms', models.FloatField(default=0)),
+                ('accuracy_percentage', models.FloatField(default=100, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('error_count', models.IntegerField(default=0)),
+                ('emergency_stops', models.IntegerField(default=0)),
+                ('charge_cycles', models.IntegerField(default=0)),
+                ('average_battery_life', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analytics', to='dashboard.bionicdevice')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('device', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SensorReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('emg_signal', models.FloatField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1000)])),
+                ('grip_force', models.FloatField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('thumb_flex', models.FloatField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(90)])),
+                ('index_flex', models.FloatField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(90)])),
+                ('middle_flex', models.FloatField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(90)])),
+                ('ring_flex', models.FloatField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(90)])),
+                ('pinky_flex', models.FloatField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(90)])),
+                ('temperature', models.FloatField(validators=[django.core.validators.MinValueValidator(20), django.core.validators.MaxValueValidator(45)])),
+                ('palm_pressure', models.FloatField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('accel_x', models.FloatField(blank=True, null=True)),
+                ('accel_y', models.FloatField(blank=True, null=True)),
+                ('accel_z', models.FloatField(blank=True, null=True)),
+                ('gyro_x', models.FloatField(blank=True, null=True)),
+                ('gyro_y', models.FloatField(blank=True, null=True)),
+                ('gyro_z', models.FloatField(blank=True, null=True)),
+                ('battery_level', models.IntegerField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('is_calibrated', models.BooleanField(default=True)),
+                ('error_code', models.CharField(blank=True, max_length=20, null=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sensor_readings', to='dashboard.bionicdevice')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['-timestamp'], name='dashboard_s_timesta_08091c_idx'), models.Index(fields=['device', '-timestamp'], name='dashboard_s_device__227b3c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_sensorreading_device_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_reading_id', models.BigIntegerField(default=0)),
+                ('last_grip_force', models.FloatField(blank=True, null=True)),
+                ('last_error_code', models.CharField(blank=True, max_length=20, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rollup_watermark', to='dashboard.bionicdevice')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DeviceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('bucket_start', models.DateTimeField()),
+                ('reading_count', models.IntegerField(default=0)),
+                ('active_count', models.IntegerField(default=0)),
+                ('minutes_seen', models.IntegerField(default=0)),
+                ('grip_count', models.IntegerField(default=0)),
+                ('grip_force_sum', models.FloatField(default=0)),
+                ('grip_force_max', models.FloatField(default=0)),
+                ('emg_signal_sum', models.FloatField(default=0)),
+                ('emg_signal_max', models.FloatField(default=0)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_max', models.FloatField(default=0)),
+                ('battery_min', models.IntegerField(default=100)),
+                ('error_count', models.IntegerField(default=0)),
+                ('emergency_stops', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='dashboard.bionicdevice')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'unique_together': {('device', 'resolution', 'bucket_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_device_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deviceanalytics',
+            name='response_time_sketch',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
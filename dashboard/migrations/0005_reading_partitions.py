@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_deviceanalytics_response_time_sketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('table_name', models.CharField(max_length=64, unique=True)),
+                ('first_id', models.BigIntegerField()),
+                ('min_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('max_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('sealed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+    ]
@@ -6,7 +6,9 @@ Enhanced accuracy through statistical models and pattern recognition
 import numpy as np
 import random
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional, Sequence, Union
+
+from .telemetry import FINGER_CHANNELS, empty_readings, now_epoch
 
 class MedicalAnalysisEngine:
     """Advanced medical analysis engine with improved accuracy"""
@@ -305,6 +307,18 @@ class SensorDataSimulator:
             'moderate_activity': {'emg_range': (350, 600), 'grip_range': (30, 60)},
             'heavy_activity': {'emg_range': (600, 900), 'grip_range': (60, 90)}
         }
+        self.activity_heating = {'rest': 0, 'light_activity': 0.5,
+                                 'moderate_activity': 1.0, 'heavy_activity': 2.0}
+        self.accel_magnitude = {'rest': 0.1, 'light_activity': 0.5,
+                                'moderate_activity': 1.0, 'heavy_activity': 2.0}
+        self.discharge_rate = {'rest': 0.01, 'light_activity': 0.02,
+                               'moderate_activity': 0.03, 'heavy_activity': 0.05}
+        self.finger_patterns = {
+            'rest': [5, 5, 5, 5, 5],
+            'light_activity': [20, 25, 20, 15, 10],
+            'moderate_activity': [45, 50, 45, 40, 35],
+            'heavy_activity': [70, 75, 70, 65, 60]
+        }
     
     def generate_sensor_reading(self, device_status: str = 'active', 
                                activity_level: str = 'moderate_activity') -> Dict:
@@ -340,23 +354,17 @@ class SensorDataSimulator:
         
         # Temperature (body temperature range with device heating)
         base_temp = 36.5
-        activity_heating = {'rest': 0, 'light_activity': 0.5, 
-                          'moderate_activity': 1.0, 'heavy_activity': 2.0}
-        temperature = base_temp + activity_heating.get(activity_level, 0.5) + np.random.normal(0, 0.3)
+        temperature = base_temp + self.activity_heating.get(activity_level, 0.5) + np.random.normal(0, 0.3)
         
         # Palm pressure correlated with grip force
         palm_pressure = grip_force * 0.8 + np.random.uniform(-5, 5)
         palm_pressure = max(0, min(100, palm_pressure))
         
         # Accelerometer and Gyroscope data (simulating hand movement)
-        accel_magnitude = {'rest': 0.1, 'light_activity': 0.5, 
-                          'moderate_activity': 1.0, 'heavy_activity': 2.0}
-        mag = accel_magnitude.get(activity_level, 1.0)
+        mag = self.accel_magnitude.get(activity_level, 1.0)
         
         # Battery level simulation (discharge rate based on activity)
-        discharge_rate = {'rest': 0.01, 'light_activity': 0.02, 
-                         'moderate_activity': 0.03, 'heavy_activity': 0.05}
-        battery_drain = discharge_rate.get(activity_level, 0.03)
+        battery_drain = self.discharge_rate.get(activity_level, 0.03)
         battery_level = max(20, 100 - np.random.exponential(battery_drain) * 100)
         
         sensor_data = {
@@ -383,16 +391,81 @@ class SensorDataSimulator:
         
         return sensor_data
     
+    def generate_batch(self, n_devices: int, n_samples: int,
+                       activity_levels: Union[str, Sequence[str]] = 'moderate_activity',
+                       sample_rate: float = 50.0, start_time: Optional[float] = None,
+                       rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        Generate readings for a fleet of devices with vectorized draws
+        
+        Args:
+            n_devices: Number of simulated devices (indexed 0..n_devices-1)
+            n_samples: Readings per device
+            activity_levels: One level for all devices or one per device
+            sample_rate: Samples per second, used to space timestamps
+            start_time: Epoch seconds of the first sample (defaults to now)
+            rng: NumPy generator, for reproducible batches
+        
+        Returns:
+            Structured array of SENSOR_DTYPE, device-major, n_devices * n_samples rows
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        levels = list(self.base_patterns)
+        if isinstance(activity_levels, str):
+            activity_levels = [activity_levels] * n_devices
+        if len(activity_levels) != n_devices:
+            raise ValueError('activity_levels must have one entry per device')
+        
+        default = levels.index('moderate_activity')
+        level_index = np.array([levels.index(level) if level in self.base_patterns else default
+                                for level in activity_levels], dtype=np.intp)
+        rows = np.repeat(level_index, n_samples)
+        size = rows.size
+        
+        # Per-level lookup tables, broadcast to one value per row
+        emg_range = np.array([self.base_patterns[level]['emg_range'] for level in levels], dtype=np.float64)
+        grip_range = np.array([self.base_patterns[level]['grip_range'] for level in levels], dtype=np.float64)
+        heating = np.array([self.activity_heating[level] for level in levels])[rows]
+        mag = np.array([self.accel_magnitude[level] for level in levels])[rows]
+        drain = np.array([self.discharge_rate[level] for level in levels])[rows]
+        fingers = np.array([self.finger_patterns[level] for level in levels], dtype=np.float64)[rows]
+        
+        readings = empty_readings(size)
+        readings['device'] = np.repeat(np.arange(n_devices, dtype=np.uint32), n_samples)
+        start = start_time if start_time is not None else now_epoch()
+        readings['timestamp'] = start + np.tile(np.arange(n_samples) / sample_rate, n_devices)
+        
+        # Same distributions as generate_sensor_reading, one draw per column
+        emg = rng.uniform(emg_range[rows, 0], emg_range[rows, 1]) + rng.normal(0, 10, size)
+        np.clip(emg, 0, 1000, out=emg)
+        grip = rng.uniform(grip_range[rows, 0], grip_range[rows, 1]) * 0.3 + emg / 1000 * 100 * 0.7
+        np.clip(grip, 0, 100, out=grip)
+        readings['emg_signal'] = emg
+        readings['grip_force'] = grip
+        
+        flex = np.clip(fingers + rng.normal(0, 5, (size, len(FINGER_CHANNELS))), 0, 90)
+        for column, channel in enumerate(FINGER_CHANNELS):
+            readings[channel] = flex[:, column]
+        
+        readings['temperature'] = 36.5 + heating + rng.normal(0, 0.3, size)
+        readings['palm_pressure'] = np.clip(grip * 0.8 + rng.uniform(-5, 5, size), 0, 100)
+        readings['accel_x'] = rng.normal(0, mag)
+        readings['accel_y'] = rng.normal(0, mag)
+        readings['accel_z'] = rng.normal(9.8, mag * 0.1)
+        readings['gyro_x'] = rng.normal(0, mag * 10)
+        readings['gyro_y'] = rng.normal(0, mag * 10)
+        readings['gyro_z'] = rng.normal(0, mag * 10)
+        
+        battery = np.maximum(20, 100 - rng.exponential(drain) * 100)
+        readings['battery_level'] = np.round(battery)
+        readings['is_calibrated'] = True
+        readings['error_code'] = b''
+        
+        return readings
+    
     def _generate_finger_pattern(self, activity_level: str) -> List[float]:
         """Generate realistic finger flex patterns"""
-        patterns = {
-            'rest': [5, 5, 5, 5, 5],
-            'light_activity': [20, 25, 20, 15, 10],
-            'moderate_activity': [45, 50, 45, 40, 35],
-            'heavy_activity': [70, 75, 70, 65, 60]
-        }
-        
-        base_pattern = patterns.get(activity_level, patterns['moderate_activity'])
+        base_pattern = self.finger_patterns.get(activity_level, self.finger_patterns['moderate_activity'])
         return [max(0, min(90, val + np.random.normal(0, 5))) for val in base_pattern]
     
     def _generate_inactive_reading(self, status: str) -> Dict:
@@ -420,6 +493,176 @@ class SensorDataSimulator:
         }
 
 
+class SensorStream:
+    """
+    Stateful, time-correlated sensor stream for a fleet of devices
+    
+    Each channel follows an Ornstein-Uhlenbeck (AR(1)) process pulled toward
+    the mean of the device's current activity level, activity levels change
+    as a Markov chain and battery charge is integrated from the discharge
+    rate of each level. Chunks are generated with array scans rather than a
+    Python loop per sample, so the stream runs far faster than real time.
+    """
+    
+    MAX_SAMPLE_RATE = 1000.0
+    
+    # Processes driving the output channels; grip_base and palm_noise are
+    # latent and combined with EMG the same way generate_sensor_reading does
+    PROCESSES = ('emg_signal', 'grip_base') + FINGER_CHANNELS + (
+        'temperature', 'palm_noise', 'accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z')
+    
+    # Correlation time of each process in seconds
+    CORRELATION_TIME = {
+        'emg_signal': 0.05, 'grip_base': 0.2, 'temperature': 120.0, 'palm_noise': 0.1,
+        'accel_x': 0.1, 'accel_y': 0.1, 'accel_z': 0.1,
+        'gyro_x': 0.05, 'gyro_y': 0.05, 'gyro_z': 0.05,
+    }
+    FINGER_CORRELATION_TIME = 0.15
+    
+    # Per-second probability of moving between activity levels (rows: from)
+    ACTIVITY_TRANSITIONS = {
+        'rest': {'rest': 0.90, 'light_activity': 0.08, 'moderate_activity': 0.02, 'heavy_activity': 0.0},
+        'light_activity': {'rest': 0.10, 'light_activity': 0.80, 'moderate_activity': 0.08, 'heavy_activity': 0.02},
+        'moderate_activity': {'rest': 0.04, 'light_activity': 0.10, 'moderate_activity': 0.80, 'heavy_activity': 0.06},
+        'heavy_activity': {'rest': 0.05, 'light_activity': 0.05, 'moderate_activity': 0.20, 'heavy_activity': 0.70},
+    }
+    TRANSITION_INTERVAL = 1.0  # seconds between Markov steps
+    
+    # SensorDataSimulator.discharge_rate scaled to percent per hour
+    BATTERY_DRAIN_SCALE = 500.0
+    
+    def __init__(self, n_devices: int = 1, sample_rate: float = MAX_SAMPLE_RATE,
+                 chunk_size: int = 1000, activity_level: str = 'rest',
+                 start_time: Optional[float] = None, seed: Optional[int] = None,
+                 simulator: Optional[SensorDataSimulator] = None):
+        if not 0 < sample_rate <= self.MAX_SAMPLE_RATE:
+            raise ValueError(f'sample_rate must be in (0, {self.MAX_SAMPLE_RATE:g}] Hz')
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+        
+        self.simulator = simulator or SensorDataSimulator()
+        self.levels = list(self.simulator.base_patterns)
+        self.n_devices = n_devices
+        self.sample_rate = float(sample_rate)
+        self.chunk_size = chunk_size
+        self.rng = np.random.default_rng(seed)
+        self.sample_index = 0
+        self.start_time = start_time if start_time is not None else now_epoch()
+        
+        self._means, self._stds = self._level_tables()
+        dt = 1.0 / self.sample_rate
+        tau = np.array([self.CORRELATION_TIME.get(name, self.FINGER_CORRELATION_TIME)
+                        for name in self.PROCESSES])
+        self._phi = np.exp(-dt / tau)
+        self._innovation_scale = np.sqrt(1 - self._phi ** 2)
+        # Keep phi ** -block below e ** 30 so the blocked scan stays well conditioned
+        self._scan_block = max(1, int(30 / -np.log(self._phi.min())))
+        self._transitions = np.array([[self.ACTIVITY_TRANSITIONS[a][b] for b in self.levels]
+                                      for a in self.levels])
+        self._transition_cdf = np.cumsum(self._transitions, axis=1)
+        self._samples_per_transition = max(1, int(round(self.TRANSITION_INTERVAL * self.sample_rate)))
+        self._drain_per_sample = np.array([self.simulator.discharge_rate[level] for level in self.levels]
+                                          ) * self.BATTERY_DRAIN_SCALE / 3600.0 * dt
+        
+        start_level = self.levels.index(activity_level) if activity_level in self.levels else 0
+        self.activity = np.full(n_devices, start_level, dtype=np.intp)
+        self.state = self._means[self.activity] + self._stds[self.activity] * self.rng.standard_normal(
+            (n_devices, len(self.PROCESSES)))
+        self.battery = np.full(n_devices, 100.0)
+    
+    def _level_tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Stationary mean and standard deviation of each process per activity level"""
+        sim = self.simulator
+        means, stds = [], []
+        for level in self.levels:
+            emg_lo, emg_hi = sim.base_patterns[level]['emg_range']
+            grip_lo, grip_hi = sim.base_patterns[level]['grip_range']
+            mag = sim.accel_magnitude[level]
+            means.append([(emg_lo + emg_hi) / 2, (grip_lo + grip_hi) / 2] + sim.finger_patterns[level]
+                         + [36.5 + sim.activity_heating[level], 0.0, 0.0, 0.0, 9.8, 0.0, 0.0, 0.0])
+            stds.append([np.hypot((emg_hi - emg_lo) / np.sqrt(12), 10), (grip_hi - grip_lo) / np.sqrt(12)]
+                        + [5.0] * len(FINGER_CHANNELS)
+                        + [0.3, 10 / np.sqrt(12), mag, mag, mag * 0.1, mag * 10, mag * 10, mag * 10])
+        return np.array(means), np.array(stds)
+    
+    def _step_activity(self, n_samples: int) -> np.ndarray:
+        """Advance the activity Markov chain, returning the level of every sample"""
+        first = self.sample_index
+        levels = np.empty((self.n_devices, n_samples), dtype=np.intp)
+        position = 0
+        while position < n_samples:
+            offset = (first + position) % self._samples_per_transition
+            if offset == 0 and first + position > 0:
+                draws = self.rng.random(self.n_devices)[:, None]
+                self.activity = (draws > self._transition_cdf[self.activity]).sum(axis=1)
+                np.minimum(self.activity, len(self.levels) - 1, out=self.activity)
+            span = min(self._samples_per_transition - offset, n_samples - position)
+            levels[:, position:position + span] = self.activity[:, None]
+            position += span
+        return levels
+    
+    def _scan(self, drive: np.ndarray) -> np.ndarray:
+        """Solve x[t] = phi * x[t - 1] + drive[t] along the last (time) axis"""
+        out = np.empty_like(drive)
+        state = self.state.T
+        phi = self._phi[:, None, None]
+        for start in range(0, drive.shape[2], self._scan_block):
+            segment = drive[:, :, start:start + self._scan_block]
+            powers = phi ** np.arange(1, segment.shape[2] + 1)
+            values = powers * (state[:, :, None] + np.cumsum(segment / powers, axis=2))
+            out[:, :, start:start + segment.shape[2]] = values
+            state = values[:, :, -1]
+        self.state = state.T.copy()
+        return out
+    
+    def next_chunk(self) -> np.ndarray:
+        """Generate the next chunk_size samples of every device (device-major)"""
+        n = self.chunk_size
+        levels = self._step_activity(n)
+        # Process-major (process, device, sample) so every channel is contiguous
+        offset = ((1 - self._phi) * self._means).T[:, levels]
+        scale = (self._stds * self._innovation_scale).T[:, levels]
+        noise = self.rng.standard_normal(offset.shape)
+        x = self._scan(offset + scale * noise)
+        
+        column = dict(zip(self.PROCESSES, x))
+        emg = np.clip(column['emg_signal'], 0, 1000)
+        grip = np.clip(column['grip_base'] * 0.3 + emg / 1000 * 100 * 0.7, 0, 100)
+        
+        drain = np.cumsum(self._drain_per_sample[levels], axis=1)
+        battery = np.maximum(self.battery[:, None] - drain, 0)
+        self.battery = battery[:, -1].copy()
+        
+        readings = empty_readings(self.n_devices * n)
+        readings['device'] = np.repeat(np.arange(self.n_devices, dtype=np.uint32), n)
+        readings['timestamp'] = np.tile(
+            self.start_time + (self.sample_index + np.arange(n)) / self.sample_rate, self.n_devices)
+        readings['emg_signal'] = emg.ravel()
+        readings['grip_force'] = grip.ravel()
+        for channel in FINGER_CHANNELS:
+            readings[channel] = np.clip(column[channel], 0, 90).ravel()
+        readings['temperature'] = column['temperature'].ravel()
+        readings['palm_pressure'] = np.clip(grip * 0.8 + column['palm_noise'], 0, 100).ravel()
+        for channel in ('accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z'):
+            readings[channel] = column[channel].ravel()
+        readings['battery_level'] = np.round(battery).ravel()
+        readings['is_calibrated'] = True
+        readings['error_code'] = b''
+        
+        self.sample_index += n
+        return readings
+    
+    def chunks(self, count: Optional[int] = None) -> Iterator[np.ndarray]:
+        """Yield chunks forever, or count chunks when given"""
+        produced = 0
+        while count is None or produced < count:
+            yield self.next_chunk()
+            produced += 1
+    
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return self.chunks()
+
+
 class PrescriptionGenerator:
     """Generate intelligent prescriptions based on medical analysis"""
     
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from datetime import datetime
 import uuid
 
@@ -97,9 +98,13 @@ class BionicDevice(models.Model):
         ordering = ['-created_at']
 
 # Sensor Reading Model
+# Since partitioning this table only holds the readings stored before it:
+# SensorReading.objects and device.sensor_readings do not see newer ones.
+# Read through dashboard.partitions.reading_querysets or dashboard.telemetry_store.
 class SensorReading(models.Model):
     device = models.ForeignKey(BionicDevice, on_delete=models.CASCADE, related_name='sensor_readings')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Device sample time; defaults to arrival time for clients that omit it
+    timestamp = models.DateTimeField(default=timezone.now)
     
     # EMG Signals (Electromyography)
     emg_signal = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(1000)])
@@ -240,6 +245,8 @@ class DeviceAnalytics(models.Model):
     
     # Performance Metrics
     response_time_ms = models.FloatField(default=0)  # Average response time
+    # Serialized DDSketch of the day's response times (see dashboard.sketch)
+    response_time_sketch = models.BinaryField(null=True, blank=True)
     accuracy_percentage = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(100)], default=100)
     
     # Error Statistics
@@ -260,6 +267,73 @@ class DeviceAnalytics(models.Model):
         ordering = ['-date']
         unique_together = ['device', 'date']
 
+# Telemetry Rollup Model (minute/hour/day aggregates of SensorReading)
+class DeviceRollup(models.Model):
+    RESOLUTION = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    
+    device = models.ForeignKey(BionicDevice, on_delete=models.CASCADE, related_name='rollups')
+    resolution = models.CharField(max_length=6, choices=RESOLUTION)
+    bucket_start = models.DateTimeField()
+    
+    # Additive aggregates, so buckets can be merged incrementally
+    reading_count = models.IntegerField(default=0)
+    active_count = models.IntegerField(default=0)
+    minutes_seen = models.IntegerField(default=0)
+    grip_count = models.IntegerField(default=0)
+    grip_force_sum = models.FloatField(default=0)
+    grip_force_max = models.FloatField(default=0)
+    emg_signal_sum = models.FloatField(default=0)
+    emg_signal_max = models.FloatField(default=0)
+    temperature_sum = models.FloatField(default=0)
+    temperature_max = models.FloatField(default=0)
+    battery_min = models.IntegerField(default=100)
+    error_count = models.IntegerField(default=0)
+    emergency_stops = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.resolution} rollup {self.bucket_start} - Device {self.device.device_id}"
+    
+    class Meta:
+        ordering = ['-bucket_start']
+        unique_together = ['device', 'resolution', 'bucket_start']
+
+# Rollup High-Water Mark Model
+class RollupWatermark(models.Model):
+    device = models.OneToOneField(BionicDevice, on_delete=models.CASCADE, related_name='rollup_watermark')
+    last_reading_id = models.BigIntegerField(default=0)
+    
+    # Carried across chunks for edge detection
+    last_grip_force = models.FloatField(null=True, blank=True)
+    last_error_code = models.CharField(max_length=20, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Rollup watermark {self.last_reading_id} - Device {self.device.device_id}"
+
+# Monthly SensorReading Partition Registry (see dashboard.partitions)
+class ReadingPartition(models.Model):
+    month = models.DateField(unique=True)  # First day of the arrival month
+    table_name = models.CharField(max_length=64, unique=True)
+    first_id = models.BigIntegerField()
+
+    # Zone map: sample time range of the rows, filled in when the month is sealed
+    min_timestamp = models.DateTimeField(null=True, blank=True)
+    max_timestamp = models.DateTimeField(null=True, blank=True)
+    sealed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Readings partition {self.table_name}"
+
+    class Meta:
+        ordering = ['month']
+
 # Notification Model
 class Notification(models.Model):
     NOTIFICATION_TYPE = [
@@ -283,3 +357,8 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Polls: a user's notifications after a created_at cursor
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['user', 'is_read']),
+        ]
@@ -0,0 +1,187 @@
+"""
+Buffered, digesting notification writes
+Alert sources hand their notifications to the process dispatcher instead of
+inserting them. Within a short window, notifications of the same user, type
+and device collapse into one digest entry that keeps the latest text and
+counts the rest, so a flapping device yields one row per window per
+recipient rather than one per event. Each flush writes the window with a
+single bulk_create; it runs when the buffer holds flush_size events or the
+oldest of them is flush_interval seconds old (and at exit).
+"""
+
+import atexit
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+from .models import Notification
+from .notification_store import notifications_created
+
+logger = logging.getLogger(__name__)
+
+# (user id, notification type, device id)
+DigestKey = Tuple[int, str, Optional[str]]
+
+
+class Digest:
+    """The buffered notifications of one key: the latest one and how many there were"""
+
+    __slots__ = ('notification', 'count', 'first_at', 'last_at')
+
+    def __init__(self, notification: Notification, at: float):
+        self.notification = notification
+        self.count = 1
+        self.first_at = at
+        self.last_at = at
+
+    def add(self, notification: Notification, at: float):
+        self.notification = notification
+        self.count += 1
+        self.last_at = at
+
+    def row(self) -> Notification:
+        """The Notification to store: the latest one, annotated with the count for a digest"""
+        notification = self.notification
+        if self.count == 1:
+            return notification
+        return Notification(
+            user_id=notification.user_id,
+            notification_type=notification.notification_type,
+            title=f"{notification.title} (x{self.count})"[:200],
+            message=f"{notification.message} Repeated {self.count} times in {self.last_at - self.first_at:.0f} s.",
+            is_read=notification.is_read,
+        )
+
+
+class NotificationDispatcher:
+    """
+    Per-process notification buffer
+
+    dispatch() only updates memory and flushes when a threshold is reached;
+    a timer started with the first buffered event makes sure a lone one is
+    written after flush_interval seconds too. A flush that fails on a locked
+    database puts its digests back, to be merged with newer events.
+    """
+
+    def __init__(self, flush_interval: Optional[float] = None, flush_size: Optional[int] = None):
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            getattr(settings, 'NOTIFICATION_FLUSH_INTERVAL', 2.0)
+        self.flush_size = flush_size or getattr(settings, 'NOTIFICATION_FLUSH_SIZE', 500)
+        self._pending: Dict[DigestKey, Digest] = {}
+        self._events = 0
+        self._oldest = None
+        self._timer = None
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.written = 0
+        self.collapsed = 0
+
+    def dispatch(self, events: Iterable[Tuple[Optional[str], Notification]]) -> int:
+        """Buffer (device id, notification) events; returns how many"""
+        now = time.time()
+        count = 0
+        with self._lock:
+            for device_id, notification in events:
+                key = (notification.user_id, notification.notification_type, device_id)
+                digest = self._pending.get(key)
+                if digest is None:
+                    self._pending[key] = Digest(notification, now)
+                else:
+                    digest.add(notification, now)
+                count += 1
+            if not count:
+                return 0
+            self._events += count
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = self._events >= self.flush_size or time.monotonic() - self._oldest >= self.flush_interval
+            if not due:
+                self._schedule()
+        if due:
+            self.flush()
+        return count
+
+    def _schedule(self):
+        # Called with the lock held
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer's thread has its own connection
+            connection.close()
+
+    def flush(self) -> int:
+        """Write the buffered digests with one bulk_create; returns the rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            events, self._events, self._oldest = self._events, 0, None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+        rows = [digest.row() for digest in pending.values()]
+        try:
+            Notification.objects.bulk_create(rows)
+        except OperationalError as exc:
+            logger.warning(f"Could not store notifications, retrying on the next flush: {exc}")
+            self._requeue(pending, events)
+            return 0
+        notifications_created(rows)
+        with self._lock:
+            self.flushes += 1
+            self.written += len(rows)
+            self.collapsed += events - len(rows)
+        return len(rows)
+
+    def _requeue(self, pending: Dict[DigestKey, Digest], events: int):
+        with self._lock:
+            for key, digest in pending.items():
+                newer = self._pending.get(key)
+                if newer is not None:
+                    digest.notification = newer.notification
+                    digest.count += newer.count
+                    digest.last_at = newer.last_at
+                self._pending[key] = digest
+            self._events += events
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._schedule()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'pending_events': self._events,
+                'pending_digests': len(self._pending),
+                'flushes': self.flushes,
+                'written': self.written,
+                'collapsed': self.collapsed,
+            }
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> NotificationDispatcher:
+    """The dispatcher of this process, flushed at exit"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = NotificationDispatcher()
+            atexit.register(_dispatcher.flush)
+        return _dispatcher
+
+
+def dispatch(events: List[Tuple[Optional[str], Notification]]) -> int:
+    """Hand (device id, notification) events to the process dispatcher"""
+    return get_dispatcher().dispatch(events)
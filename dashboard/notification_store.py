@@ -0,0 +1,152 @@
+"""
+Notification reads for polling clients
+Each user has a state token in the 'notifications' cache that changes on
+every write to their notifications, and a cached unread count kept up to
+date on write. A poll whose ETag (state token and cursor) still matches is
+answered from the cache alone; otherwise notifications after the client's
+cursor are read through the (user, created_at) index.
+"""
+
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Notification
+
+# Notifications returned by one poll at most
+POLL_LIMIT = 50
+
+# How notification types are shown by the dashboard's notification manager
+DISPLAY = {
+    'battery_low': ('warning', 'high'),
+    'error': ('error', 'high'),
+    'maintenance': ('warning', 'normal'),
+}
+
+
+def _cache():
+    return caches['notifications' if 'notifications' in settings.CACHES else 'default']
+
+
+def _state_key(user_id: int) -> str:
+    return f'notifications:{user_id}:state'
+
+
+def _unread_key(user_id: int) -> str:
+    return f'notifications:{user_id}:unread'
+
+
+def state_token(user_id: int) -> str:
+    """Token of the current state of a user's notifications (created on first use)"""
+    cache = _cache()
+    token = cache.get(_state_key(user_id))
+    if token is None:
+        token = uuid.uuid4().hex[:16]
+        if not cache.add(_state_key(user_id), token):
+            token = cache.get(_state_key(user_id), token)
+    return token
+
+
+def unread_count(user_id: int) -> int:
+    """Unread notifications of a user, counted once and then kept by the writes"""
+    cache = _cache()
+    count = cache.get(_unread_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.add(_unread_key(user_id), count)
+    return count
+
+
+def notifications_changed(created: Optional[Dict[int, int]] = None, changed: Iterable[int] = ()):
+    """
+    Record writes: created maps user id to new unread notifications,
+    changed lists users whose notifications were updated or deleted
+    """
+    created = created or {}
+    cache = _cache()
+    cache.set_many({_state_key(user_id): uuid.uuid4().hex[:16] for user_id in set(created) | set(changed)})
+    for user_id, count in created.items():
+        try:
+            cache.incr(_unread_key(user_id), count)
+        except ValueError:
+            pass  # not counted yet
+    if changed:
+        # Reads and deletions: count again on the next poll
+        cache.delete_many([_unread_key(user_id) for user_id in changed])
+
+
+def notifications_created(notifications: Iterable[Notification]):
+    """notifications_changed() for rows inserted with bulk_create (which sends no signals)"""
+    created = {}
+    for notification in notifications:
+        if not notification.is_read:
+            created[notification.user_id] = created.get(notification.user_id, 0) + 1
+    if created:
+        notifications_changed(created)
+
+
+def notification_saved(sender, instance, created, **kwargs):
+    """post_save receiver for Notification"""
+    if created:
+        notifications_changed({instance.user_id: 0 if instance.is_read else 1})
+    else:
+        notifications_changed(changed=[instance.user_id])
+
+
+def notification_deleted(sender, instance, **kwargs):
+    """post_delete receiver for Notification"""
+    notifications_changed(changed=[instance.user_id])
+
+
+def encode_cursor(created_at: datetime, pk: int) -> str:
+    """Opaque poll cursor: creation time (epoch microseconds) and id of the last notification seen"""
+    return f'{int(created_at.timestamp() * 1_000_000)}.{pk}'
+
+
+def parse_cursor(value: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """(created_at, id) of a cursor, None if missing or malformed"""
+    try:
+        micros, pk = value.split('.')
+        return datetime.fromtimestamp(int(micros) / 1_000_000, timezone.utc), int(pk)
+    except (AttributeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def notifications_since(user_id: int, cursor: Optional[Tuple[datetime, int]],
+                        limit: int = POLL_LIMIT) -> Tuple[List[Notification], Optional[str]]:
+    """
+    A user's notifications after a cursor, oldest first, and the cursor after them
+
+    Without a cursor the newest `limit` notifications are returned. The
+    returned cursor stays the given one when there is nothing new.
+    """
+    notifications = Notification.objects.filter(user_id=user_id)
+    if cursor is None:
+        rows = list(notifications.order_by('-created_at', '-id')[:limit])[::-1]
+    else:
+        created_at, pk = cursor
+        # created_at >= t first, so the (user, created_at) index bounds the scan
+        rows = list(notifications.filter(created_at__gte=created_at)
+                    .exclude(created_at=created_at, id__lte=pk)
+                    .order_by('created_at', 'id')[:limit])
+    if rows:
+        return rows, encode_cursor(rows[-1].created_at, rows[-1].pk)
+    return rows, encode_cursor(*cursor) if cursor else None
+
+
+def notification_dict(notification: Notification) -> Dict:
+    """A notification as the dashboard's notification manager shows it"""
+    display_type, priority = DISPLAY.get(notification.notification_type, ('info', 'normal'))
+    return {
+        'id': notification.pk,
+        'title': notification.title,
+        'message': notification.message,
+        'type': display_type,
+        'priority': priority,
+        'notification_type': notification.notification_type,
+        'is_read': notification.is_read,
+        'timestamp': notification.created_at.isoformat(),
+    }
@@ -1,52 +1,55 @@
 # Notification views for real-time notifications
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified, JsonResponse
 from django.views import View
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from datetime import datetime, timezone as dt_timezone
 import json
 import logging
+import time
+
+from api.commands import command_dict, enqueue, latency_report
+from api.models import DeviceCommand
+from api.state import UnknownDevice, default_device_id
+
+from .alert_rules import describe, snapshot_alerts
+from .notification_store import notification_dict, notifications_since, parse_cursor, state_token, unread_count
 
 logger = logging.getLogger(__name__)
 
 class NotificationCheckView(View):
-    """Check for new notifications"""
-    
+    """
+    Notifications of the user after ?since=<cursor>
+
+    Responses carry an ETag of the user's notification state and the cursor;
+    a poll with a matching If-None-Match is answered 304 from the cache,
+    without a database query. X-Notifications-Cursor is the since of the
+    next poll and X-Unread-Count the user's unread notifications.
+    """
+
     def get(self, request):
+        if not request.user.is_authenticated:
+            return JsonResponse([], safe=False)
         try:
-            # In a real application, you would fetch notifications from a database
-            # For now, we'll return system status notifications
-            notifications = []
-            
-            # Check system health
-            system_status = self.get_system_status()
-            if system_status.get('alerts'):
-                notifications.extend(system_status['alerts'])
-            
-            return JsonResponse(notifications, safe=False)
-            
+            user_id = request.user.pk
+            since = request.GET.get('since', '')
+            etag = f'"{state_token(user_id)}:{since}"'
+            if etag in request.headers.get('If-None-Match', ''):
+                response = HttpResponseNotModified()
+            else:
+                notifications, cursor = notifications_since(user_id, parse_cursor(since))
+                response = JsonResponse([notification_dict(notification) for notification in notifications],
+                                        safe=False)
+                response['X-Notifications-Cursor'] = cursor or ''
+                response['X-Unread-Count'] = unread_count(user_id)
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+
         except Exception as e:
             logger.error(f"Error checking notifications: {e}")
             return JsonResponse([], safe=False)
-    
-    def get_system_status(self):
-        """Get current system status and alerts"""
-        alerts = []
-        
-        # Check device connectivity
-        # In a real implementation, this would check actual device status
-        device_connected = True  # Placeholder
-        
-        if not device_connected:
-            alerts.append({
-                'title': 'Device Disconnected',
-                'message': 'Bionic hand device is not connected',
-                'type': 'warning',
-                'priority': 'high',
-                'timestamp': timezone.now().isoformat()
-            })
-        
-        return {'alerts': alerts}
 
 
 class DeviceStatusView(View):
@@ -112,31 +115,31 @@ class DeviceReconnectView(View):
     
     def post(self, request):
         try:
-            # In a real implementation, this would attempt actual reconnection
-            # For now, we'll simulate the reconnection process
-            
-            # Simulate reconnection delay
-            import time
-            time.sleep(1)  # Simulate connection attempt
-            
-            success = True  # Placeholder - in real implementation, this would be the actual result
-            
-            if success:
-                return JsonResponse({
-                    'status': 'success',
-                    'message': 'Device reconnected successfully',
-                    'connection_info': {
-                        'connected_at': timezone.now().isoformat(),
-                        'signal_strength': 'strong',
-                        'latency': 15  # ms
-                    }
-                })
-            else:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Failed to reconnect to device'
-                }, status=400)
-                
+            try:
+                data = json.loads(request.body or b'{}')
+            except json.JSONDecodeError:
+                data = {}
+            device_id = data.get('device') or request.GET.get('device') or default_device_id()
+
+            # The device reconnects when it picks the command up; the measured
+            # round trip of its recent commands stands in for the link latency
+            command = enqueue(device_id, 'reconnect')
+            recent = latency_report([device_id], time.time() - 3600).get(device_id)
+            last_ack = DeviceCommand.objects.filter(device_id=device_id).exclude(acked_at=None) \
+                .order_by('-acked_at').values_list('acked_at', flat=True).first()
+            return JsonResponse({
+                'status': 'success',
+                'message': 'Reconnect command queued',
+                'command': command_dict(command),
+                'connection_info': {
+                    'requested_at': timezone.now().isoformat(),
+                    'last_seen': datetime.fromtimestamp(last_ack, dt_timezone.utc).isoformat() if last_ack else None,
+                    'latency': recent['p50_ms'] if recent else None,  # ms
+                }
+            })
+
+        except UnknownDevice as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
         except Exception as e:
             logger.error(f"Error reconnecting device: {e}")
             return JsonResponse({
@@ -212,23 +215,17 @@ class SystemHealthView(View):
                 ]
             }
             
-            # Check for any warning conditions
-            if health_status['components']['battery']['level'] < 20:
-                health_status['overall_status'] = 'warning'
-                health_status['alerts'].append({
-                    'type': 'warning',
-                    'title': 'Low Battery',
-                    'message': f"Battery level is {health_status['components']['battery']['level']}%"
-                })
-            
-            if health_status['components']['processing']['cpu_usage'] > 80:
+            # Check the components against the alert rules
+            components = health_status['components']
+            for alert in snapshot_alerts({'battery_level': components['battery']['level'],
+                                          'cpu_usage': components['processing']['cpu_usage']}):
                 health_status['overall_status'] = 'warning'
                 health_status['alerts'].append({
                     'type': 'warning',
-                    'title': 'High CPU Usage',
-                    'message': f"CPU usage is {health_status['components']['processing']['cpu_usage']}%"
+                    'title': alert['rule'].title or alert['rule'].name,
+                    'message': describe(alert['rule'], alert['value'])
                 })
-            
+
             return JsonResponse(health_status)
             
         except Exception as e:
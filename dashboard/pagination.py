@@ -0,0 +1,111 @@
+"""
+Keyset pagination over SensorReading
+Pages are read newest first in (timestamp desc, id asc) order, which is the
+physical order of the (device, -timestamp) index (SQLite appends the rowid to
+every index entry), so each page is one index range scan of `limit` rows per
+readings partition no matter how deep it is
+"""
+
+import base64
+import binascii
+import struct
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.db.models import Q, QuerySet
+
+from .telemetry import SENSOR_CHANNELS, epoch_to_datetimes
+
+# Fields a client may ask for with ?fields=; id and timestamp are always sent
+READING_FIELDS = SENSOR_CHANNELS + ('battery_level', 'is_calibrated', 'error_code')
+
+# Cursor payload: timestamp in epoch microseconds and reading id
+CURSOR = struct.Struct('<qq')
+
+
+class CursorError(ValueError):
+    """Raised for a cursor that was not issued by encode_cursor"""
+
+
+def encode_cursor(timestamp: datetime, reading_id: int) -> str:
+    """Opaque, URL-safe cursor pointing just past the given row"""
+    micros = round(timestamp.timestamp() * 1e6)
+    return base64.urlsafe_b64encode(CURSOR.pack(micros, reading_id)).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(timestamp, id) of the row a cursor points past"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        micros, reading_id = CURSOR.unpack(raw)
+    except (binascii.Error, struct.error, ValueError):
+        raise CursorError('Invalid cursor')
+    return epoch_to_datetimes([micros / 1e6])[0], reading_id
+
+
+def parse_fields(value: Optional[str]) -> Sequence[str]:
+    """Projected fields from a comma list; every field when empty"""
+    if not value:
+        return READING_FIELDS
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in READING_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def after_key(queryset: QuerySet, timestamp: Optional[datetime], reading_id: Optional[int],
+              newest_first: bool = True) -> QuerySet:
+    """
+    Order readings by (timestamp, id) in index order, keeping those after a key
+
+    Newest first is (timestamp desc, id asc), oldest first is the reverse
+    scan (timestamp asc, id desc). The predicate is written as
+    `timestamp <= t AND (timestamp < t OR id > i)` (mirrored for oldest
+    first) rather than a plain OR so that the timestamp bound stays an
+    index range, not a filter.
+    """
+    if newest_first:
+        queryset = queryset.order_by('-timestamp', 'id')
+        if timestamp is None:
+            return queryset
+        return queryset.filter(timestamp__lte=timestamp).filter(Q(timestamp__lt=timestamp) | Q(id__gt=reading_id))
+    queryset = queryset.order_by('timestamp', '-id')
+    if timestamp is None:
+        return queryset
+    return queryset.filter(timestamp__gte=timestamp).filter(Q(timestamp__gt=timestamp) | Q(id__lt=reading_id))
+
+
+def after_cursor(queryset: QuerySet, cursor: Optional[str]) -> QuerySet:
+    """Restrict a device's readings to those after an opaque cursor, newest first"""
+    if not cursor:
+        return after_key(queryset, None, None)
+    return after_key(queryset, *decode_cursor(cursor))
+
+
+def keyset_page(querysets: Sequence[QuerySet], cursor: Optional[str], limit: int,
+                fields: Sequence[str]) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of readings as dicts plus the cursor of the next page (None on the last page)
+
+    querysets are the readings of one device in each partition (see
+    dashboard.partitions.reading_querysets); the first limit + 1 rows after
+    the cursor are read from each and merged.
+    """
+    rows = []
+    for queryset in querysets:
+        rows.extend(after_cursor(queryset, cursor).values_list('id', 'timestamp', *fields)[:limit + 1])
+    if len(querysets) > 1:
+        rows.sort(key=lambda row: (row[1], -row[0]), reverse=True)
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    keys = ('id', 'timestamp') + tuple(fields)
+    readings = []
+    for row in rows:
+        reading = dict(zip(keys, row))
+        reading['timestamp'] = reading['timestamp'].isoformat()
+        readings.append(reading)
+
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if more else None
+    return readings, next_cursor
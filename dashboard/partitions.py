@@ -0,0 +1,264 @@
+"""
+Monthly partitions of SensorReading
+New readings go to one physical table per calendar month of arrival
+(dashboard_sensorreading_y2026m10, ...), with the columns and indexes of
+SensorReading. The tables are created ahead of time, never by a request:
+after every migrate for the current month and PARTITION_MONTHS_AHEAD more,
+and by 'manage.py create_partitions', which should run at least monthly.
+Reads only touch the partitions whose sample time range overlaps the
+requested one, and expired months are removed by dropping their table.
+
+The original SensorReading table is the default partition: it keeps the
+readings stored before partitioning and is always read. The ORM paths of
+the model itself (SensorReading.objects, device.sensor_readings, the admin)
+only see that table; code that needs every reading goes through
+reading_querysets() or dashboard.telemetry_store.
+"""
+
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Type
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, OperationalError, ProgrammingError, connection, models
+from django.db.models import Max, Min, QuerySet
+
+from .models import ReadingPartition, SensorReading
+
+logger = logging.getLogger(__name__)
+
+# Ids of a month's partition start at month number * PARTITION_ID_SPAN, so
+# ids stay unique across partitions and grow with arrival time
+PARTITION_ID_SPAN = 1 << 36
+
+
+class PartitionMissing(RuntimeError):
+    """Raised when the partition new readings belong to has not been created"""
+
+
+def month_start(moment: datetime) -> date:
+    return moment.astimezone(timezone.utc).date().replace(day=1)
+
+
+def next_month(month: date) -> date:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def partition_table(month: date) -> str:
+    return f'{SensorReading._meta.db_table}_y{month.year}m{month.month:02d}'
+
+
+def first_id(month: date) -> int:
+    return (month.year * 12 + month.month - 1) * PARTITION_ID_SPAN + 1
+
+
+_models: Dict[str, Type[models.Model]] = {}
+_models_lock = threading.Lock()
+
+
+def partition_model(table_name: str) -> Type[models.Model]:
+    """
+    Unmanaged model class for a partition table, built once per process
+
+    Fields are copied from SensorReading. The device foreign key has no
+    database constraint or reverse accessor; readings of a deleted device
+    are removed by delete_device_readings.
+    """
+    with _models_lock:
+        model = _models.get(table_name)
+        if model is not None:
+            return model
+        suffix = table_name.rsplit('_', 1)[-1]
+        attrs = {
+            '__module__': SensorReading.__module__,
+            'Meta': type('Meta', (), {
+                'app_label': SensorReading._meta.app_label,
+                'db_table': table_name,
+                'managed': False,
+                'ordering': SensorReading._meta.ordering,
+                'indexes': [models.Index(fields=index.fields, name=f'sr_{suffix}_{number}')
+                            for number, index in enumerate(SensorReading._meta.indexes)],
+            }),
+        }
+        for field in SensorReading._meta.local_fields:
+            name, _, args, kwargs = field.deconstruct()
+            if field.is_relation:
+                kwargs.update(on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+            attrs[name] = type(field)(*args, **kwargs)
+        model = _models[table_name] = type(f'SensorReading_{suffix}', (models.Model,), attrs)
+        return model
+
+
+class PartitionRouter:
+    """
+    Routes SensorReading inserts and queries to the monthly partitions
+
+    The partition registry (ReadingPartition) is cached for ttl seconds.
+    A month is sealed, recording the min/max sample time of its rows, once
+    seal_grace seconds have passed after it ended; until then it is read by
+    every query. Late readings are stored in the month they arrive in, so a
+    sealed partition never changes.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, seal_grace: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'PARTITION_REGISTRY_TTL', 30.0)
+        self.seal_grace = seal_grace if seal_grace is not None else \
+            getattr(settings, 'PARTITION_SEAL_GRACE', 3600.0)
+        self._partitions: List[ReadingPartition] = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def partitions(self, refresh: bool = False) -> List[ReadingPartition]:
+        """Registered monthly partitions, oldest first"""
+        with self._lock:
+            if refresh or self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._partitions = list(ReadingPartition.objects.order_by('month'))
+                self._loaded_at = time.monotonic()
+                self._seal_ended(self._partitions)
+            return list(self._partitions)
+
+    def _seal_ended(self, partitions: List[ReadingPartition]):
+        now = datetime.now(timezone.utc)
+        for partition in partitions:
+            ends = datetime.combine(next_month(partition.month), datetime.min.time(), timezone.utc)
+            if partition.sealed_at is not None or now < ends + timedelta(seconds=self.seal_grace):
+                continue
+            bounds = partition_model(partition.table_name).objects.aggregate(low=Min('timestamp'),
+                                                                             high=Max('timestamp'))
+            partition.min_timestamp, partition.max_timestamp = bounds['low'], bounds['high']
+            partition.sealed_at = now
+            try:
+                partition.save(update_fields=['min_timestamp', 'max_timestamp', 'sealed_at'])
+            except OperationalError as exc:
+                # Still read as open until a later refresh manages to seal it
+                partition.sealed_at = None
+                logger.warning(f"Could not seal {partition.table_name}: {exc}")
+
+    def current_model(self, now: Optional[datetime] = None) -> Type[models.Model]:
+        """Model of the partition new readings are inserted into"""
+        month = month_start(now or datetime.now(timezone.utc))
+        for refresh in (False, True):
+            for partition in self.partitions(refresh):
+                if partition.month == month:
+                    return partition_model(partition.table_name)
+        raise PartitionMissing(f"No readings partition for {month:%Y-%m}; run 'manage.py create_partitions'")
+
+    def ensure(self, months_ahead: Optional[int] = None, now: Optional[datetime] = None) -> List[ReadingPartition]:
+        """Create the partitions of the current month and the next months_ahead months that are missing"""
+        months_ahead = months_ahead if months_ahead is not None else \
+            getattr(settings, 'PARTITION_MONTHS_AHEAD', 2)
+        existing = {partition.month for partition in self.partitions(refresh=True)}
+        month = month_start(now or datetime.now(timezone.utc))
+        created = []
+        for _ in range(months_ahead + 1):
+            if month not in existing:
+                created.append(self.create(month))
+            month = next_month(month)
+        return created
+
+    def create(self, month: date) -> ReadingPartition:
+        """Create the table of a month (if needed) and register it; not possible inside a transaction on SQLite"""
+        table = partition_table(month)
+        model = partition_model(table)
+        if table not in connection.introspection.table_names():
+            try:
+                with connection.schema_editor() as editor:
+                    editor.create_model(model)
+                    _seed_ids(editor, table, first_id(month))
+            except (OperationalError, ProgrammingError):
+                # Another worker created it first
+                if table not in connection.introspection.table_names():
+                    raise
+        try:
+            partition, _ = ReadingPartition.objects.get_or_create(
+                month=month, defaults={'table_name': table, 'first_id': first_id(month)})
+        except IntegrityError:
+            partition = ReadingPartition.objects.get(month=month)
+        self.partitions(refresh=True)
+        return partition
+
+    def models_for_range(self, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None) -> List[Type[models.Model]]:
+        """
+        Models of the partitions that may hold readings sampled in [start, end), newest first
+
+        Unsealed months are always included, sealed ones only when their
+        zone map overlaps the range (and never when empty). The default
+        partition comes last.
+        """
+        selected = []
+        for partition in reversed(self.partitions()):
+            if partition.sealed_at is not None:
+                if partition.min_timestamp is None:
+                    continue
+                if end is not None and partition.min_timestamp >= end:
+                    continue
+                if start is not None and partition.max_timestamp < start:
+                    continue
+            selected.append(partition_model(partition.table_name))
+        selected.append(SensorReading)
+        return selected
+
+    def drop(self, partition: ReadingPartition):
+        """Drop a partition table and unregister it"""
+        with connection.schema_editor() as editor:
+            editor.delete_model(partition_model(partition.table_name))
+            ReadingPartition.objects.filter(pk=partition.pk).delete()
+        self.partitions(refresh=True)
+
+
+def _seed_ids(editor, table: str, start: int):
+    """Make the first id of a new partition table `start`"""
+    if connection.vendor == 'sqlite':
+        editor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', (table, start - 1))
+    elif connection.vendor == 'postgresql':
+        editor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, false)", (table, start))
+
+
+def expired_default_rows(cutoff: datetime, last_id: int) -> QuerySet:
+    """Readings of the default partition sampled before cutoff, up to id last_id"""
+    return SensorReading.objects.filter(timestamp__lt=cutoff, id__lte=last_id)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> PartitionRouter:
+    """The partition router of this process, created on first use"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = PartitionRouter()
+        return _router
+
+
+def reading_querysets(start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[QuerySet]:
+    """Querysets over every partition that may hold readings sampled in [start, end), newest first"""
+    querysets = []
+    for model in get_router().models_for_range(start, end):
+        queryset = model.objects.all()
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end is not None:
+            queryset = queryset.filter(timestamp__lt=end)
+        querysets.append(queryset)
+    return querysets
+
+
+def delete_device_readings(sender, instance, **kwargs):
+    """pre_delete receiver for BionicDevice: remove its readings from the monthly partitions"""
+    for model in get_router().models_for_range():
+        if model is not SensorReading:
+            model.objects.filter(device_id=instance.pk).delete()
+
+
+def create_partitions(sender, using: str = DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver for the dashboard app: create the upcoming monthly partitions"""
+    if using != DEFAULT_DB_ALIAS:
+        return
+    if ReadingPartition._meta.db_table not in connection.introspection.table_names():
+        return  # migrated back to before partitioning
+    get_router().ensure()
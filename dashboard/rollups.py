@@ -0,0 +1,232 @@
+"""
+Incremental telemetry rollups
+Maintains minute/hour/day DeviceRollup buckets and the daily DeviceAnalytics
+rows from SensorReading, reading only rows past each device's high-water mark
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import BionicDevice, DeviceAnalytics, DeviceRollup, RollupWatermark, SensorReading
+from .partitions import get_router, partition_model
+from .telemetry import datetimes_to_epoch, epoch_to_datetimes
+
+RESOLUTION_SECONDS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Rollup fields merged by addition, maximum and minimum respectively
+SUM_FIELDS = ('reading_count', 'active_count', 'minutes_seen', 'grip_count', 'grip_force_sum',
+              'emg_signal_sum', 'temperature_sum', 'error_count', 'emergency_stops')
+MAX_FIELDS = ('grip_force_max', 'emg_signal_max', 'temperature_max')
+MIN_FIELDS = ('battery_min',)
+INTEGER_FIELDS = {field.name for field in DeviceRollup._meta.get_fields()
+                  if field.get_internal_type() == 'IntegerField'}
+
+ANALYTICS_FIELDS = ('total_usage_hours', 'active_usage_hours', 'grip_count', 'average_grip_force',
+                    'error_count', 'emergency_stops', 'updated_at')
+
+EMERGENCY_STOP_CODE = 'E001'
+
+
+def _rising_edges(flags: np.ndarray, previous: bool) -> np.ndarray:
+    """True where flags switches on, given the state before the first element"""
+    before = np.empty_like(flags)
+    before[0] = previous
+    before[1:] = flags[:-1]
+    return flags & ~before
+
+
+class RollupEngine:
+    """
+    Incremental rollup of SensorReading into DeviceRollup and DeviceAnalytics
+
+    Each device has a RollupWatermark holding the last reading id folded in.
+    New readings are read in id order, chunk_size at a time, aggregated per
+    bucket with NumPy, merged with the stored buckets and upserted on the
+    (device, resolution, bucket_start) and (device, date) unique keys.
+
+    error_count counts error events, not readings: a code that persists
+    over consecutive readings is counted once, when it first appears.
+    """
+
+    def __init__(self, chunk_size: Optional[int] = None, grip_threshold: Optional[float] = None,
+                 active_emg_threshold: Optional[float] = None):
+        self.chunk_size = chunk_size or getattr(settings, 'ROLLUP_CHUNK_SIZE', 10000)
+        # A grip is counted each time grip force rises through this level
+        self.grip_threshold = grip_threshold if grip_threshold is not None else \
+            getattr(settings, 'ROLLUP_GRIP_THRESHOLD', 30.0)
+        # Readings at or above this EMG level count as active use
+        self.active_emg_threshold = active_emg_threshold if active_emg_threshold is not None else \
+            getattr(settings, 'ROLLUP_ACTIVE_EMG_THRESHOLD', 150.0)
+
+    def run(self, device_pks: Optional[Iterable[int]] = None) -> Dict:
+        """Roll up every device (or the given primary keys) to its latest reading"""
+        if device_pks is None:
+            device_pks = BionicDevice.objects.values_list('pk', flat=True)
+        summary = {'devices': 0, 'readings': 0, 'chunks': 0}
+        for device_pk in list(device_pks):
+            readings, chunks = self.rollup_device(device_pk)
+            if readings:
+                summary['devices'] += 1
+                summary['readings'] += readings
+                summary['chunks'] += chunks
+        return summary
+
+    def rollup_device(self, device_pk: int):
+        """Fold all new readings of one device, returning (readings, chunks)"""
+        watermark, _ = RollupWatermark.objects.get_or_create(device_id=device_pk)
+        total = chunks = 0
+        for model in self._id_ordered_models(watermark.last_reading_id):
+            while True:
+                rows = list(
+                    model.objects
+                    .filter(device_id=device_pk, id__gt=watermark.last_reading_id)
+                    .order_by('id')
+                    .values_list('id', 'timestamp', 'grip_force', 'emg_signal', 'temperature',
+                                 'battery_level', 'error_code')[:self.chunk_size]
+                )
+                if not rows:
+                    break
+                with transaction.atomic():
+                    self._fold_chunk(device_pk, watermark, rows)
+                total += len(rows)
+                chunks += 1
+                if len(rows) < self.chunk_size:
+                    break
+        return total, chunks
+
+    def _id_ordered_models(self, last_reading_id: int) -> List:
+        """
+        Reading partitions in id order, skipping those whose ids all lie at
+        or below the watermark (partition ids start at their first_id)
+        """
+        partitions = get_router().partitions()
+        sources = [(SensorReading, partitions[0].first_id if partitions else None)]
+        for partition, following in zip(partitions, partitions[1:] + [None]):
+            sources.append((partition_model(partition.table_name), following.first_id if following else None))
+        return [model for model, next_first_id in sources
+                if next_first_id is None or next_first_id > last_reading_id + 1]
+
+    def _fold_chunk(self, device_pk: int, watermark: RollupWatermark, rows: List[tuple]):
+        ids, timestamps, grip, emg, temperature, battery, codes = zip(*rows)
+        timestamps = datetimes_to_epoch(timestamps)
+        grip = np.array(grip, dtype=np.float64)
+        emg = np.array(emg, dtype=np.float64)
+        temperature = np.array(temperature, dtype=np.float64)
+        codes = list(codes)
+
+        gripping = grip >= self.grip_threshold
+        was_gripping = watermark.last_grip_force is not None and watermark.last_grip_force >= self.grip_threshold
+        stopped = np.array([code == EMERGENCY_STOP_CODE for code in codes], dtype=bool)
+        # An error event starts where a code is set that the previous reading did not carry
+        errors = np.array([bool(code) and code != previous
+                           for code, previous in zip(codes, [watermark.last_error_code] + codes[:-1])], dtype=bool)
+
+        per_reading = {
+            'reading_count': np.ones(len(rows)),
+            'active_count': (emg >= self.active_emg_threshold).astype(np.float64),
+            'grip_count': _rising_edges(gripping, was_gripping).astype(np.float64),
+            'grip_force_sum': grip,
+            'emg_signal_sum': emg,
+            'temperature_sum': temperature,
+            'error_count': errors.astype(np.float64),
+            'emergency_stops': _rising_edges(stopped, watermark.last_error_code == EMERGENCY_STOP_CODE)
+            .astype(np.float64),
+            'grip_force_max': grip,
+            'emg_signal_max': emg,
+            'temperature_max': temperature,
+            'battery_min': np.array(battery, dtype=np.float64),
+        }
+
+        new_minutes = None
+        merged_days = {}
+        for resolution in ('minute', 'hour', 'day'):
+            seconds = RESOLUTION_SECONDS[resolution]
+            starts = np.floor(timestamps / seconds) * seconds
+            keys, inverse = np.unique(starts, return_inverse=True)
+
+            buckets = {}
+            for field in SUM_FIELDS:
+                if field == 'minutes_seen':
+                    continue
+                buckets[field] = np.bincount(inverse, weights=per_reading[field], minlength=len(keys))
+            for field in MAX_FIELDS:
+                buckets[field] = np.full(len(keys), -np.inf)
+                np.maximum.at(buckets[field], inverse, per_reading[field])
+            for field in MIN_FIELDS:
+                buckets[field] = np.full(len(keys), np.inf)
+                np.minimum.at(buckets[field], inverse, per_reading[field])
+
+            if resolution == 'minute':
+                buckets['minutes_seen'] = np.ones(len(keys))
+            else:
+                owner = np.floor(new_minutes / seconds) * seconds
+                buckets['minutes_seen'] = np.bincount(np.searchsorted(keys, owner), minlength=len(keys)) \
+                    .astype(np.float64)
+
+            merged, created = self._merge(device_pk, resolution, keys, buckets)
+            if resolution == 'minute':
+                new_minutes = keys[created]
+            if resolution == 'day':
+                merged_days = merged
+
+        self._upsert_analytics(device_pk, merged_days)
+
+        watermark.last_reading_id = ids[-1]
+        watermark.last_grip_force = float(grip[-1])
+        watermark.last_error_code = codes[-1]
+        watermark.save()
+
+    def _merge(self, device_pk: int, resolution: str, keys: np.ndarray, buckets: Dict[str, np.ndarray]):
+        """Combine chunk buckets with stored ones and upsert them"""
+        starts = epoch_to_datetimes(keys)
+        existing = {
+            row.bucket_start.timestamp(): row
+            for row in DeviceRollup.objects.filter(device_id=device_pk, resolution=resolution,
+                                                   bucket_start__in=starts)
+        }
+        created = np.ones(len(keys), dtype=bool)
+        rows = []
+        for index, (key, start) in enumerate(zip(keys.tolist(), starts)):
+            values = {field: buckets[field][index] for field in buckets}
+            stored = existing.get(key)
+            if stored is not None:
+                created[index] = False
+                for field in SUM_FIELDS:
+                    values[field] += getattr(stored, field)
+                for field in MAX_FIELDS:
+                    values[field] = max(values[field], getattr(stored, field))
+                for field in MIN_FIELDS:
+                    values[field] = min(values[field], getattr(stored, field))
+            values = {field: int(value) if field in INTEGER_FIELDS else float(value)
+                      for field, value in values.items()}
+            rows.append(DeviceRollup(device_id=device_pk, resolution=resolution, bucket_start=start, **values))
+
+        DeviceRollup.objects.bulk_create(
+            rows, update_conflicts=True,
+            unique_fields=['device', 'resolution', 'bucket_start'],
+            update_fields=list(SUM_FIELDS + MAX_FIELDS + MIN_FIELDS) + ['updated_at'],
+        )
+        return {row.bucket_start: row for row in rows}, created
+
+    def _upsert_analytics(self, device_pk: int, days: Dict):
+        """Derive the daily DeviceAnalytics rows from the merged day buckets"""
+        rows = []
+        for start, day in days.items():
+            total_hours = day.minutes_seen / 60
+            rows.append(DeviceAnalytics(
+                device_id=device_pk,
+                date=start.date(),
+                total_usage_hours=round(total_hours, 3),
+                active_usage_hours=round(total_hours * day.active_count / day.reading_count, 3)
+                if day.reading_count else 0,
+                grip_count=day.grip_count,
+                average_grip_force=round(day.grip_force_sum / day.reading_count, 2) if day.reading_count else 0,
+                error_count=day.error_count,
+                emergency_stops=day.emergency_stops,
+            ))
+        DeviceAnalytics.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['device', 'date'], update_fields=list(ANALYTICS_FIELDS),
+        )
@@ -0,0 +1,158 @@
+"""
+Mergeable quantile sketch
+A DDSketch: positive values are counted in logarithmic buckets whose width
+bounds the relative error of every quantile, so two sketches of the same
+accuracy merge exactly by adding bucket counts
+"""
+
+import math
+import struct
+import zlib
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+# version, relative accuracy, key of the first bucket, zero count, sum, min, max
+HEADER = struct.Struct('<Bdqqddd')
+VERSION = 1
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BUCKETS = 2048
+# Values at or below this land in the zero bucket
+MIN_VALUE = 1e-6
+
+
+class DDSketch:
+    """
+    Quantile sketch with a fixed relative accuracy
+
+    A value x > MIN_VALUE is counted in bucket ceil(log_gamma(x)), with
+    gamma = (1 + a) / (1 - a) for relative accuracy a; a quantile is
+    answered from the bucket holding its rank and is within a * value of
+    the exact one. Buckets are a dense count array starting at `offset`.
+    When more than max_buckets are needed the lowest ones are collapsed
+    into one, which only affects the accuracy of the lowest quantiles.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 max_buckets: int = DEFAULT_MAX_BUCKETS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.zero_count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + int(self.counts.sum())
+
+    @property
+    def mean(self) -> Optional[float]:
+        count = self.count
+        return self.sum / count if count else None
+
+    def add(self, values: Iterable[float]):
+        """Count a batch of values; NaN and negative values are ignored"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[values >= 0]
+        if not len(values):
+            return
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        positive = values[values > MIN_VALUE]
+        self.zero_count += len(values) - len(positive)
+        if len(positive):
+            keys = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+            low = int(keys.min())
+            self._add_counts(low, np.bincount(keys - low))
+
+    def _add_counts(self, offset: int, counts: np.ndarray):
+        if not len(self.counts):
+            self.offset, self.counts = offset, counts.astype(np.int64)
+        else:
+            low = min(self.offset, offset)
+            high = max(self.offset + len(self.counts), offset + len(counts))
+            merged = np.zeros(high - low, dtype=np.int64)
+            merged[self.offset - low:self.offset - low + len(self.counts)] += self.counts
+            merged[offset - low:offset - low + len(counts)] += counts
+            self.offset, self.counts = low, merged
+        if len(self.counts) > self.max_buckets:
+            excess = len(self.counts) - self.max_buckets
+            self.counts[excess] += self.counts[:excess].sum()
+            self.offset += excess
+            self.counts = self.counts[excess:]
+
+    def merge(self, other: 'DDSketch'):
+        """Add the counts of another sketch of the same accuracy"""
+        if not math.isclose(other.relative_accuracy, self.relative_accuracy):
+            raise ValueError('Cannot merge sketches of different relative accuracy')
+        if not other.count:
+            return
+        self.zero_count += other.zero_count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(other.counts):
+            self._add_counts(other.offset, other.counts)
+
+    def quantiles(self, qs: Sequence[float]) -> list:
+        """Values at the given quantiles (0..1), or None for each when the sketch is empty"""
+        count = self.count
+        if not count:
+            return [None] * len(qs)
+        cumulative = np.cumsum(self.counts)
+        results = []
+        for q in qs:
+            rank = q * (count - 1)
+            if rank < self.zero_count:
+                value = 0.0
+            else:
+                index = int(np.searchsorted(cumulative, rank - self.zero_count, side='right'))
+                index = min(index, len(cumulative) - 1)
+                value = 2 * self.gamma ** (self.offset + index) / (self.gamma + 1)
+            results.append(min(max(value, self.min), self.max))
+        return results
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[0]
+
+    def to_bytes(self) -> bytes:
+        """Compact serialization: fixed header plus the zlib-compressed bucket counts"""
+        header = HEADER.pack(VERSION, self.relative_accuracy, self.offset, self.zero_count,
+                             self.sum, self.min, self.max)
+        return header + zlib.compress(self.counts.astype('<u8').tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_buckets: int = DEFAULT_MAX_BUCKETS) -> 'DDSketch':
+        data = bytes(data)
+        version, accuracy, offset, zero_count, total, low, high = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f'Unsupported sketch version {version}')
+        sketch = cls(accuracy, max_buckets)
+        sketch.offset = offset
+        sketch.counts = np.frombuffer(zlib.decompress(data[HEADER.size:]), dtype='<u8').astype(np.int64)
+        sketch.zero_count = zero_count
+        sketch.sum, sketch.min, sketch.max = total, low, high
+        return sketch
+
+
+def merge_all(blobs: Iterable[Optional[bytes]]) -> DDSketch:
+    """One sketch merged from serialized sketches, skipping empty values"""
+    merged = None
+    for blob in blobs:
+        if not blob:
+            continue
+        sketch = DDSketch.from_bytes(blob)
+        if merged is None:
+            merged = sketch
+        else:
+            merged.merge(sketch)
+    return merged if merged is not None else DDSketch()
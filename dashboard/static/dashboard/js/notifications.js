@@ -458,7 +458,9 @@ class NotificationManager {
 
     async checkForNotifications() {
         try {
-            const response = await fetch('/api/notifications/check/', {
+            // Only notifications after the last poll; 304 when there are none
+            const since = this.notificationCursor ? `?since=${encodeURIComponent(this.notificationCursor)}` : '';
+            const response = await fetch(`/dashboard/api/notifications/check/${since}`, {
                 headers: {
                     'X-CSRFToken': this.getCsrfToken()
                 }
@@ -466,7 +468,10 @@ class NotificationManager {
 
             if (response.ok) {
                 const notifications = await response.json();
-                notifications.forEach(notification => {
+                // The first poll returns the latest notifications; only unread ones are news
+                const fresh = this.notificationCursor ? notifications : notifications.filter(n => !n.is_read);
+                this.notificationCursor = response.headers.get('X-Notifications-Cursor') || this.notificationCursor;
+                fresh.forEach(notification => {
                     this.show(notification.title, notification.message, {
                         type: notification.type,
                         priority: notification.priority
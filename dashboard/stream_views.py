@@ -0,0 +1,111 @@
+# Streaming telemetry views, served by the ASGI app (bionic_site/asgi.py)
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
+import json
+
+from .compact import COMPACT_CONTENT_TYPE, CompactEncoder
+from .hub import SSE_BATCH_LIMIT, get_hub
+from .live import raw_since, reading_records, ring_cursor
+from .models import BionicDevice
+
+dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def sse_event(data, event=None, event_id=None) -> str:
+    """One Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_last_event_id(request):
+    """Ring cursor to resume from, from the Last-Event-ID header (or ?last_event_id= for polyfills)"""
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if not value:
+        return None
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        return None
+
+
+async def telemetry_events(device_id, cursor, compact=False):
+    """
+    SSE messages for a device's live ring from cursor on
+
+    The event id of each 'telemetry' message is the ring cursor after its
+    readings, so a reconnecting EventSource resumes with Last-Event-ID.
+    Readings overwritten before they could be sent are reported in a 'gap'
+    message. A comment line is sent as keep-alive when nothing arrived.
+    With compact the data is a dashboard.compact frame instead of a list of
+    reading objects.
+    """
+    encoder = CompactEncoder() if compact else None
+    yield f"retry: {getattr(settings, 'SSE_RETRY_MS', 2000)}\n\n"
+    async for batch in get_hub().subscribe(device_id, cursor):
+        if batch is None:
+            yield ': keep-alive\n\n'
+            continue
+        if batch.lost:
+            yield sse_event({'lost': batch.lost}, event='gap')
+        if batch.parts:
+            data = encoder.encode(batch.rows()) if encoder else batch.records()
+            yield sse_event(data, event='telemetry', event_id=batch.cursor)
+
+
+@require_http_methods(["GET"])
+async def sensor_stream_api(request, device_id):
+    """Server-Sent Events stream of a device's live telemetry (?format=compact for compact frames)"""
+    if not await BionicDevice.objects.filter(device_id=device_id).aexists():
+        return JsonResponse({'status': 'error', 'message': 'Device not found'}, status=404)
+
+    compact = request.GET.get('format') == 'compact'
+    response = StreamingHttpResponse(telemetry_events(device_id, parse_last_event_id(request), compact),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies (nginx) from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_http_methods(["GET"])
+async def live_hub_stats_api(request):
+    """Telemetry fan-out of this worker: per device feed and per subscriber lag and drop counters"""
+    return JsonResponse({'status': 'success', 'devices': get_hub().stats()})
+
+
+@require_http_methods(["GET"])
+def live_readings_api(request, device_id):
+    """
+    Polling counterpart of the stream: readings after ?cursor= (default: the newest one)
+
+    ?format=compact returns them as one dashboard.compact frame, with the
+    header unless ?header=0 (error codes are numbered per response);
+    ?format=binary as a binary compact frame with the ring cursor in
+    X-Ring-Cursor.
+    """
+    try:
+        cursor = int(request.GET['cursor']) if request.GET.get('cursor') else max(ring_cursor(device_id) - 1, 0)
+        limit = min(max(int(request.GET.get('limit', SSE_BATCH_LIMIT)), 1), SSE_BATCH_LIMIT)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'cursor and limit must be integers'}, status=400)
+
+    readings, cursor, lost = raw_since(device_id, max(cursor, 0), limit)
+    output = request.GET.get('format', 'json')
+    if output == 'binary':
+        response = HttpResponse(CompactEncoder().encode_binary(readings), content_type=COMPACT_CONTENT_TYPE)
+        response['X-Ring-Cursor'] = str(cursor)
+        response['X-Readings-Lost'] = str(lost)
+        return response
+    if output == 'compact':
+        frame = CompactEncoder().encode(readings)
+        if request.GET.get('header') == '0':
+            frame = {key: value for key, value in frame.items() if key not in ('fields', 'decimals')}
+        return JsonResponse({'status': 'success', 'cursor': cursor, 'lost': lost, 'frame': frame})
+    return JsonResponse({'status': 'success', 'cursor': cursor, 'lost': lost,
+                         'readings': reading_records(device_id, readings)})
@@ -0,0 +1,238 @@
+"""
+Telemetry array layout and serialization helpers
+Sensor readings are kept as NumPy structured arrays and only turned into
+JSON or bytes at the edge (HTTP responses, files, sockets)
+
+Binary frame format (content type application/x-quantumix-frames)
+-----------------------------------------------------------------
+A body is an 8-byte header followed by fixed-size little-endian records,
+with no padding anywhere:
+
+    header   offset  size  type     field
+             0       4     bytes    magic, b'QXTF'
+             4       2     uint16   format version (1)
+             6       2     uint16   record size in bytes (80)
+
+    record   offset  size  type     field
+             0       4     uint32   device, BionicDevice primary key
+             4       4     uint32   sequence number (per device, wraps)
+             8       8     float64  timestamp, UTC epoch seconds
+             16      60    float32  15 channels in SENSOR_CHANNELS order
+                                    (NaN = not measured, IMU channels only)
+             76      1     uint8    battery_level, percent
+             77      1     uint8    flags: bit 0 calibrated, bit 1 error set
+             78      2     uint16   error number n for error code 'E{n:03d}'
+
+An 80-byte record replaces roughly 400 bytes of JSON per reading.
+"""
+
+import json
+import struct
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# Float channels of dashboard.models.SensorReading, in model field order
+SENSOR_CHANNELS = (
+    'emg_signal',
+    'grip_force',
+    'thumb_flex',
+    'index_flex',
+    'middle_flex',
+    'ring_flex',
+    'pinky_flex',
+    'temperature',
+    'palm_pressure',
+    'accel_x',
+    'accel_y',
+    'accel_z',
+    'gyro_x',
+    'gyro_y',
+    'gyro_z',
+)
+
+FINGER_CHANNELS = ('thumb_flex', 'index_flex', 'middle_flex', 'ring_flex', 'pinky_flex')
+
+# Decimal places used when readings are rendered as JSON
+CHANNEL_DECIMALS = {
+    'emg_signal': 2,
+    'grip_force': 2,
+    'thumb_flex': 1,
+    'index_flex': 1,
+    'middle_flex': 1,
+    'ring_flex': 1,
+    'pinky_flex': 1,
+    'temperature': 1,
+    'palm_pressure': 2,
+    'accel_x': 3,
+    'accel_y': 3,
+    'accel_z': 3,
+    'gyro_x': 2,
+    'gyro_y': 2,
+    'gyro_z': 2,
+}
+
+# Bytes of an error code, SensorReading.error_code's max_length
+ERROR_CODE_LENGTH = 20
+ERROR_CODE_DTYPE = f'S{ERROR_CODE_LENGTH}'
+
+# One row per reading: device index, epoch seconds, float32 channels and flags
+SENSOR_DTYPE = np.dtype(
+    [('device', '<u4'), ('timestamp', '<f8')]
+    + [(channel, '<f4') for channel in SENSOR_CHANNELS]
+    + [('battery_level', 'u1'), ('is_calibrated', '?'), ('error_code', ERROR_CODE_DTYPE)]
+)
+
+# Packed wire record of the binary frame format described above
+FRAME_DTYPE = np.dtype(
+    [('device', '<u4'), ('sequence', '<u4'), ('timestamp', '<f8')]
+    + [(channel, '<f4') for channel in SENSOR_CHANNELS]
+    + [('battery_level', 'u1'), ('flags', 'u1'), ('error_number', '<u2')]
+)
+FRAME_MAGIC = b'QXTF'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<4sHH')
+FRAME_CONTENT_TYPE = 'application/x-quantumix-frames'
+FLAG_CALIBRATED = 0x01
+FLAG_ERROR = 0x02
+
+
+class FrameError(ValueError):
+    """Raised when a binary telemetry body is malformed"""
+
+
+def empty_readings(size: int) -> np.ndarray:
+    """Allocate an uninitialised structured array of sensor readings"""
+    return np.empty(size, dtype=SENSOR_DTYPE)
+
+
+def timestamps_to_iso(timestamps: np.ndarray) -> List[str]:
+    """Convert epoch seconds to ISO-8601 UTC strings in one vectorized call"""
+    micros = np.round(np.asarray(timestamps, dtype=np.float64) * 1e6).astype('datetime64[us]')
+    return [value + '+00:00' for value in np.datetime_as_string(micros, unit='us').tolist()]
+
+
+class TelemetryBatch:
+    """
+    Zero-copy adapter around a structured array of sensor readings
+
+    The array is never copied into per-reading Python objects until a
+    serializer is asked for output, and then only one column at a time.
+    """
+
+    def __init__(self, readings: np.ndarray, device_ids: Optional[Sequence[str]] = None):
+        if readings.dtype != SENSOR_DTYPE:
+            raise ValueError('readings must use SENSOR_DTYPE')
+        self.readings = readings
+        self.device_ids = list(device_ids) if device_ids is not None else None
+
+    def __len__(self) -> int:
+        return len(self.readings)
+
+    def to_bytes(self) -> memoryview:
+        """Raw little-endian buffer of the array (no copy for contiguous input)"""
+        return memoryview(np.ascontiguousarray(self.readings).reshape(-1)).cast('B')
+
+    @classmethod
+    def from_bytes(cls, buffer, device_ids: Optional[Sequence[str]] = None) -> 'TelemetryBatch':
+        """Wrap a buffer produced by to_bytes without copying it"""
+        return cls(np.frombuffer(buffer, dtype=SENSOR_DTYPE), device_ids)
+
+    def columns(self, start: int = 0, stop: Optional[int] = None) -> Dict[str, list]:
+        """Column-wise Python lists for a slice, rounded for display"""
+        part = self.readings[start:stop]
+        columns = {}
+
+        if self.device_ids is not None:
+            lookup = np.asarray(self.device_ids, dtype=object)
+            columns['device_id'] = lookup[part['device']].tolist()
+        else:
+            columns['device'] = part['device'].tolist()
+
+        columns['timestamp'] = timestamps_to_iso(part['timestamp'])
+        for channel in SENSOR_CHANNELS:
+            values = part[channel].astype(np.float64)
+            columns[channel] = np.round(values, CHANNEL_DECIMALS[channel]).tolist()
+        columns['battery_level'] = part['battery_level'].tolist()
+        columns['is_calibrated'] = part['is_calibrated'].tolist()
+        columns['error_code'] = [code.decode() or None for code in part['error_code'].tolist()]
+        return columns
+
+    def iter_records(self, chunk_size: int = 4096) -> Iterator[Dict]:
+        """Yield one dict per reading, converting chunk_size rows at a time"""
+        for start in range(0, len(self.readings), chunk_size):
+            columns = self.columns(start, start + chunk_size)
+            keys = list(columns)
+            for row in zip(*columns.values()):
+                yield dict(zip(keys, row))
+
+    def iter_ndjson(self, chunk_size: int = 4096) -> Iterator[str]:
+        """Yield newline-delimited JSON text, one chunk of rows per item"""
+        dumps = json.JSONEncoder(separators=(',', ':')).encode
+        for start in range(0, len(self.readings), chunk_size):
+            columns = self.columns(start, start + chunk_size)
+            keys = list(columns)
+            yield ''.join(dumps(dict(zip(keys, row))) + '\n' for row in zip(*columns.values()))
+
+    def to_json(self) -> str:
+        """Serialize the whole batch as a JSON array"""
+        return json.dumps(list(self.iter_records()), separators=(',', ':'))
+
+
+def encode_frames(readings: np.ndarray, sequence_start: int = 0) -> bytes:
+    """
+    Encode SENSOR_DTYPE readings as a binary frame body
+
+    The device column is written as-is, so it must already hold BionicDevice
+    primary keys. Error codes other than 'E' followed by digits are sent as
+    error number 0 with the error flag set.
+    """
+    frames = np.zeros(len(readings), dtype=FRAME_DTYPE)
+    frames['device'] = readings['device']
+    frames['sequence'] = (sequence_start + np.arange(len(readings))) & 0xFFFFFFFF
+    frames['timestamp'] = readings['timestamp']
+    for channel in SENSOR_CHANNELS:
+        frames[channel] = readings[channel]
+    frames['battery_level'] = readings['battery_level']
+
+    codes = readings['error_code']
+    has_error = codes != b''
+    frames['flags'] = np.where(readings['is_calibrated'], FLAG_CALIBRATED, 0) | np.where(has_error, FLAG_ERROR, 0)
+    if has_error.any():
+        numbers = [int(code[1:]) if code[:1] == b'E' and code[1:].isdigit() else 0
+                   for code in codes[has_error].tolist()]
+        frames['error_number'][has_error] = np.minimum(numbers, 0xFFFF)
+    return FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, FRAME_DTYPE.itemsize) + frames.tobytes()
+
+
+def decode_frames(body) -> np.ndarray:
+    """Zero-copy FRAME_DTYPE view over a binary frame body"""
+    view = memoryview(body)
+    if len(view) < FRAME_HEADER.size:
+        raise FrameError('Body shorter than the frame header')
+    magic, version, record_size = FRAME_HEADER.unpack_from(view)
+    if magic != FRAME_MAGIC:
+        raise FrameError('Bad magic, expected QXTF')
+    if version != FRAME_VERSION or record_size != FRAME_DTYPE.itemsize:
+        raise FrameError(f'Unsupported frame version {version} with {record_size}-byte records')
+    payload = len(view) - FRAME_HEADER.size
+    if payload % record_size:
+        raise FrameError(f'Body length is not a whole number of {record_size}-byte records')
+    return np.frombuffer(view, dtype=FRAME_DTYPE, offset=FRAME_HEADER.size)
+
+
+def now_epoch() -> float:
+    """Current UTC time as epoch seconds"""
+    return datetime.now(timezone.utc).timestamp()
+
+
+def datetimes_to_epoch(values: Sequence[datetime]) -> np.ndarray:
+    """Epoch seconds of aware datetimes (as returned by the ORM)"""
+    return np.fromiter((value.timestamp() for value in values), dtype=np.float64, count=len(values))
+
+
+def epoch_to_datetimes(timestamps: np.ndarray) -> List[datetime]:
+    """Aware UTC datetimes for epoch seconds, converted through NumPy"""
+    micros = np.round(np.asarray(timestamps, dtype=np.float64) * 1e6).astype('datetime64[us]').tolist()
+    return [moment.replace(tzinfo=timezone.utc) for moment in micros]
@@ -0,0 +1,170 @@
+"""
+Read access to stored telemetry as NumPy columns
+History, downsampling and export code read readings through this module
+rather than querying SensorReading directly, so they see both the hot
+partitions and the per-device-day archive
+"""
+
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from .archive import iter_range
+from .partitions import reading_querysets
+from .telemetry import SENSOR_CHANNELS, datetimes_to_epoch, epoch_to_datetimes
+
+DEFAULT_CHUNK_SIZE = 20000
+
+# (ids, timestamps, {channel: values}) of a run of readings
+Chunk = Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]
+
+
+def _check_channels(channels: Sequence[str]):
+    unknown = set(channels) - set(SENSOR_CHANNELS)
+    if unknown:
+        raise ValueError(f"Unknown channel(s): {', '.join(sorted(unknown))}")
+
+
+def _hot_chunks(device_pk: int, start: float, end: float, channels: Sequence[str],
+                chunk_size: int) -> Iterator[Chunk]:
+    """Hot rows of a device in [start, end), streamed from each overlapping partition chunk_size at a time"""
+    start_at, end_at = epoch_to_datetimes([start, end])
+    for queryset in reading_querysets(start_at, end_at):
+        rows = (queryset.filter(device_id=device_pk)
+                .order_by('timestamp')
+                .values_list('id', 'timestamp', *channels)
+                .iterator(chunk_size=chunk_size))
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_size:
+                yield _pack(batch, channels)
+                batch = []
+        if batch:
+            yield _pack(batch, channels)
+
+
+def _archive_chunks(device_pk: int, start: float, end: float, channels: Sequence[str]) -> Iterator[Chunk]:
+    """Archived rows of a device in [start, end), one device-day at a time"""
+    for data in iter_range(device_pk, start, end, channels):
+        yield data['id'], data['timestamp'], {channel: data[channel].astype(np.float64) for channel in channels}
+
+
+def _merge(hot: List[Chunk], archived: List[Chunk],
+           channels: Sequence[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Timestamps and columns of hot and archived chunks, oldest first, each row once"""
+    hot_ids = np.concatenate([chunk[0] for chunk in hot]) if hot else np.empty(0, dtype=np.int64)
+    chunks = []
+    for ids, timestamps, columns in archived:
+        # A row still in a hot partition after an interrupted archive run is read once
+        keep = ~np.isin(ids, hot_ids)
+        chunks.append((ids[keep], timestamps[keep], {channel: values[keep] for channel, values in columns.items()}))
+    chunks += hot
+    timestamps = np.concatenate([chunk[1] for chunk in chunks]) if chunks else np.empty(0)
+    columns = {channel: np.concatenate([chunk[2][channel] for chunk in chunks]) if chunks else np.empty(0)
+               for channel in channels}
+    # Partitions are read one after the other and may overlap in time
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], {channel: values[order] for channel, values in columns.items()}
+
+
+def fetch_channels(device_pk: int, start: float, end: float, channels: Sequence[str],
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Timestamps and channel columns of one device in [start, end), oldest first
+
+    Hot rows are streamed from the (device, -timestamp) index of each
+    partition overlapping the range, chunk_size at a time, and packed into
+    float64 arrays, so memory holds the result columns but never a full list
+    of model instances; archived device-days that overlap the range are then
+    merged in. Missing IMU values are NaN.
+    """
+    _check_channels(channels)
+    return _merge(list(_hot_chunks(device_pk, start, end, channels, chunk_size)),
+                  list(_archive_chunks(device_pk, start, end, channels)), channels)
+
+
+class Envelope:
+    """
+    Running M4 reduction of one channel
+
+    For each of `buckets` equal time slices of [start, end) it keeps the
+    first, last, lowest and highest measured reading seen so far, which is
+    all a line chart of that many columns draws.
+    """
+
+    def __init__(self, start: float, end: float, buckets: int):
+        self.start = start
+        self.width = (end - start) / buckets
+        self.buckets = buckets
+        # Per kept reading (first, last, min, max): its sort key, timestamp and value
+        self.slots = np.full((4, 3, buckets), np.nan)
+        self.slots[:, 0] = np.inf
+
+    def add(self, timestamps: np.ndarray, values: np.ndarray):
+        measured = ~np.isnan(values)
+        timestamps, values = timestamps[measured], values[measured]
+        if not len(values):
+            return
+        buckets = np.clip(((timestamps - self.start) / self.width).astype(np.intp), 0, self.buckets - 1)
+        for slot, keys in zip(self.slots, (timestamps, -timestamps, values, -values)):
+            # The reading with the smallest key in each bucket, where it beats the one kept
+            order = np.lexsort((keys, buckets))
+            picks = order[np.r_[0, np.flatnonzero(np.diff(buckets[order])) + 1]]
+            picks = picks[keys[picks] < slot[0, buckets[picks]]]
+            slot[:, buckets[picks]] = keys[picks], timestamps[picks], values[picks]
+
+    def points(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The kept readings as (timestamps, values), oldest first"""
+        kept = np.column_stack([self.slots[:, 1].ravel(), self.slots[:, 2].ravel()])
+        kept = np.unique(kept[~np.isnan(kept[:, 0])], axis=0)
+        return kept[:, 0], kept[:, 1]
+
+
+def fetch_series(device_pk: int, start: float, end: float, channels: Sequence[str], buckets: int,
+                 raw_limit: int, chunk_size: int = DEFAULT_CHUNK_SIZE
+                 ) -> Tuple[int, Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+    """
+    Readings in [start, end) and, per channel, the (timestamps, values) of its measured ones to chart
+
+    A range of up to raw_limit readings is returned as fetch_channels()
+    reads it. A larger one is reduced while it streams in: each channel
+    keeps an Envelope of `buckets` slices, so memory is bounded by raw_limit
+    and buckets whatever the range holds. (A reduced range counts a row left
+    in a hot partition by an interrupted archive run twice.)
+    """
+    _check_channels(channels)
+    held = {'hot': [], 'archived': []}
+    count = 0
+    envelopes = None
+    sources = [('hot', _hot_chunks(device_pk, start, end, channels, chunk_size)),
+               ('archived', _archive_chunks(device_pk, start, end, channels))]
+    for source, chunks in sources:
+        for chunk in chunks:
+            count += len(chunk[0])
+            if envelopes is None:
+                held[source].append(chunk)
+                if count <= raw_limit:
+                    continue
+                envelopes = {channel: Envelope(start, end, buckets) for channel in channels}
+                pending, held = held['hot'] + held['archived'], None
+            else:
+                pending = [chunk]
+            for _, timestamps, columns in pending:
+                for channel, envelope in envelopes.items():
+                    envelope.add(timestamps, columns[channel])
+
+    if envelopes is not None:
+        return count, {channel: envelope.points() for channel, envelope in envelopes.items()}
+    timestamps, columns = _merge(held['hot'], held['archived'], channels)
+    series = {}
+    for channel, values in columns.items():
+        measured = ~np.isnan(values)
+        series[channel] = timestamps[measured], values[measured]
+    return len(timestamps), series
+
+
+def _pack(batch, channels) -> Chunk:
+    columns = list(zip(*batch))
+    return (np.array(columns[0], dtype=np.int64), datetimes_to_epoch(columns[1]),
+            {channel: np.array(values, dtype=np.float64) for channel, values in zip(channels, columns[2:])})
@@ -0,0 +1,228 @@
+# Telemetry API views: device ingest, analytics and sensor history
+from django.core.exceptions import RequestDataTooBig
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from datetime import datetime, timedelta, timezone as dt_timezone
+import logging
+import math
+import numpy as np
+
+from .downsample import METHODS as DOWNSAMPLE_METHODS
+from .export import EXPORT_FORMATS, export_stream, parse_export_cursor
+from .ingest import IngestError, columns_from_frames, ingest_columns, ingest_records, parse_body
+from .latency import day_summaries, response_time_summary
+from .models import BionicDevice, DeviceAnalytics, DeviceRollup
+from .pagination import keyset_page, parse_fields
+from .partitions import PartitionMissing, reading_querysets
+from .telemetry import FRAME_CONTENT_TYPE, SENSOR_CHANNELS, FrameError, decode_frames, timestamps_to_iso
+from .telemetry_store import fetch_series
+
+logger = logging.getLogger(__name__)
+
+HISTORY_MAX_POINTS = 5000
+HISTORY_DEFAULT_POINTS = 1000
+# Readings of a history range downsampled as they are; larger ranges are reduced while read
+HISTORY_RAW_LIMIT = 100000
+READINGS_MAX_LIMIT = 1000
+READINGS_DEFAULT_LIMIT = 100
+
+
+def parse_time_param(value, default):
+    """Epoch seconds from an ISO-8601 string or a finite number; default when empty, ValueError when invalid"""
+    if value in (None, ''):
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment, dt_timezone.utc)
+        seconds = moment.timestamp()
+    # float() also takes 'nan' and 'inf', which no range comparison rejects
+    if not math.isfinite(seconds):
+        raise ValueError(f"Time {value!r} is not finite")
+    return seconds
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def telemetry_ingest_api(request):
+    """Accept a batch of readings (JSON array, envelope object, NDJSON or binary frames)"""
+    binary = request.content_type in (FRAME_CONTENT_TYPE, 'application/octet-stream')
+    try:
+        if binary:
+            frames = decode_frames(request.body)
+        else:
+            records = parse_body(request.body, request.content_type)
+    except RequestDataTooBig:
+        return JsonResponse({'status': 'error', 'message': 'Batch too large'}, status=413)
+    except (IngestError, FrameError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    if not (len(frames) if binary else records):
+        return JsonResponse({'status': 'error', 'message': 'No readings provided'}, status=400)
+
+    try:
+        result = ingest_columns(columns_from_frames(frames)) if binary else ingest_records(records)
+    except PartitionMissing as e:
+        logger.error(f"Error ingesting telemetry: {e}")
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=503)
+    except Exception as e:
+        logger.error(f"Error ingesting telemetry: {e}")
+        return JsonResponse({'status': 'error', 'message': f'Ingest failed: {str(e)}'}, status=500)
+
+    return JsonResponse(dict(status='success', **result))
+
+
+@require_http_methods(["GET"])
+def analytics_data_api(request, device_id):
+    """Precomputed usage analytics of a device (daily, or hourly/minute rollups)"""
+    device = get_object_or_404(BionicDevice, device_id=device_id)
+    resolution = request.GET.get('resolution', 'day')
+    try:
+        span = int(request.GET.get('span', 30 if resolution == 'day' else 24))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'span must be an integer'}, status=400)
+
+    if resolution == 'day':
+        since = timezone.now().date() - timedelta(days=span)
+        analytics = DeviceAnalytics.objects.filter(device=device, date__gte=since)
+        rows = list(analytics.order_by('date').values(
+            'date', 'total_usage_hours', 'active_usage_hours', 'grip_count', 'average_grip_force',
+            'response_time_ms', 'response_time_sketch', 'error_count', 'emergency_stops'))
+        summaries = day_summaries([row.pop('response_time_sketch') for row in rows])
+        for row, summary in zip(rows, summaries):
+            row['response_time'] = summary
+        return JsonResponse({'status': 'success', 'device_id': device_id, 'resolution': 'day',
+                             'rows': rows, 'response_time': response_time_summary(analytics)})
+
+    if resolution not in ('hour', 'minute'):
+        return JsonResponse({'status': 'error', 'message': 'resolution must be day, hour or minute'}, status=400)
+
+    since = timezone.now() - (timedelta(hours=span) if resolution == 'hour' else timedelta(minutes=span))
+    rows = []
+    for bucket in DeviceRollup.objects.filter(device=device, resolution=resolution,
+                                              bucket_start__gte=since).order_by('bucket_start'):
+        count = bucket.reading_count or 1
+        rows.append({
+            'bucket_start': bucket.bucket_start.isoformat(),
+            'readings': bucket.reading_count,
+            'grip_count': bucket.grip_count,
+            'average_grip_force': round(bucket.grip_force_sum / count, 2),
+            'max_grip_force': bucket.grip_force_max,
+            'average_emg_signal': round(bucket.emg_signal_sum / count, 2),
+            'average_temperature': round(bucket.temperature_sum / count, 2),
+            'max_temperature': bucket.temperature_max,
+            'min_battery': bucket.battery_min,
+            'error_count': bucket.error_count,
+            'emergency_stops': bucket.emergency_stops,
+        })
+    return JsonResponse({'status': 'success', 'device_id': device_id, 'resolution': resolution, 'rows': rows})
+
+
+@require_http_methods(["GET"])
+def response_time_api(request):
+    """Response-time quantiles merged across days and devices (?device= repeatable, all when omitted)"""
+    try:
+        span = int(request.GET.get('span', 30))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'span must be an integer'}, status=400)
+    analytics = DeviceAnalytics.objects.filter(date__gte=timezone.now().date() - timedelta(days=span))
+    device_ids = request.GET.getlist('device')
+    if device_ids:
+        analytics = analytics.filter(device__device_id__in=device_ids)
+    return JsonResponse({'status': 'success', 'devices': device_ids or 'all', 'span': span,
+                         'response_time': response_time_summary(analytics)})
+
+
+@require_http_methods(["GET"])
+def sensor_history_api(request, device_id):
+    """Downsampled channel history of a device over a time range"""
+    device = get_object_or_404(BionicDevice, device_id=device_id)
+    channels = [name for name in request.GET.get('channels', 'emg_signal,grip_force').split(',') if name]
+    unknown = [name for name in channels if name not in SENSOR_CHANNELS]
+    if unknown or not channels:
+        return JsonResponse({'status': 'error', 'message': f"Unknown channel(s): {', '.join(unknown)}",
+                             'channels': list(SENSOR_CHANNELS)}, status=400)
+
+    method = request.GET.get('method', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        return JsonResponse({'status': 'error', 'message': 'method must be lttb or minmax'}, status=400)
+
+    now = timezone.now().timestamp()
+    try:
+        end = parse_time_param(request.GET.get('end'), now)
+        start = parse_time_param(request.GET.get('start'), end - 86400)
+        points = min(int(request.GET.get('points', HISTORY_DEFAULT_POINTS)), HISTORY_MAX_POINTS)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid start, end or points'}, status=400)
+    if end <= start or points < 3:
+        return JsonResponse({'status': 'error', 'message': 'Empty time range or too few points'}, status=400)
+
+    raw_points, measured = fetch_series(device.pk, start, end, channels, points, HISTORY_RAW_LIMIT)
+    downsample = DOWNSAMPLE_METHODS[method]
+    series = {}
+    for name in channels:
+        x, y = downsample(*measured[name], points)
+        series[name] = {'t': timestamps_to_iso(x), 'v': np.round(y, 3).tolist()}
+
+    return JsonResponse({
+        'status': 'success',
+        'device_id': device_id,
+        'start': timestamps_to_iso([start])[0],
+        'end': timestamps_to_iso([end])[0],
+        'method': method,
+        'raw_points': raw_points,
+        'series': series,
+    })
+
+
+@require_http_methods(["GET"])
+def sensor_readings_api(request, device_id):
+    """Raw readings of a device, newest first, one keyset page at a time"""
+    device = get_object_or_404(BionicDevice, device_id=device_id)
+    try:
+        limit = min(max(int(request.GET.get('limit', READINGS_DEFAULT_LIMIT)), 1), READINGS_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit must be an integer'}, status=400)
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        readings, next_cursor = keyset_page([queryset.filter(device=device) for queryset in reading_querysets()],
+                                            request.GET.get('cursor'), limit, fields)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'device_id': device_id,
+        'count': len(readings),
+        'readings': readings,
+        'next_cursor': next_cursor,
+    })
+
+
+@require_http_methods(["GET"])
+def telemetry_export_api(request, device_id):
+    """Stream every reading of a device in a time range as CSV or NDJSON, optionally gzipped"""
+    device = get_object_or_404(BionicDevice, device_id=device_id)
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({'status': 'error', 'message': 'format must be csv or ndjson'}, status=400)
+    compress = request.GET.get('compress') == 'gzip'
+    cursor = request.GET.get('cursor')
+    try:
+        start = parse_time_param(request.GET.get('start'), 0)
+        end = parse_time_param(request.GET.get('end'), timezone.now().timestamp() + 1)
+        fields = parse_fields(request.GET.get('fields'))
+        parse_export_cursor(cursor)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    stream = export_stream(device.pk, start, end, fmt, fields, cursor, compress)
+    response = StreamingHttpResponse(stream, content_type='application/gzip' if compress else EXPORT_FORMATS[fmt])
+    filename = f'{device_id}-telemetry.{fmt}' + ('.gz' if compress else '')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -1,3 +1,1862 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import datetime
+import io
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import (
+    LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.testcases import _StaticFilesHandler
+from django.utils import timezone
+
+from api.models import DeviceCommand
+from bionic_site import settings as project_settings
+
+from . import live
+from .alert_rules import (
+    COMPARATORS, DEFAULT_ALERT_RULES, AlertRule, RuleEngine, RuleSet, check_rules, describe, rule_notifications,
+    rules_from_settings, snapshot_alerts,
+)
+from .anomaly import ANOMALY_CHANNELS, AnomalyDetector, alert_notifications
+from .archive import RetentionPolicy, archived_days, read_range
+from .channel_layers import broadcast_state, device_group
+from .compact import (
+    COMPACT_CONTENT_TYPE, COMPACT_DECIMALS, COMPACT_FIELDS, COMPACT_MAGIC, CompactEncoder, CompactError, decode,
+    decode_binary,
+)
+from .db_profile import batch_writer_enabled
+from .downsample import lttb, minmax_buckets
+from .hub import FeedError, Frame, Subscriber, TelemetryHub, get_hub
+from .ingest import IngestError, columns_from_records, parse_body
+from .latency import LatencyRecorder
+from .management.commands.loadgen import EndpointStats
+from .ml_utils import SensorDataSimulator, SensorStream
+from .models import (
+    BionicDevice, DeviceAnalytics, DeviceRollup, Notification, Patient, ReadingPartition, RollupWatermark,
+    SensorReading,
+)
+from .notification_dispatch import NotificationDispatcher, dispatch, get_dispatcher
+from .notification_store import (
+    encode_cursor, notifications_created, notifications_since, parse_cursor, state_token, unread_count,
+)
+from .partitions import PartitionMissing, PartitionRouter, get_router, partition_model, reading_querysets
+from .rollups import RESOLUTION_SECONDS, RollupEngine
+from .sketch import DDSketch, merge_all
+from .stream_views import parse_last_event_id, sse_event
+from .telemetry import (
+    FRAME_CONTENT_TYPE, FRAME_DTYPE, SENSOR_CHANNELS, SENSOR_DTYPE, FrameError, TelemetryBatch,
+    decode_frames, encode_frames, timestamps_to_iso,
+)
+from .telemetry_store import Envelope, fetch_channels
+from .websocket import websocket_application
+from .writer import BatchWriter, bulk_insert
+
+
+def make_device(device_id):
+    """A BionicDevice with its patient and user"""
+    user = User.objects.create(username=f'user-{device_id}')
+    patient = Patient.objects.create(
+        user=user, patient_id=f'P-{device_id}', date_of_birth=datetime.date(1990, 1, 1), gender='M',
+        blood_type='A+', phone_number='1', emergency_contact='1', address='-')
+    return BionicDevice.objects.create(
+        patient=patient, device_id=device_id, device_type='standard', model_name='Test hand',
+        serial_number=f'SN-{device_id}', firmware_version='1.0', installation_date=datetime.date(2024, 1, 1),
+        warranty_expiry=datetime.date(2030, 1, 1))
+
+
+def reading(device_id, **fields):
+    """A valid reading dict for the ingest API"""
+    values = {
+        'device_id': device_id, 'emg_signal': 250.0, 'grip_force': 40.0, 'thumb_flex': 10.0,
+        'index_flex': 20.0, 'middle_flex': 30.0, 'ring_flex': 40.0, 'pinky_flex': 50.0,
+        'temperature': 32.5, 'palm_pressure': 12.0, 'battery_level': 80, 'is_calibrated': True,
+    }
+    values.update(fields)
+    return values
+
+
+def stored_readings(device):
+    """Readings of a device across every partition"""
+    return sum(queryset.filter(device=device).count() for queryset in reading_querysets())
+
+
+class TelemetryTestCase(TestCase):
+    """TestCase with a private live ring directory and the alert checks of ingest stubbed out"""
+
+    def setUp(self):
+        ring_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(ring_dir.cleanup)
+        settings = override_settings(TELEMETRY_RING_DIR=ring_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Rings mapped by earlier tests live in their own, deleted, directories
+        rings = mock.patch.dict('dashboard.live._rings', clear=True)
+        rings.start()
+        self.addCleanup(rings.stop)
+        self.addCleanup(lambda: [ring.close() for ring in live._rings.values()])
+        for name in ('check_batch', 'check_rules'):
+            patcher = mock.patch(f'dashboard.ingest.{name}', return_value=0)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class GenerateBatchTests(SimpleTestCase):
+    """SensorDataSimulator.generate_batch and TelemetryBatch"""
+
+    def setUp(self):
+        self.simulator = SensorDataSimulator()
+
+    def test_batch_is_device_major_with_spaced_timestamps(self):
+        readings = self.simulator.generate_batch(3, 4, sample_rate=10.0, start_time=1000.0,
+                                                 rng=np.random.default_rng(1))
+        self.assertEqual(readings.dtype, SENSOR_DTYPE)
+        self.assertEqual(len(readings), 12)
+        self.assertEqual(readings['device'].tolist(), [0] * 4 + [1] * 4 + [2] * 4)
+        np.testing.assert_allclose(readings['timestamp'][:4], [1000.0, 1000.1, 1000.2, 1000.3])
+        np.testing.assert_allclose(readings['timestamp'][4:8], readings['timestamp'][:4])
+
+    def test_values_stay_in_sensor_ranges(self):
+        readings = self.simulator.generate_batch(20, 50, activity_levels='heavy_activity',
+                                                 rng=np.random.default_rng(2))
+        self.assertTrue(((readings['emg_signal'] >= 0) & (readings['emg_signal'] <= 1000)).all())
+        self.assertTrue(((readings['grip_force'] >= 0) & (readings['grip_force'] <= 100)).all())
+        self.assertTrue((readings['battery_level'] >= 20).all())
+        self.assertTrue(readings['is_calibrated'].all())
+
+    def test_per_device_activity_levels(self):
+        rng = np.random.default_rng(3)
+        readings = self.simulator.generate_batch(2, 500, activity_levels=['rest', 'heavy_activity'], rng=rng)
+        rest, heavy = readings[:500], readings[500:]
+        self.assertLess(rest['emg_signal'].mean(), heavy['emg_signal'].mean())
+
+    def test_activity_levels_must_match_devices(self):
+        with self.assertRaises(ValueError):
+            self.simulator.generate_batch(3, 1, activity_levels=['rest', 'rest'])
+
+    def test_same_rng_seed_reproduces_the_batch(self):
+        first = self.simulator.generate_batch(2, 5, start_time=0.0, rng=np.random.default_rng(7))
+        second = self.simulator.generate_batch(2, 5, start_time=0.0, rng=np.random.default_rng(7))
+        self.assertEqual(first.tobytes(), second.tobytes())
+
+    def test_bytes_round_trip_without_copy(self):
+        readings = self.simulator.generate_batch(2, 3, rng=np.random.default_rng(4))
+        buffer = TelemetryBatch(readings).to_bytes()
+        self.assertEqual(len(buffer), len(readings) * SENSOR_DTYPE.itemsize)
+        restored = TelemetryBatch.from_bytes(buffer)
+        self.assertTrue(np.shares_memory(restored.readings, readings))
+        self.assertEqual(restored.readings.tobytes(), readings.tobytes())
+
+    def test_records_and_ndjson(self):
+        readings = self.simulator.generate_batch(2, 3, start_time=0.0, rng=np.random.default_rng(5))
+        batch = TelemetryBatch(readings, device_ids=['BH-A', 'BH-B'])
+        records = list(batch.iter_records(chunk_size=4))
+        self.assertEqual(len(records), 6)
+        self.assertEqual([record['device_id'] for record in records], ['BH-A'] * 3 + ['BH-B'] * 3)
+        self.assertEqual(records[0]['timestamp'], '1970-01-01T00:00:00.000000+00:00')
+        self.assertIsNone(records[0]['error_code'])
+        self.assertEqual(set(SENSOR_CHANNELS) - set(records[0]), set())
+        lines = ''.join(batch.iter_ndjson(chunk_size=4)).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], records)
+        self.assertEqual(json.loads(batch.to_json()), records)
+
+    def test_rejects_other_dtypes(self):
+        with self.assertRaises(ValueError):
+            TelemetryBatch(np.zeros(3))
+
+
+class SensorStreamTests(SimpleTestCase):
+    """Time-correlated SensorStream chunks"""
+
+    def test_rejects_bad_rates_and_chunk_sizes(self):
+        with self.assertRaises(ValueError):
+            SensorStream(sample_rate=2000)
+        with self.assertRaises(ValueError):
+            SensorStream(sample_rate=0)
+        with self.assertRaises(ValueError):
+            SensorStream(chunk_size=0)
+
+    def test_chunks_continue_the_timeline(self):
+        stream = SensorStream(n_devices=2, sample_rate=100.0, chunk_size=50, start_time=0.0, seed=1)
+        first, second = stream.chunks(2)
+        self.assertEqual(len(first), 100)
+        self.assertEqual(first['device'].tolist(), [0] * 50 + [1] * 50)
+        np.testing.assert_allclose(first['timestamp'][:50], np.arange(50) / 100.0)
+        np.testing.assert_allclose(second['timestamp'][:50], (50 + np.arange(50)) / 100.0)
+        self.assertEqual(stream.sample_index, 100)
+
+    def test_seed_reproduces_the_stream(self):
+        first = SensorStream(n_devices=3, chunk_size=200, start_time=0.0, seed=9).next_chunk()
+        second = SensorStream(n_devices=3, chunk_size=200, start_time=0.0, seed=9).next_chunk()
+        self.assertEqual(first.tobytes(), second.tobytes())
+
+    def test_channels_are_correlated_in_time(self):
+        stream = SensorStream(n_devices=1, sample_rate=1000.0, chunk_size=5000, activity_level='moderate_activity',
+                              start_time=0.0, seed=2)
+        temperature = stream.next_chunk()['temperature'].astype(np.float64)
+        lag1 = np.corrcoef(temperature[:-1], temperature[1:])[0, 1]
+        self.assertGreater(lag1, 0.9)
+        # Still around body temperature after five seconds
+        self.assertLess(abs(temperature.mean() - 37.5), 1.5)
+
+    def test_battery_only_drains(self):
+        stream = SensorStream(n_devices=4, sample_rate=1000.0, chunk_size=1000, activity_level='heavy_activity',
+                              start_time=0.0, seed=3)
+        levels = np.concatenate([chunk['battery_level'][::1000] for chunk in stream.chunks(5)])
+        self.assertTrue((np.diff(levels.reshape(5, 4), axis=0) <= 0).all())
+        self.assertTrue((levels <= 100).all())
+
+    def test_values_stay_in_sensor_ranges(self):
+        chunk = SensorStream(n_devices=5, chunk_size=2000, activity_level='heavy_activity', seed=4).next_chunk()
+        self.assertTrue(((chunk['emg_signal'] >= 0) & (chunk['emg_signal'] <= 1000)).all())
+        self.assertTrue(((chunk['grip_force'] >= 0) & (chunk['grip_force'] <= 100)).all())
+        self.assertTrue(((chunk['thumb_flex'] >= 0) & (chunk['thumb_flex'] <= 90)).all())
+
+
+class EndpointStatsTests(SimpleTestCase):
+    """loadgen's per-endpoint summaries"""
+
+    def test_merge_and_summary(self):
+        first, second = EndpointStats(), EndpointStats()
+        first.latencies_ms = [10.0, 20.0]
+        first.status_codes.update([200, 200])
+        second.latencies_ms = [30.0]
+        second.status_codes.update([500, 'connection_error'])
+        second.errors = 2
+        first.merge(second)
+        summary = first.summary(elapsed=2.0)
+        self.assertEqual(summary['requests'], 4)
+        self.assertEqual(summary['errors'], 2)
+        self.assertEqual(summary['error_rate'], 0.5)
+        self.assertEqual(summary['throughput_rps'], 2.0)
+        self.assertEqual(summary['latency_ms']['p50'], 20.0)
+        self.assertEqual(summary['latency_ms']['max'], 30.0)
+        self.assertEqual(summary['status_codes'], {'200': 2, '500': 1, 'connection_error': 1})
+
+    def test_empty_summary(self):
+        summary = EndpointStats().summary(elapsed=0)
+        self.assertEqual((summary['requests'], summary['error_rate'], summary['latency_ms']), (0, 0.0, {}))
+
+
+class SerializedStaticFilesHandler(_StaticFilesHandler):
+    """One request at a time: the live server's threads share the in-memory test database connection"""
+
+    lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self.lock:
+            return super().__call__(environ, start_response)
+
+
+class LoadgenCommandTests(LiveServerTestCase):
+    """manage.py loadgen against a live test server"""
+
+    static_handler = SerializedStaticFilesHandler
+
+    def test_devices_post_and_clients_poll(self):
+        out = io.StringIO()
+        call_command('loadgen', base_url=self.live_server_url, devices=2, clients=1, duration=1.0,
+                     post_interval=0.2, samples_per_post=5, poll_paths=['/api/sensors/'],
+                     create_devices=True, stdout=out, stderr=io.StringIO())
+        report = json.loads(out.getvalue())
+        ingest = report['endpoints']['ingest /dashboard/api/telemetry/ingest/']
+        self.assertGreater(ingest['requests'], 0)
+        self.assertEqual(ingest['errors'], 0)
+        self.assertEqual(ingest['readings_rejected'], 0)
+        self.assertEqual(ingest['readings_accepted'], ingest['requests'] * 5)
+        self.assertEqual(BionicDevice.objects.filter(device_id__startswith='sim-').count(), 2)
+        self.assertGreater(report['endpoints']['poll /api/sensors/']['requests'], 0)
+
+    def test_rejects_non_http_urls(self):
+        with self.assertRaises(CommandError):
+            call_command('loadgen', base_url='ftp://example.com', duration=0, stdout=io.StringIO())
+
+
+class ParseBodyTests(SimpleTestCase):
+    """ingest.parse_body"""
+
+    def test_array_envelope_and_ndjson(self):
+        self.assertEqual(parse_body(b'[{"a": 1}, {"a": 2}]'), [{'a': 1}, {'a': 2}])
+        envelope = b'{"device_id": "D1", "readings": [{"a": 1}, {"a": 2, "device_id": "D2"}]}'
+        self.assertEqual(parse_body(envelope), [{'a': 1, 'device_id': 'D1'}, {'a': 2, 'device_id': 'D2'}])
+        self.assertEqual(parse_body(b'{"a": 1}\n\n{"a": 2}\n', 'application/x-ndjson'), [{'a': 1}, {'a': 2}])
+
+    def test_rejects_malformed_bodies(self):
+        for body in (b'{"a": ', b'\xff', b'42', b'[1, 2]', b'{"readings": [3]}'):
+            with self.subTest(body=body), self.assertRaises(IngestError):
+                parse_body(body)
+
+
+class ReadingColumnsTests(TelemetryTestCase):
+    """Vectorized validation of ingest batches"""
+
+    def setUp(self):
+        super().setUp()
+        make_device('D1')
+
+    def test_valid_readings_are_accepted(self):
+        columns = columns_from_records([reading('D1', timestamp='2026-01-02T03:04:05Z'),
+                                        reading('D1', timestamp=1767322000.5, accel_x=None)])
+        self.assertEqual(columns.accepted.tolist(), [True, True])
+        self.assertEqual(dict(columns.reasons), {})
+        self.assertEqual(columns.timestamps[0], 1767323045.0)
+        self.assertTrue(np.isnan(columns.channels['accel_x'][1]))
+
+    def test_rejections_are_per_row_with_reasons(self):
+        records = [
+            reading('D1'),
+            reading('nope'),
+            reading('D1', grip_force=100.5),
+            reading('D1', temperature=None),
+            reading('D1', grip_force='40'),
+            reading('D1', emg_signal=[1, 2]),
+            reading('D1', battery_level=True),
+            reading('D1', timestamp='yesterday'),
+            reading('D1', timestamp=1767322000500),  # milliseconds
+            reading('D1', timestamp='1890-01-01T00:00:00Z'),
+            reading('D1', error_code=404),
+            reading('D1', error_code='E' * 21),
+        ]
+        columns = columns_from_records(records)
+        self.assertEqual(columns.accepted.tolist(), [True] + [False] * 11)
+        self.assertEqual(dict(columns.reasons), {
+            'unknown_device': 1, 'grip_force': 2, 'temperature': 1, 'emg_signal': 1,
+            'battery_level': 1, 'timestamp': 3, 'error_code': 2,
+        })
+
+    def test_non_finite_and_nat_timestamps(self):
+        columns = columns_from_records([reading('D1')] * 3)
+        columns.timestamps[:] = [np.nan, np.inf, 1767322000.0]
+        self.assertEqual(columns._validate({}).tolist(), [False, False, True])
+
+
+class TelemetryIngestApiTests(TelemetryTestCase):
+    """POST /dashboard/api/telemetry/ingest/"""
+
+    url = '/dashboard/api/telemetry/ingest/'
+
+    def setUp(self):
+        super().setUp()
+        self.device = make_device('D1')
+
+    def post(self, body, content_type='application/json'):
+        return self.client.post(self.url, body, content_type=content_type)
+
+    def test_stores_accepted_and_reports_rejected(self):
+        response = self.post(json.dumps([reading('D1'), reading('D1', error_code='E042'),
+                                         reading('D1', grip_force=-1), reading('ghost')]))
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result['received'], result['accepted'], result['rejected']), (4, 2, 2))
+        self.assertEqual(result['devices'], {'D1': {'accepted': 2, 'rejected': 1},
+                                             'ghost': {'accepted': 0, 'rejected': 1}})
+        self.assertEqual(result['reject_reasons'], {'grip_force': 1, 'unknown_device': 1})
+        self.assertEqual(stored_readings(self.device), 2)
+
+    def test_ndjson_body(self):
+        body = '\n'.join(json.dumps(reading('D1', timestamp=1767322000 + index)) for index in range(5))
+        response = self.post(body, 'application/x-ndjson')
+        self.assertEqual(response.json()['accepted'], 5)
+        self.assertEqual(stored_readings(self.device), 5)
+
+    def test_bad_and_empty_bodies(self):
+        self.assertEqual(self.post('{"readings": ').status_code, 400)
+        self.assertEqual(self.post('[]').status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertEqual(stored_readings(self.device), 0)
+
+
+class BinaryFrameTests(SimpleTestCase):
+    """Binary telemetry frame encoding"""
+
+    def setUp(self):
+        self.readings = SensorDataSimulator().generate_batch(2, 3, start_time=1767322000.0,
+                                                             rng=np.random.default_rng(5))
+        self.readings['error_code'][1] = b'E042'
+        self.readings['error_code'][2] = b'OVERHEAT'
+
+    def test_round_trip(self):
+        body = encode_frames(self.readings, sequence_start=2 ** 32 - 2)
+        self.assertEqual(len(body), 8 + 80 * len(self.readings))
+        frames = decode_frames(body)
+        self.assertEqual(frames.dtype, FRAME_DTYPE)
+        self.assertEqual(frames['sequence'].tolist(), [2 ** 32 - 2, 2 ** 32 - 1, 0, 1, 2, 3])
+        np.testing.assert_array_equal(frames['timestamp'], self.readings['timestamp'])
+        for channel in SENSOR_CHANNELS:
+            np.testing.assert_array_equal(frames[channel], self.readings[channel])
+        self.assertEqual(frames['error_number'][:3].tolist(), [0, 42, 0])
+        self.assertEqual((frames['flags'][:3] & 0x02).tolist(), [0, 2, 2])
+
+    def test_malformed_bodies(self):
+        body = encode_frames(self.readings)
+        for bad in (body[:5], b'XXXX' + body[4:], body[:4] + b'\x02\x00' + body[6:], body[:-1]):
+            with self.subTest(length=len(bad)), self.assertRaises(FrameError):
+                decode_frames(bad)
+
+
+class BinaryIngestApiTests(TelemetryTestCase):
+    """Binary frames posted to the ingest endpoint"""
+
+    def test_frames_are_stored_like_json(self):
+        device = make_device('D1')
+        readings = SensorDataSimulator().generate_batch(1, 4, start_time=1767322000.0,
+                                                        rng=np.random.default_rng(6))
+        readings['device'] = [device.pk, device.pk, device.pk, device.pk + 1000]
+        readings['error_code'][0] = b'E007'
+        response = self.client.post('/dashboard/api/telemetry/ingest/', encode_frames(readings),
+                                    content_type=FRAME_CONTENT_TYPE)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result['accepted'], result['reject_reasons']), (3, {'unknown_device': 1}))
+        codes = [code for queryset in reading_querysets()
+                 for code in queryset.filter(device=device).order_by('timestamp').values_list('error_code', flat=True)]
+        self.assertEqual(codes, ['E007', None, None])
+
+    def test_truncated_body_is_rejected(self):
+        response = self.client.post('/dashboard/api/telemetry/ingest/', b'QXTF\x01\x00P\x00' + b'\x00' * 79,
+                                    content_type=FRAME_CONTENT_TYPE)
+        self.assertEqual(response.status_code, 400)
+
+
+def add_readings(device, start, codes, grip_forces=None, step=20, model=SensorReading):
+    """Readings step seconds apart from start, with the given error codes (and grip forces), in model's table"""
+    grip_forces = grip_forces or [40.0] * len(codes)
+    model.objects.bulk_create(
+        model(device=device, timestamp=start + datetime.timedelta(seconds=step * index),
+                      error_code=code, grip_force=grip, emg_signal=200.0, thumb_flex=10.0, index_flex=10.0,
+                      middle_flex=10.0, ring_flex=10.0, pinky_flex=10.0, temperature=33.0, palm_pressure=5.0,
+                      battery_level=90 - index)
+        for index, (code, grip) in enumerate(zip(codes, grip_forces)))
+
+
+class RollupEngineTests(TestCase):
+    """Incremental rollups of SensorReading"""
+
+    START = datetime.datetime(2026, 1, 5, 10, 0, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        self.device = make_device('D1')
+
+    def rollups(self, resolution):
+        return list(DeviceRollup.objects.filter(device=self.device, resolution=resolution)
+                    .order_by('bucket_start')
+                    .values('bucket_start', 'reading_count', 'minutes_seen', 'grip_count', 'grip_force_max',
+                            'battery_min', 'error_count', 'emergency_stops'))
+
+    def test_buckets_and_daily_analytics(self):
+        add_readings(self.device, self.START, [None] * 5, grip_forces=[10.0, 40.0, 45.0, 10.0, 50.0])
+        summary = RollupEngine().run()
+        self.assertEqual(summary, {'devices': 1, 'readings': 5, 'chunks': 1})
+
+        minutes = self.rollups('minute')
+        self.assertEqual([row['reading_count'] for row in minutes], [3, 2])
+        hour, = self.rollups('hour')
+        self.assertEqual((hour['reading_count'], hour['minutes_seen'], hour['grip_count']), (5, 2, 2))
+        self.assertEqual((hour['grip_force_max'], hour['battery_min']), (50.0, 86))
+
+        analytics = DeviceAnalytics.objects.get(device=self.device)
+        self.assertEqual(analytics.date, self.START.date())
+        self.assertEqual((analytics.grip_count, analytics.average_grip_force), (2, 31.0))
+        self.assertAlmostEqual(analytics.total_usage_hours, round(2 / 60, 3))
+        self.assertEqual(RollupEngine().run()['readings'], 0)
+
+    def test_chunked_and_incremental_runs_match_one_pass(self):
+        grips = [10.0, 40.0, 10.0, 40.0, 40.0, 10.0, 40.0, 10.0]
+        add_readings(self.device, self.START, [None] * 8, grip_forces=grips, step=50)
+        RollupEngine().run()
+        expected = {resolution: self.rollups(resolution) for resolution in RESOLUTION_SECONDS}
+        DeviceRollup.objects.all().delete()
+        RollupWatermark.objects.all().delete()
+
+        engine = RollupEngine(chunk_size=3)
+        engine.rollup_device(self.device.pk)
+        add_readings(self.device, self.START + datetime.timedelta(seconds=400), [None] * 2,
+                     grip_forces=[40.0, 10.0], step=50)
+        self.assertEqual(engine.rollup_device(self.device.pk), (2, 1))
+        hour, = self.rollups('hour')
+        self.assertEqual((hour['reading_count'], hour['grip_count']), (10, 4))
+        self.assertEqual(self.rollups('minute')[:len(expected['minute'])], expected['minute'])
+
+    def test_error_count_counts_events_across_runs(self):
+        add_readings(self.device, self.START, [None, 'E005', 'E005'])
+        RollupEngine().run()
+        add_readings(self.device, self.START + datetime.timedelta(minutes=1),
+                     ['E005', None, 'E005', 'E001', 'E001', 'E002'])
+        RollupEngine().run()
+        day, = self.rollups('day')
+        self.assertEqual((day['reading_count'], day['error_count'], day['emergency_stops']), (9, 4, 1))
+        self.assertEqual(DeviceAnalytics.objects.get(device=self.device).error_count, 4)
+
+
+class DownsampleTests(SimpleTestCase):
+    """LTTB and min/max bucket downsampling"""
+
+    def setUp(self):
+        self.x = np.arange(1000, dtype=np.float64)
+        self.y = np.sin(self.x / 50)
+        self.y[437] = 5.0
+        self.y[712] = -5.0
+
+    def test_lttb_keeps_ends_and_spikes(self):
+        x, y = lttb(self.x, self.y, 50)
+        self.assertEqual(len(x), 50)
+        self.assertEqual((x[0], x[-1]), (0.0, 999.0))
+        self.assertTrue(np.all(np.diff(x) > 0))
+        self.assertIn(437.0, x)
+        self.assertIn(712.0, x)
+
+    def test_minmax_keeps_bucket_extremes(self):
+        x, y = minmax_buckets(self.x, self.y, 20)
+        self.assertLessEqual(len(x), 20)
+        self.assertTrue(np.all(np.diff(x) > 0))
+        self.assertEqual((y.max(), y.min()), (5.0, -5.0))
+
+    def test_short_series_are_returned_unchanged(self):
+        for method in (lttb, minmax_buckets):
+            x, y = method(self.x[:10], self.y[:10], 20)
+            np.testing.assert_array_equal(x, self.x[:10])
+
+    def test_envelope_keeps_first_last_and_extremes_per_bucket(self):
+        envelope = Envelope(0.0, 1000.0, 10)
+        values = self.y.copy()
+        values[5] = np.nan
+        # Fed in chunks, out of order
+        for chunk in (slice(500, 1000), slice(0, 500)):
+            envelope.add(self.x[chunk], values[chunk])
+        x, y = envelope.points()
+        self.assertLessEqual(len(x), 40)
+        self.assertTrue(np.all(np.diff(x) > 0))
+        self.assertEqual((x[0], x[-1]), (0.0, 999.0))
+        self.assertTrue({437.0, 712.0}.issubset(x.tolist()))
+        for bucket in range(10):
+            inside = slice(bucket * 100, bucket * 100 + 100)
+            kept = (x >= bucket * 100) & (x < bucket * 100 + 100)
+            self.assertEqual((y[kept].min(), y[kept].max()), (np.nanmin(values[inside]), np.nanmax(values[inside])))
+        self.assertEqual(len(Envelope(0.0, 1.0, 4).points()[0]), 0)
+
+
+class SensorHistoryApiTests(TestCase):
+    """The downsampled history endpoint"""
+
+    START = datetime.datetime(2026, 1, 5, 10, 0, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        self.device = make_device('D1')
+        add_readings(self.device, self.START, [None] * 20, grip_forces=[float(i) for i in range(20)], step=1)
+        self.url = '/dashboard/api/devices/D1/history/'
+
+    def get(self, **params):
+        params.setdefault('start', self.START.isoformat())
+        params.setdefault('end', (self.START + datetime.timedelta(minutes=1)).isoformat())
+        return self.client.get(self.url, params)
+
+    def test_series_are_downsampled(self):
+        response = self.get(channels='grip_force,accel_x', points=5, method='minmax')
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['raw_points'], 20)
+        grip = result['series']['grip_force']
+        self.assertLessEqual(len(grip['v']), 5)
+        self.assertEqual((grip['v'][0], grip['v'][-1]), (0.0, 19.0))
+        self.assertEqual(len(grip['t']), len(grip['v']))
+        # IMU channels are unmeasured here
+        self.assertEqual(result['series']['accel_x'], {'t': [], 'v': []})
+
+    def test_range_excludes_readings_outside_it(self):
+        response = self.get(end=(self.START + datetime.timedelta(seconds=10)).isoformat(), points=100)
+        self.assertEqual(response.json()['series']['grip_force']['v'], [float(i) for i in range(10)])
+
+    def test_large_ranges_are_reduced_while_read(self):
+        with mock.patch('dashboard.telemetry_views.HISTORY_RAW_LIMIT', 8), \
+                mock.patch('dashboard.telemetry_store.Envelope', wraps=Envelope) as envelope:
+            result = self.get(points=5, channels='grip_force').json()
+        self.assertEqual(envelope.call_count, 1)
+        self.assertEqual(result['raw_points'], 20)
+        grip = result['series']['grip_force']
+        self.assertLessEqual(len(grip['v']), 5)
+        self.assertEqual((grip['v'][0], grip['v'][-1], max(grip['v'])), (0.0, 19.0, 19.0))
+
+    def test_invalid_parameters(self):
+        for params in ({'channels': 'nope'}, {'method': 'mean'}, {'points': 'many'}, {'points': 2},
+                       {'end': self.START.isoformat()}, {'start': 'nan'}, {'end': 'inf'}, {'start': '-inf'},
+                       {'start': 'NaN', 'end': 'nan'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
+        self.assertEqual(self.client.get('/dashboard/api/devices/D9/history/').status_code, 404)
+
+
+class RetentionPolicyTests(TestCase):
+    """Archiving expired readings to per-device-day files"""
+
+    OLD = datetime.datetime(2025, 1, 5, 23, 59, 30, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings = override_settings(TELEMETRY_ARCHIVE_DIR=archive_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.device = make_device('D1')
+        # Four readings across midnight, one with a code of the full 20 characters
+        add_readings(self.device, self.OLD, [None, 'E' * 20, None, 'E005'])
+        add_readings(self.device, timezone.now() - datetime.timedelta(hours=1), [None])
+
+    def test_expired_readings_move_to_the_archive(self):
+        summary = RetentionPolicy(retain_days=30).run()
+        self.assertEqual((summary['devices'], summary['days'], summary['readings']), (1, 2, 4))
+        self.assertEqual(stored_readings(self.device), 1)
+        self.assertEqual(archived_days(self.device.pk), [datetime.date(2025, 1, 5), datetime.date(2025, 1, 6)])
+
+        start, end = self.OLD.timestamp(), self.OLD.timestamp() + 3600
+        archived = read_range(self.device.pk, start, end, ['grip_force', 'error_code'])
+        self.assertEqual(archived['error_code'].tolist(), [b'', b'E' * 20, b'', b'E005'])
+        self.assertEqual(len(fetch_channels(self.device.pk, start, end, ['grip_force'])[0]), 4)
+        # Rolled up before leaving the database
+        self.assertEqual(DeviceRollup.objects.get(device=self.device, resolution='hour',
+                                                  bucket_start=self.OLD.replace(minute=0, second=0)).reading_count, 2)
+
+    def test_rerun_and_dry_run(self):
+        dry = RetentionPolicy(retain_days=30).run(dry_run=True)
+        self.assertEqual((dry['readings'], dry['days']), (4, 0))
+        self.assertEqual(stored_readings(self.device), 5)
+
+        RetentionPolicy(retain_days=30).run()
+        self.assertEqual(RetentionPolicy(retain_days=30).run()['readings'], 0)
+        # A row left behind by an interrupted run is archived once
+        archived = read_range(self.device.pk, 0, self.OLD.timestamp() + 86400, ['grip_force'])
+        add_readings(self.device, self.OLD, [None])
+        SensorReading.objects.filter(timestamp=self.OLD).update(id=int(archived['id'][0]))
+        RetentionPolicy(retain_days=30).run()
+        archived = read_range(self.device.pk, 0, self.OLD.timestamp() + 86400, ['grip_force'])
+        self.assertEqual(len(archived['id']), 4)
+
+
+class RingBufferTests(SimpleTestCase):
+    """The memory-mapped live ring of a device"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/D1.ring'
+        self.ring = self.open(4)
+        self.readings = SensorDataSimulator().generate_batch(1, 6, start_time=1000.0, rng=np.random.default_rng(2))
+
+    def open(self, capacity):
+        ring = live.RingBuffer(self.path, capacity)
+        self.addCleanup(ring.close)
+        return ring
+
+    def test_append_wraps_and_reports_lost_readings(self):
+        self.ring.append(self.readings[:3])
+        self.ring.append(self.readings[3:])
+        self.assertEqual((self.ring.written, self.ring.sequence), (6, 4))
+        np.testing.assert_array_equal(self.ring.latest(10)['timestamp'], self.readings['timestamp'][2:])
+
+        readings, cursor, lost = self.ring.since(1, 3)
+        self.assertEqual((cursor, lost), (5, 1))
+        np.testing.assert_array_equal(readings['timestamp'], self.readings['timestamp'][2:5])
+        # A cursor past the write cursor belongs to an older ring: read from the start
+        self.assertEqual(self.ring.since(9, 10)[1:], (6, 2))
+
+    def test_other_mappings_share_the_file(self):
+        self.ring.append(self.readings[:2])
+        other = self.open(4)
+        self.assertEqual(other.written, 2)
+        other.append(self.readings[2:3])
+        self.assertEqual(self.ring.latest()['timestamp'].tolist(), [self.readings['timestamp'][2]])
+        # A different capacity starts a new, empty ring
+        self.assertEqual(self.open(8).written, 0)
+
+    def test_reads_during_a_write_fall_back_to_the_lock(self):
+        self.ring.append(self.readings[:2])
+        live.CURSOR.pack_into(self.ring._map, live.SEQUENCE_OFFSET, self.ring.sequence + 1)
+        self.assertEqual(len(self.ring.latest(2)), 2)
+
+        sequences = iter([2, 4, 4, 6, 6, 8])
+        with mock.patch.object(live.RingBuffer, 'sequence', property(lambda ring: next(sequences))), \
+                mock.patch('dashboard.live.fcntl.flock') as flock:
+            self.assertEqual(len(self.ring.since(0, 10)[0]), 2)
+        self.assertEqual(flock.call_count, 2)
+
+    def test_ring_files_are_private(self):
+        path = os.path.join(os.path.dirname(self.path), 'rings', 'D2.ring')
+        ring = live.RingBuffer(path, 4)
+        ring.close()
+        self.assertEqual(os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+    def test_refuses_directories_others_control(self):
+        directory = os.path.dirname(self.path)
+        with mock.patch('dashboard.live.os.geteuid', return_value=os.geteuid() + 1), \
+                self.assertRaises(PermissionError):
+            live.RingBuffer(self.path, 4)
+        os.chmod(directory, 0o777)
+        self.addCleanup(os.chmod, directory, 0o700)
+        with self.assertRaises(PermissionError):
+            live.RingBuffer(self.path, 4)
+
+    def test_planted_links_are_not_followed(self):
+        target = os.path.join(os.path.dirname(self.path), 'target')
+        with open(target, 'wb') as file:
+            file.write(b'keep')
+        link = os.path.join(os.path.dirname(self.path), 'D2.ring')
+        os.symlink(target, link)
+        with self.assertRaises(OSError):
+            live.RingBuffer(link, 4)
+        with open(target, 'rb') as file:
+            self.assertEqual(file.read(), b'keep')
+
+
+class LiveSensorDataTests(TelemetryTestCase):
+    """Live sensor endpoints answered from the rings filled by ingest"""
+
+    def test_concurrent_lookups_map_a_ring_once(self):
+        opened = []
+        ring_buffer = live.RingBuffer
+
+        def slow_ring(path, capacity):
+            time.sleep(0.05)
+            ring = ring_buffer(path, capacity)
+            opened.append(ring)
+            return ring
+        rings = []
+        with mock.patch('dashboard.live.RingBuffer', side_effect=slow_ring):
+            threads = [threading.Thread(target=lambda: rings.append(live.device_ring('D1', create=True)))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(opened), 1)
+        self.assertEqual([ring is opened[0] for ring in rings], [True] * 4)
+
+    def test_latest_ingested_reading_is_served(self):
+        device = make_device('D1')
+        self.client.post('/dashboard/api/telemetry/ingest/', json.dumps(
+            [reading('D1', timestamp=1767322000.0 + index, grip_force=10.0 * index) for index in range(3)]),
+            content_type='application/json')
+        with self.assertNumQueries(0):
+            response = self.client.get('/dashboard/api/sensor-data/', {'device': 'D1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['grip_force'], response.json()['status']), (20.0, 'Normal'))
+        self.assertEqual(live.ring_cursor(device.device_id), 3)
+        self.client.post('/api/control/', json.dumps({'device': 'D1', 'command': 'start'}),
+                         content_type='application/json')
+        self.assertEqual(self.client.get('/api/sensors/', {'device': 'D1'}).json()['grip_force'], 20.0)
+
+    def test_device_without_readings(self):
+        self.assertEqual(self.client.get('/dashboard/api/sensor-data/', {'device': 'D9'}).status_code, 404)
+        self.assertIsNone(live.latest_reading('D9'))
+
+
+class SensorReadingsApiTests(TelemetryTestCase):
+    """Keyset pages of a device's readings"""
+
+    START = datetime.datetime(2026, 1, 5, 10, 0, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        super().setUp()
+        self.device = make_device('D1')
+        # Readings stored before partitioning, two of them sharing a timestamp, plus ingested ones
+        add_readings(self.device, self.START, [None] * 4)
+        add_readings(self.device, self.START + datetime.timedelta(seconds=20), [None])
+        self.client.post('/dashboard/api/telemetry/ingest/', json.dumps(
+            [reading('D1', timestamp=self.START.timestamp() + 30 + index) for index in range(3)]),
+            content_type='application/json')
+        self.url = '/dashboard/api/devices/D1/readings/'
+
+    def test_pages_cover_every_reading_once_newest_first(self):
+        expected = sorted(((row.timestamp, -row.id) for queryset in reading_querysets()
+                           for row in queryset.filter(device=self.device)), reverse=True)
+        self.assertEqual(len(expected), 8)
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3, 'fields': 'grip_force'}
+            if cursor:
+                params['cursor'] = cursor
+            result = self.client.get(self.url, params).json()
+            self.assertLessEqual(result['count'], 3)
+            seen.extend(result['readings'])
+            cursor = result['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual([reading['id'] for reading in seen], [-key[1] for key in expected])
+        self.assertEqual(set(seen[0]), {'id', 'timestamp', 'grip_force'})
+
+    def test_invalid_parameters(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'limit': 'ten'}, {'fields': 'password'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+        self.assertEqual(self.client.get('/dashboard/api/devices/D9/readings/').status_code, 404)
+
+
+class FakeRow:
+    """Stand-in model for the batching writer; bulk_create is a mock"""
+    objects = None
+
+    def __init__(self, value):
+        self.value = value
+
+
+class OtherRow(FakeRow):
+    objects = None
+
+
+class BatchWriterTests(SimpleTestCase):
+    """Group commits of the single writer thread (the database itself is mocked out)"""
+
+    def setUp(self):
+        for model in (FakeRow, OtherRow):
+            patcher = mock.patch.object(model, 'objects')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('dashboard.writer.transaction', atomic=contextlib.nullcontext)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def writer(self, **options):
+        writer = BatchWriter(**options)
+        self.addCleanup(writer.stop)
+        return writer
+
+    def test_writes_within_the_window_share_one_commit(self):
+        writer = self.writer(max_delay=0.5)
+        futures = [writer.submit([FakeRow(1), FakeRow(2)]), writer.submit([OtherRow(3)]),
+                   writer.submit([FakeRow(4)])]
+        self.assertEqual([future.result(5) for future in futures], [2, 1, 1])
+        self.assertEqual((writer.groups, writer.rows), (1, 4))
+        rows, = FakeRow.objects.bulk_create.call_args[0]
+        self.assertEqual([row.value for row in rows], [1, 2, 4])
+        OtherRow.objects.bulk_create.assert_called_once()
+
+    def test_group_closes_at_max_rows(self):
+        writer = self.writer(max_rows=2, max_delay=0.5)
+        futures = [writer.submit([FakeRow(index)]) for index in range(4)]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(writer.groups, 2)
+
+    def test_failed_group_is_retried_write_by_write(self):
+        def bulk_create(rows, batch_size=None):
+            if any(row.value is None for row in rows):
+                raise ValueError('bad row')
+        FakeRow.objects.bulk_create.side_effect = bulk_create
+        writer = self.writer(max_delay=0.5)
+        with self.assertLogs('dashboard.writer', 'ERROR'):
+            good, bad = writer.submit([FakeRow(1)]), writer.submit([FakeRow(None)])
+            self.assertEqual(good.result(5), 1)
+        with self.assertRaises(ValueError):
+            bad.result(5)
+        self.assertEqual(writer.rows, 1)
+
+    @override_settings(DB_PROFILE='performance', DB_WRITER_TIMEOUT=0.05)
+    def test_bulk_insert_falls_back_when_the_writer_is_stalled(self):
+        stalled = BatchWriter()
+        stalled.start = lambda: None
+        with mock.patch('dashboard.writer.get_writer', return_value=stalled), \
+                self.assertLogs('dashboard.writer', 'WARNING'):
+            self.assertEqual(bulk_insert([FakeRow(1), FakeRow(2)]), 2)
+        FakeRow.objects.bulk_create.assert_called_once()
+        # The writer skips the cancelled write if it ever gets to it
+        stalled._commit([stalled._queue.get_nowait()])
+        FakeRow.objects.bulk_create.assert_called_once()
+
+    @override_settings(DB_PROFILE='performance', DB_WRITER_TIMEOUT=0.05)
+    def test_bulk_insert_times_out_on_a_commit_in_progress(self):
+        release = threading.Event()
+        FakeRow.objects.bulk_create.side_effect = lambda rows, batch_size=None: release.wait(5)
+        writer = self.writer(max_delay=0)
+        with mock.patch('dashboard.writer.get_writer', return_value=writer), self.assertRaises(TimeoutError):
+            bulk_insert([FakeRow(1)])
+        release.set()
+        writer.stop()
+        FakeRow.objects.bulk_create.assert_called_once()
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    """Connection pragmas of the DB_PROFILE settings"""
+
+    def connect(self, profile):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': f'{directory.name}/profile.sqlite3'},
+                                  alias='profile')
+        with override_settings(DB_PROFILE=profile):
+            wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper.connection
+
+    def test_performance_profile_pragmas(self):
+        database = self.connect('performance')
+        self.assertEqual(database.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(database.execute('PRAGMA cache_size').fetchone()[0], -64 * 1024)
+        self.assertEqual(database.execute('PRAGMA synchronous').fetchone()[0], 1)
+
+    def test_default_profile_and_unknown_profiles(self):
+        self.assertEqual(self.connect('default').execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+        with override_settings(DB_PROFILE='fastest'), self.assertRaises(ImproperlyConfigured):
+            batch_writer_enabled()
+
+
+class TelemetryExportApiTests(TelemetryTestCase):
+    """Streaming CSV/NDJSON export across the archive and the hot partitions"""
+
+    OLD = datetime.datetime(2025, 1, 5, 10, 0, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        super().setUp()
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings = override_settings(TELEMETRY_ARCHIVE_DIR=archive_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.device = make_device('D1')
+        add_readings(self.device, self.OLD, [None, 'E005', None])
+        RetentionPolicy(retain_days=30).run()
+        add_readings(self.device, timezone.now() - datetime.timedelta(hours=1), [None, None])
+        self.client.post('/dashboard/api/telemetry/ingest/', json.dumps([reading('D1', timestamp=time.time())]),
+                         content_type='application/json')
+        self.url = '/dashboard/api/devices/D1/export/'
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content)
+        return response, zlib.decompress(body, 16 + zlib.MAX_WBITS) if params.get('compress') else body
+
+    def test_ndjson_covers_archive_and_partitions_oldest_first(self):
+        response, body = self.export(fields='grip_force,error_code')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(set(rows[0]), {'id', 'timestamp', 'grip_force', 'error_code'})
+        self.assertEqual([row['error_code'] for row in rows[:3]], [None, 'E005', None])
+        self.assertEqual([row['timestamp'] for row in rows], sorted(row['timestamp'] for row in rows))
+
+    def test_gzipped_csv_resumes_after_a_cursor(self):
+        response, body = self.export(format='csv', compress='gzip', fields='battery_level')
+        self.assertIn('D1-telemetry.csv.gz', response['Content-Disposition'])
+        header, *rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(header, ['id', 'timestamp', 'battery_level'])
+        self.assertEqual(len(rows), 6)
+
+        _, rest = self.export(format='csv', fields='battery_level', cursor=f'{rows[2][1]},{rows[2][0]}')
+        # A resumed CSV has no header, so the parts concatenate
+        self.assertEqual(list(csv.reader(io.StringIO(rest.decode()))), rows[3:])
+
+    def test_invalid_parameters(self):
+        for params in ({'format': 'xml'}, {'fields': 'secret'}, {'cursor': 'yesterday'}, {'start': 'soon'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_non_finite_times_are_rejected(self):
+        for params in ({'start': 'nan'}, {'end': 'NaN'}, {'start': '-inf'}, {'end': 'inf'}, {'end': 'Infinity'}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('not finite', response.json()['message'])
+        with tempfile.TemporaryDirectory() as directory, self.assertRaisesMessage(CommandError, 'not finite'):
+            call_command('export_telemetry', 'D1', '--output', os.path.join(directory, 'out.csv'), '--start', 'nan')
+
+
+def channel_columns(count, **overrides):
+    """Steady ANOMALY_CHANNELS columns of count readings with a little noise"""
+    rng = np.random.default_rng(3)
+    columns = {
+        'temperature': 33.0 + rng.normal(0, 0.1, count),
+        'grip_force': 40.0 + rng.normal(0, 1.0, count),
+        'emg_signal': 250.0 + rng.normal(0, 5.0, count),
+        'battery_level': np.full(count, 80.0),
+    }
+    columns.update(overrides)
+    return columns
+
+
+class AnomalyDetectorTests(SimpleTestCase):
+    """EWMA z-score and limit detection over ingested batches"""
+
+    def detector(self, **options):
+        options = {'alpha': 0.05, 'z_threshold': 6.0, 'warmup': 50, 'cooldown': 60.0, **options}
+        return AnomalyDetector(**options)
+
+    def observe(self, detector, columns, device_pk=1, start=0.0):
+        count = len(columns['temperature'])
+        return detector.observe(np.full(count, device_pk), start + np.arange(count, dtype=np.float64), columns)
+
+    def test_state_matches_the_reading_by_reading_recurrence(self):
+        detector = self.detector()
+        columns = channel_columns(500)
+        # Split batches fold into the same state as one pass
+        self.observe(detector, {name: values[:123] for name, values in columns.items()})
+        self.observe(detector, {name: values[123:] for name, values in columns.items()}, start=123)
+
+        values = columns['grip_force']
+        mean, var = values[0], 0.0
+        for value in values:
+            deviation = value - mean
+            mean += 0.05 * deviation
+            var = 0.95 * (var + 0.05 * deviation ** 2)
+        column = ANOMALY_CHANNELS.index('grip_force')
+        self.assertAlmostEqual(detector.mean[0, column], mean)
+        self.assertAlmostEqual(detector.var[0, column], var)
+        self.assertEqual(detector.count[0], 500)
+
+    def test_spike_alerts_once_per_batch_and_cools_down(self):
+        detector = self.detector()
+        with mock.patch('dashboard.anomaly.now_epoch', return_value=1000.0):
+            self.assertEqual(self.observe(detector, channel_columns(200)), [])
+            spiked = channel_columns(10)
+            spiked['grip_force'][3] = 95.0
+            alert, = self.observe(detector, spiked, start=200)
+            self.assertEqual((alert['channel'], alert['kind'], alert['count']), ('grip_force', 'zscore', 1))
+            self.assertEqual((alert['value'], alert['timestamp']), (95.0, 203.0))
+            self.assertEqual(self.observe(detector, spiked, start=210), [])
+        with mock.patch('dashboard.anomaly.now_epoch', return_value=1061.0):
+            spiked['grip_force'][3] = 400.0
+            self.assertEqual(len(self.observe(detector, spiked, start=220)), 1)
+
+    def test_warmup_and_limits(self):
+        detector = self.detector(limits={'battery_level': (15, None)})
+        spiked = channel_columns(20)
+        spiked['grip_force'][10] = 95.0
+        spiked['battery_level'][12:] = 10.0
+        alert, = self.observe(detector, spiked)
+        self.assertEqual((alert['channel'], alert['kind'], alert['count']), ('battery_level', 'limit', 8))
+        # Other devices have their own state
+        self.assertEqual(len(self.observe(detector, spiked, device_pk=2)), 1)
+
+
+class AnomalyNotificationTests(TestCase):
+    """Notifications raised for anomaly alerts"""
+
+    def test_notifications_for_the_device_patient(self):
+        device = make_device('D1')
+        alerts = [
+            {'device': device.pk, 'channel': 'battery_level', 'kind': 'limit', 'value': 9.0, 'expected': 80.0,
+             'z': 0.0, 'timestamp': 0.0, 'count': 3},
+            {'device': device.pk, 'channel': 'temperature', 'kind': 'zscore', 'value': 41.0, 'expected': 33.0,
+             'z': 8.0, 'timestamp': 0.0, 'count': 1},
+            {'device': device.pk + 1, 'channel': 'temperature', 'kind': 'limit', 'value': 50.0, 'expected': 33.0,
+             'z': 0.0, 'timestamp': 0.0, 'count': 1},
+        ]
+        with self.assertNumQueries(1):
+            notifications = alert_notifications(alerts)
+        self.assertEqual([device_id for device_id, _ in notifications], ['D1', 'D1'])
+        battery, temperature = (notification for _, notification in notifications)
+        self.assertEqual((battery.notification_type, battery.user_id), ('battery_low', device.patient.user_id))
+        self.assertEqual(temperature.title, 'Temperature anomaly on D1')
+        self.assertIn('8.0 standard deviations', temperature.message)
+
+
+class DDSketchTests(SimpleTestCase):
+    """Mergeable quantile sketch"""
+
+    def setUp(self):
+        self.values = np.random.default_rng(4).lognormal(3, 1, 20000)
+
+    def test_quantiles_within_relative_accuracy(self):
+        sketch = DDSketch(0.01)
+        sketch.add(self.values)
+        for q, value in zip((0.5, 0.9, 0.99), sketch.quantiles([0.5, 0.9, 0.99])):
+            exact = np.quantile(self.values, q, method='lower')
+            self.assertLessEqual(abs(value - exact), 0.01 * exact * 1.01)
+        self.assertEqual((sketch.count, sketch.min, sketch.max), (20000, self.values.min(), self.values.max()))
+
+    def test_merge_and_serialization_are_exact(self):
+        whole, first, second = DDSketch(), DDSketch(), DDSketch()
+        whole.add(self.values)
+        first.add(self.values[:7000])
+        second.add(self.values[7000:])
+        first = DDSketch.from_bytes(first.to_bytes())
+        first.merge(second)
+        np.testing.assert_array_equal(first.counts, whole.counts)
+        self.assertEqual(first.quantiles([0.5, 0.99]), whole.quantiles([0.5, 0.99]))
+        self.assertAlmostEqual(first.mean, whole.mean)
+        with self.assertRaises(ValueError):
+            first.merge(DDSketch(0.05))
+
+    def test_zeros_negatives_and_empty_sketches(self):
+        sketch = DDSketch()
+        self.assertEqual(sketch.quantiles([0.5]), [None])
+        sketch.add([0.0, 0.0, -5.0, float('nan'), 10.0])
+        self.assertEqual((sketch.count, sketch.quantile(0.5)), (3, 0.0))
+        self.assertAlmostEqual(sketch.quantile(1.0), 10.0)
+        self.assertEqual(merge_all([None, b'']).count, 0)
+
+
+class LatencyRecorderTests(TestCase):
+    """Response-time sketches stored in DeviceAnalytics"""
+
+    DAY = 20458  # 2026-01-05
+
+    def setUp(self):
+        self.device = make_device('D1')
+        self.other = make_device('D2')
+
+    def record(self, recorder, device, values, day=DAY):
+        values = np.asarray(values, dtype=np.float64)
+        recorder.record(np.full(len(values), device.pk), np.full(len(values), day * 86400.0 + 60), values)
+
+    def test_flushes_merge_into_the_daily_rows(self):
+        recorder = LatencyRecorder(flush_interval=3600)
+        self.record(recorder, self.device, [10.0, 20.0, float('nan')])
+        self.record(recorder, self.device, [30.0], day=self.DAY + 1)
+        self.assertEqual(recorder.flush(), 2)
+        self.record(recorder, self.device, [40.0])
+        self.assertEqual(recorder.flush(), 1)
+
+        row = DeviceAnalytics.objects.get(device=self.device, date=datetime.date(2026, 1, 5))
+        sketch = DDSketch.from_bytes(row.response_time_sketch)
+        self.assertEqual((sketch.count, row.response_time_ms), (3, 23.33))
+        self.assertEqual(recorder.flush(), 0)
+
+    def test_failed_flush_keeps_the_sketches(self):
+        recorder = LatencyRecorder(flush_interval=3600)
+        self.record(recorder, self.device, [10.0])
+        with mock.patch('dashboard.latency.store_sketches', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('dashboard.latency', 'WARNING'):
+            self.assertEqual(recorder.flush(), 0)
+        self.record(recorder, self.device, [20.0])
+        self.assertEqual(recorder.flush(), 1)
+        self.assertEqual(DeviceAnalytics.objects.get(device=self.device).response_time_ms, 15.0)
+
+    def test_response_time_api_merges_devices_and_days(self):
+        today = int(time.time() // 86400)
+        recorder = LatencyRecorder(flush_interval=3600)
+        self.record(recorder, self.device, [10.0] * 96 + [500.0] * 4, day=today)
+        self.record(recorder, self.device, [10.0] * 100, day=today - 1)
+        self.record(recorder, self.other, [100.0] * 100, day=today)
+        recorder.flush()
+
+        result = self.client.get('/dashboard/api/analytics/response-time/', {'device': 'D1'}).json()
+        self.assertEqual(result['response_time']['count'], 200)
+        self.assertAlmostEqual(result['response_time']['p99_ms'], 500.0, delta=5.0)
+        result = self.client.get('/dashboard/api/analytics/response-time/').json()
+        self.assertEqual((result['devices'], result['response_time']['count']), ('all', 300))
+        self.assertEqual(self.client.get('/dashboard/api/analytics/response-time/', {'span': 'week'}).status_code, 400)
+
+
+class PartitionRouterTests(TransactionTestCase):
+    """Monthly reading partitions: creation ahead of time, routing and pruning"""
+
+    MONTH = datetime.datetime(2031, 1, 15, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        self.router = PartitionRouter(ttl=0)
+        self.addCleanup(self.drop_future_partitions)
+        self.device = make_device('D1')
+
+    def drop_future_partitions(self):
+        for partition in self.router.partitions(refresh=True):
+            if partition.month >= self.MONTH.date().replace(day=1):
+                self.router.drop(partition)
+        get_router().partitions(refresh=True)
+
+    def test_ensure_creates_missing_months_with_seeded_ids(self):
+        created = self.router.ensure(2, now=self.MONTH)
+        self.assertEqual([partition.table_name for partition in created], [
+            'dashboard_sensorreading_y2031m01', 'dashboard_sensorreading_y2031m02',
+            'dashboard_sensorreading_y2031m03'])
+        self.assertEqual(self.router.ensure(2, now=self.MONTH), [])
+
+        model = self.router.current_model(now=self.MONTH)
+        self.assertEqual(model._meta.db_table, 'dashboard_sensorreading_y2031m01')
+        add_readings(self.device, self.MONTH, [None, None], model=model)
+        self.assertEqual(sorted(model.objects.values_list('id', flat=True)),
+                         [created[0].first_id, created[0].first_id + 1])
+
+    def test_missing_partition_is_not_created_on_demand(self):
+        with self.assertRaises(PartitionMissing):
+            self.router.current_model(now=self.MONTH)
+        self.assertFalse(ReadingPartition.objects.filter(month=self.MONTH.date().replace(day=1)).exists())
+
+    def test_command_creates_the_current_months(self):
+        output = io.StringIO()
+        call_command('create_partitions', '--months-ahead', '0', stdout=output)
+        self.assertEqual(json.loads(output.getvalue()), {'created': []})
+        with self.assertRaises(CommandError):
+            call_command('create_partitions', '--months-ahead', '-1')
+
+    def test_sealed_partitions_are_pruned_by_their_zone_map(self):
+        partition, = self.router.ensure(0, now=self.MONTH)
+        model = partition_model(partition.table_name)
+        self.assertIn(model, self.router.models_for_range())
+        ReadingPartition.objects.filter(pk=partition.pk).update(
+            sealed_at=self.MONTH, min_timestamp=self.MONTH, max_timestamp=self.MONTH + datetime.timedelta(days=5))
+        inside = self.router.models_for_range(self.MONTH, self.MONTH + datetime.timedelta(days=1))
+        after = self.router.models_for_range(self.MONTH + datetime.timedelta(days=6))
+        self.assertIn(model, inside)
+        self.assertNotIn(model, after)
+        self.assertIs(after[-1], SensorReading)
+
+
+class PartitionIngestTests(TelemetryTestCase):
+    """Ingest when the month's partition is missing"""
+
+    def test_ingest_is_refused_until_the_partition_exists(self):
+        make_device('D1')
+        with mock.patch.object(PartitionRouter, 'current_model',
+                               side_effect=PartitionMissing('No readings partition')), \
+                self.assertLogs('dashboard.telemetry_views', 'ERROR'):
+            response = self.client.post('/dashboard/api/telemetry/ingest/', json.dumps([reading('D1')]),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(stored_readings(BionicDevice.objects.get(device_id='D1')), 0)
+
+
+def ring_readings(count, start=1767322000.0):
+    """count simulated readings one second apart, for publishing to a live ring"""
+    readings = SensorDataSimulator().generate_batch(1, count, sample_rate=1.0, start_time=start,
+                                                    rng=np.random.default_rng(7))
+    readings['error_code'] = b''
+    return readings
+
+
+class ServerSentEventsTests(SimpleTestCase):
+    """SSE message framing and resume cursors"""
+
+    def test_event_fields(self):
+        self.assertEqual(sse_event({'a': [1, 2]}, event='telemetry', event_id=7),
+                         'id: 7\nevent: telemetry\ndata: {"a":[1,2]}\n\n')
+        self.assertEqual(sse_event({'lost': 3}), 'data: {"lost":3}\n\n')
+
+    def test_last_event_id(self):
+        factory = RequestFactory()
+        self.assertEqual(parse_last_event_id(factory.get('/', HTTP_LAST_EVENT_ID='42')), 42)
+        self.assertEqual(parse_last_event_id(factory.get('/', {'last_event_id': '-5'})), 0)
+        self.assertIsNone(parse_last_event_id(factory.get('/', HTTP_LAST_EVENT_ID='abc')))
+        self.assertIsNone(parse_last_event_id(factory.get('/')))
+
+
+@override_settings(SSE_POLL_INTERVAL=0.01, SSE_KEEPALIVE=0.2)
+class TelemetryHubTests(TelemetryTestCase):
+    """Device feeds shared by live streams"""
+
+    async def test_resumed_subscriber_catches_up_then_follows_the_feed(self):
+        live.publish(['D1'] * 5, ring_readings(5))
+        hub = get_hub()
+        stream = hub.subscribe('D1', 2)
+        batch = await anext(stream)
+        self.assertEqual((batch.cursor, batch.lost, len(batch.rows())), (5, 0, 3))
+        self.assertEqual(len(hub.feeds['D1'].subscribers), 1)
+
+        live.publish(['D1'] * 2, ring_readings(2, start=1767322100.0))
+        batch = await asyncio.wait_for(anext(stream), 5)
+        self.assertEqual(batch.cursor, 7)
+        self.assertEqual([record['timestamp'] for record in batch.records()],
+                         timestamps_to_iso([1767322100.0, 1767322101.0]))
+        self.assertIsNone(await asyncio.wait_for(anext(stream), 5))
+        await stream.aclose()
+        self.assertEqual(hub.feeds, {})
+
+    async def test_failed_producer_ends_streams_with_feed_error(self):
+        async def failing_ring(device_id, cursor):
+            raise OSError('ring unreadable')
+            yield
+
+        hub = get_hub()
+        with mock.patch('dashboard.hub.follow_ring', failing_ring), self.assertLogs('dashboard.hub', 'ERROR'):
+            with self.assertRaises(FeedError) as raised:
+                await asyncio.wait_for(anext(hub.subscribe('D1')), 5)
+        self.assertIsInstance(raised.exception.__cause__, OSError)
+
+        # The next subscriber starts a new producer
+        stream = hub.subscribe('D1')
+        self.assertIsNone(await asyncio.wait_for(anext(stream), 5))
+        live.publish(['D1'], ring_readings(1))
+        batch = await asyncio.wait_for(anext(stream), 5)
+        self.assertEqual(batch.cursor, 1)
+        await stream.aclose()
+
+    def test_slow_subscriber_loses_the_oldest_frames(self):
+        subscriber = Subscriber(0, max_frames=2)
+        readings = ring_readings(6)
+        for start in range(0, 6, 2):
+            subscriber.put(Frame('D1', start, start + 2, readings[start:start + 2]))
+        batch = subscriber.take()
+        self.assertEqual((batch.cursor, batch.lost, len(batch.rows())), (6, 2, 4))
+        self.assertEqual((subscriber.dropped, subscriber.lost), (1, 2))
+        self.assertIsNone(subscriber.take())
+
+
+@override_settings(SSE_POLL_INTERVAL=0.01, SSE_KEEPALIVE=0.2, SSE_RETRY_MS=500)
+class SensorStreamApiTests(TelemetryTestCase):
+    """The SSE and polling endpoints of a device's live readings"""
+
+    def setUp(self):
+        super().setUp()
+        make_device('D1')
+        live.publish(['D1'] * 3, ring_readings(3))
+
+    async def test_stream_resumes_from_last_event_id(self):
+        response = await self.async_client.get('/dashboard/api/devices/D1/stream/', headers={'Last-Event-ID': '1'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 500\n\n')
+        event = (await asyncio.wait_for(anext(chunks), 5)).decode()
+        self.assertTrue(event.startswith('id: 3\nevent: telemetry\ndata: '))
+        records = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual([record['device_id'] for record in records], ['D1', 'D1'])
+        self.assertEqual(await asyncio.wait_for(anext(chunks), 5), b': keep-alive\n\n')
+        await chunks.aclose()
+
+    async def test_unknown_device(self):
+        response = await self.async_client.get('/dashboard/api/devices/D9/stream/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_polling_from_a_cursor(self):
+        result = self.client.get('/dashboard/api/devices/D1/live/', {'cursor': 0, 'limit': 2}).json()
+        self.assertEqual((result['cursor'], result['lost'], len(result['readings'])), (2, 0, 2))
+        result = self.client.get('/dashboard/api/devices/D1/live/').json()
+        self.assertEqual((result['cursor'], len(result['readings'])), (3, 1))
+        self.assertEqual(self.client.get('/dashboard/api/devices/D1/live/', {'cursor': 'x'}).status_code, 400)
+
+
+class SocketClient:
+    """Drives websocket_application through in-memory ASGI receive/send queues"""
+
+    def __init__(self, device_id, query=''):
+        self.scope = {'type': 'websocket', 'path': f'/ws/devices/{device_id}/', 'query_string': query.encode()}
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.task = None
+
+    async def connect(self):
+        await self.incoming.put({'type': 'websocket.connect'})
+        self.task = asyncio.ensure_future(websocket_application(self.scope, self.incoming.get, self.outgoing.put))
+        return await self.receive()
+
+    async def receive(self):
+        return await asyncio.wait_for(self.outgoing.get(), 5)
+
+    async def receive_json(self, message_type):
+        """Next text message of message_type, skipping the others"""
+        while True:
+            event = await self.receive()
+            if 'text' in event:
+                message = json.loads(event['text'])
+                if message['type'] == message_type:
+                    return message
+
+    async def send_json(self, message):
+        await self.incoming.put({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def close(self):
+        await self.incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, 5)
+
+
+@override_settings(SSE_POLL_INTERVAL=0.01, SSE_KEEPALIVE=0.2)
+class DeviceWebSocketTests(TelemetryTestCase):
+    """Control and telemetry over a device's WebSocket"""
+
+    def setUp(self):
+        super().setUp()
+        make_device('D1')
+
+    async def test_unknown_device_is_refused(self):
+        self.assertEqual(await SocketClient('D9').connect(), {'type': 'websocket.close', 'code': 4404})
+
+    async def test_commands_are_acked_and_broadcast(self):
+        socket, other = SocketClient('D1'), SocketClient('D1')
+        self.assertEqual(await socket.connect(), {'type': 'websocket.accept'})
+        self.assertEqual((await socket.receive_json('state'))['device_state']['version'], 0)
+        await other.connect()
+        await other.receive_json('state')
+
+        await socket.send_json({'type': 'command', 'id': 'c1', 'command': 'start', 'version': 0})
+        ack = await socket.receive_json('ack')
+        self.assertEqual((ack['id'], ack['success'], ack['device_state']['is_running']), ('c1', True, True))
+        self.assertEqual((await sync_to_async(DeviceCommand.objects.get)(pk=ack['queued'])).command, 'start')
+        self.assertTrue((await other.receive_json('state'))['device_state']['is_running'])
+
+        await socket.send_json({'type': 'command', 'id': 'c2', 'command': 'stop', 'version': 0})
+        ack = await socket.receive_json('ack')
+        self.assertEqual((ack['success'], ack['queued']), (False, None))
+        await socket.send_json({'type': 'command', 'id': 'c3', 'command': 'jump'})
+        self.assertEqual(await socket.receive_json('error'),
+                         {'type': 'error', 'id': 'c3', 'message': 'Unknown command'})
+        await socket.send_json({'type': 'ping', 'id': 9})
+        self.assertEqual(await socket.receive_json('pong'), {'type': 'pong', 'id': 9})
+        await socket.incoming.put({'type': 'websocket.receive', 'text': '{'})
+        self.assertEqual((await socket.receive_json('error'))['message'], 'Invalid JSON data')
+        await socket.close()
+        await other.close()
+
+    async def test_devices_with_similar_ids_have_their_own_group(self):
+        self.assertNotEqual(device_group('hand 1'), device_group('hand_1'))
+        self.assertNotEqual(device_group('x' * 90 + 'a'), device_group('x' * 90 + 'b'))
+        self.assertRegex(device_group('hand/1 ü' * 20), r'^[\w.-]{1,99}$')
+
+        await sync_to_async(make_device)('hand_1')
+        socket = SocketClient('hand_1')
+        await socket.connect()
+        await socket.receive_json('state')
+        await sync_to_async(broadcast_state)('hand 1', {'version': 7})
+        await sync_to_async(broadcast_state)('hand_1', {'version': 8})
+        self.assertEqual((await socket.receive_json('state'))['device_state'], {'version': 8})
+        await socket.close()
+
+    async def test_telemetry_resumes_from_last_event_id(self):
+        live.publish(['D1'] * 3, ring_readings(3))
+        socket = SocketClient('D1', 'last_event_id=1')
+        await socket.connect()
+        message = await socket.receive_json('telemetry')
+        self.assertEqual((message['id'], len(message['readings'])), (3, 2))
+        live.publish(['D1'], ring_readings(1, start=1767322100.0))
+        message = await socket.receive_json('telemetry')
+        self.assertEqual(message['id'], 4)
+        await socket.close()
+
+    async def test_binary_telemetry_frames(self):
+        readings = ring_readings(3)
+        live.publish(['D1'] * 3, readings)
+        socket = SocketClient('D1', 'format=binary&last_event_id=0')
+        await socket.connect()
+        header = await socket.receive_json('fields')
+        event = await socket.receive()
+        while 'bytes' not in event:
+            event = await socket.receive()
+        self.assertEqual(struct.unpack_from('<Q', event['bytes'])[0], 3)
+        decoded = decode_binary([event['bytes'][8:]], header['fields'], header['decimals'])
+        self.assertEqual([reading['timestamp'] for reading in decoded], readings['timestamp'].tolist())
+        await socket.close()
+
+
+@override_settings(SSE_POLL_INTERVAL=0.01, SSE_KEEPALIVE=0.2)
+class TelemetryFanOutTests(TelemetryTestCase):
+    """One producer per device shared by its subscribers"""
+
+    async def test_subscribers_share_the_feed_and_its_frames(self):
+        hub = TelemetryHub(max_frames=2)
+        first, second = hub.subscribe('D1'), hub.subscribe('D1')
+        self.assertIsNone(await asyncio.wait_for(anext(first), 5))
+        self.assertIsNone(await asyncio.wait_for(anext(second), 5))
+        feed = hub.feeds['D1']
+        self.assertEqual(len(feed.subscribers), 2)
+
+        live.publish(['D1'] * 2, ring_readings(2))
+        batches = [await asyncio.wait_for(anext(stream), 5) for stream in (first, second)]
+        (frame, _), = batches[0].parts
+        self.assertIs(batches[1].parts[0][0], frame)
+        self.assertIs(batches[0].records()[0], batches[1].records()[0])
+        self.assertEqual(feed.frames, 1)
+
+        stats = hub.stats()['D1']
+        self.assertEqual((stats['head'], [subscriber['lag'] for subscriber in stats['subscribers']]), (2, [0, 0]))
+        await first.aclose()
+        self.assertIs(hub.feeds['D1'], feed)
+        await second.aclose()
+        self.assertEqual(hub.feeds, {})
+        with self.assertRaises(asyncio.CancelledError):
+            await feed.task
+
+    async def test_hub_stats_endpoint(self):
+        result = (await self.async_client.get('/dashboard/api/live/hub/')).json()
+        self.assertEqual(result, {'status': 'success', 'devices': {}})
+
+
+class CompactFrameTests(SimpleTestCase):
+    """Delta-encoded compact frames and their decoders"""
+
+    def setUp(self):
+        self.readings = ring_readings(8)
+        self.readings['accel_x'][:3] = np.nan
+        self.readings['accel_x'][6] = np.nan
+        self.readings['error_code'][2:4] = b'E' * 20
+        self.readings['error_code'][5] = b'E003'
+        self.readings[7] = self.readings[6]
+        self.readings['timestamp'][7] += 0.5
+
+    def assertDecoded(self, decoded, readings):
+        self.assertEqual(len(decoded), len(readings))
+        for values, expected in zip(decoded, readings):
+            self.assertAlmostEqual(values['timestamp'], round(float(expected['timestamp']), 3))
+            code = expected['error_code'].decode() or None
+            self.assertEqual(values['error_code'], code)
+            for field, decimals in zip(COMPACT_FIELDS, COMPACT_DECIMALS):
+                if field == 'error_code':
+                    continue
+                value = float(expected[field])
+                if value != value:
+                    self.assertIsNone(values[field], field)
+                else:
+                    self.assertAlmostEqual(values[field], value, delta=0.51 * 10 ** -decimals, msg=field)
+
+    def test_json_frames_round_trip(self):
+        encoder = CompactEncoder()
+        frames = [encoder.encode(self.readings[:4]), encoder.encode(self.readings[4:])]
+        self.assertEqual(frames[0]['fields'], list(COMPACT_FIELDS))
+        self.assertEqual(frames[0]['codes'], ['E' * 20])
+        self.assertNotIn('fields', frames[1])
+        self.assertEqual(frames[1]['codes'], ['E003'])
+        # A repeated reading only carries its time step
+        self.assertEqual(frames[1]['rows'][-1], [500, 0])
+        self.assertDecoded(decode(frames), self.readings)
+
+    def test_binary_frames_round_trip(self):
+        encoder = CompactEncoder()
+        bodies = [encoder.encode_binary(self.readings[:4]), encoder.encode_binary(self.readings[4:])]
+        self.assertEqual(bodies[0][:4], COMPACT_MAGIC)
+        self.assertDecoded(decode_binary(bodies), self.readings)
+        self.assertEqual(decode_binary([CompactEncoder().encode_binary(self.readings[:0])]), [])
+
+    def test_malformed_binary_frames(self):
+        body = CompactEncoder().encode_binary(self.readings)
+        bad_bodies = {
+            'short': body[:5],
+            'magic': b'XXXX' + body[4:],
+            'version': body[:4] + b'\x01' + body[5:],
+            'truncated': body[:-1],
+            'trailing': body + b'\x00',
+        }
+        for name, bad in bad_bodies.items():
+            with self.subTest(name), self.assertRaises(CompactError):
+                decode_binary([bad])
+        with self.assertRaises(CompactError):
+            decode_binary([body], COMPACT_FIELDS[:-1], COMPACT_DECIMALS[:-1])
+
+
+class CompactLiveApiTests(TelemetryTestCase):
+    """Compact and binary formats of the live polling endpoint"""
+
+    def setUp(self):
+        super().setUp()
+        self.readings = ring_readings(3)
+        self.readings['error_code'][1] = b'E042'
+        live.publish(['D1'] * 3, self.readings)
+        self.url = '/dashboard/api/devices/D1/live/'
+
+    def test_compact_frame_without_header(self):
+        result = self.client.get(self.url, {'cursor': 0, 'format': 'compact', 'header': '0'}).json()
+        self.assertEqual(set(result['frame']), {'rows', 'codes'})
+        self.assertEqual(result['frame']['codes'], ['E042'])
+        frame = dict(result['frame'], **CompactEncoder.header())
+        self.assertEqual([reading['error_code'] for reading in decode([frame])], [None, 'E042', None])
+
+    def test_binary_frame(self):
+        response = self.client.get(self.url, {'cursor': 1, 'format': 'binary'})
+        self.assertEqual(response['Content-Type'], COMPACT_CONTENT_TYPE)
+        self.assertEqual((response['X-Ring-Cursor'], response['X-Readings-Lost']), ('3', '0'))
+        decoded = decode_binary([response.content])
+        self.assertEqual([reading['timestamp'] for reading in decoded], self.readings['timestamp'][1:].tolist())
+
+
+NOTIFICATION_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'notifications': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'notification-tests'},
+}
+
+
+@override_settings(CACHES=NOTIFICATION_CACHES)
+class NotificationPollTests(TestCase):
+    """Notification polls with since cursors and ETags"""
+
+    url = '/dashboard/api/notifications/check/'
+
+    def setUp(self):
+        caches['notifications'].clear()
+        self.user = User.objects.create(username='patient')
+        self.client.force_login(self.user)
+
+    def notify(self, title, notification_type='report', **fields):
+        return Notification.objects.create(user=self.user, notification_type=notification_type, title=title,
+                                           message='-', **fields)
+
+    def test_anonymous_poll_is_empty(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.json(), [])
+        self.assertNotIn('ETag', response)
+
+    def test_since_cursor_returns_only_newer_notifications(self):
+        first = self.notify('First', notification_type='battery_low')
+        response = self.client.get(self.url)
+        item, = response.json()
+        self.assertEqual((item['id'], item['type'], item['priority']), (first.pk, 'warning', 'high'))
+        self.assertEqual(response['X-Unread-Count'], '1')
+        cursor = response['X-Notifications-Cursor']
+
+        self.notify('Second')
+        response = self.client.get(self.url, {'since': cursor})
+        self.assertEqual([item['title'] for item in response.json()], ['Second'])
+        self.assertEqual(response['X-Unread-Count'], '2')
+        newer = response['X-Notifications-Cursor']
+        self.assertNotEqual(newer, cursor)
+
+        # Nothing new: the cursor stays
+        response = self.client.get(self.url, {'since': newer})
+        self.assertEqual((response.json(), response['X-Notifications-Cursor']), ([], newer))
+
+    def test_matching_etag_is_answered_from_the_cache(self):
+        self.notify('First')
+        etag = self.client.get(self.url)['ETag']
+        with mock.patch('dashboard.notification_views.notifications_since') as since:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        since.assert_not_called()
+
+        # A write changes the state token, and with it the ETag
+        self.notify('Second')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # The ETag covers the cursor too
+        self.assertNotEqual(self.client.get(self.url, {'since': '1.1'})['ETag'], response['ETag'])
+
+    def test_unread_count_follows_writes(self):
+        first, second = self.notify('First'), self.notify('Second')
+        self.assertEqual(self.client.get(self.url)['X-Unread-Count'], '2')
+        self.notify('Read', is_read=True)
+        self.assertEqual(self.client.get(self.url)['X-Unread-Count'], '2')
+        first.is_read = True
+        first.save()
+        self.assertEqual(self.client.get(self.url)['X-Unread-Count'], '1')
+        second.delete()
+        self.assertEqual(self.client.get(self.url)['X-Unread-Count'], '0')
+        notifications_created([Notification(user=self.user, notification_type='error', title='Bulk', message='-')])
+        self.assertEqual(unread_count(self.user.pk), 1)
+
+    def test_cursor_breaks_created_at_ties_by_id(self):
+        rows = [self.notify(title) for title in 'ABC']
+        created_at = rows[0].created_at
+        Notification.objects.filter(pk__in=[row.pk for row in rows]).update(created_at=created_at)
+        notifications, cursor = notifications_since(self.user.pk, (created_at, rows[0].pk))
+        self.assertEqual([notification.title for notification in notifications], ['B', 'C'])
+        self.assertEqual(cursor, encode_cursor(created_at, rows[2].pk))
+        self.assertEqual(parse_cursor(cursor), (created_at, rows[2].pk))
+        # Without a cursor: the newest ones, oldest first
+        notifications, _ = notifications_since(self.user.pk, None, limit=2)
+        self.assertEqual([notification.title for notification in notifications], ['B', 'C'])
+
+    def test_malformed_cursors_start_from_the_newest(self):
+        for value in (None, '', 'abc', '1.x', '1.2.3', '9' * 30 + '.1'):
+            with self.subTest(value):
+                self.assertIsNone(parse_cursor(value))
+        self.notify('First')
+        self.assertEqual([item['title'] for item in self.client.get(self.url, {'since': 'abc'}).json()], ['First'])
+
+    def test_cache_lives_in_the_project(self):
+        if 'NOTIFICATIONS_CACHE_DIR' in os.environ:
+            self.skipTest('NOTIFICATIONS_CACHE_DIR is set')
+        location = project_settings.CACHES['notifications']['LOCATION']
+        self.assertTrue(location.startswith(str(project_settings.BASE_DIR)))
+        self.assertFalse(location.startswith(tempfile.gettempdir()))
+
+
+GRIP_RULE = AlertRule('grip', 'grip_force', '>', 95.0, duration=1.0, cooldown=300.0, title='Grip overload')
+
+
+class RuleSetTests(SimpleTestCase):
+    """Rules compiled into column arrays"""
+
+    def test_comparators(self):
+        ruleset = RuleSet([AlertRule(comparator, 'x', comparator, 5.0) for comparator in COMPARATORS])
+        matched = ruleset.match(ruleset.values({'x': np.array([4.0, 5.0, 6.0])}, 3))
+        expected = {
+            '<': [True, False, False], '<=': [True, True, False], '>': [False, False, True],
+            '>=': [False, True, True], '==': [False, True, False], '!=': [True, False, True],
+        }
+        for column, comparator in enumerate(COMPARATORS):
+            with self.subTest(comparator):
+                self.assertEqual(matched[:, column].tolist(), expected[comparator])
+
+    def test_missing_channels_and_nan_never_match(self):
+        ruleset = RuleSet([AlertRule('low', 'battery_level', '<', 20.0), AlertRule('hot', 'temperature', '!=', 0.0)])
+        values = ruleset.values({'battery_level': np.array([np.nan, 10.0])}, 2)
+        self.assertEqual(ruleset.match(values).tolist(), [[False, False], [True, False]])
+
+    def test_unknown_comparator(self):
+        with self.assertRaises(ValueError):
+            RuleSet([AlertRule('bad', 'x', '=>', 1.0)])
+
+    @override_settings(ALERT_RULES=[{'name': 'low', 'channel': 'battery_level', 'comparator': '<', 'threshold': 30},
+                                    GRIP_RULE])
+    def test_rules_from_settings(self):
+        self.assertEqual(rules_from_settings(), [AlertRule('low', 'battery_level', '<', 30), GRIP_RULE])
+
+    def test_snapshot_alerts(self):
+        ruleset = RuleSet(DEFAULT_ALERT_RULES)
+        alert, = snapshot_alerts({'battery_level': 85.0, 'cpu_usage': 92.0}, ruleset)
+        self.assertEqual((alert['rule'].name, alert['value']), ('high_cpu', 92.0))
+        self.assertEqual(describe(alert['rule'], alert['value']), 'Cpu usage is 92 (> 80)')
+
+
+@mock.patch('dashboard.alert_rules.now_epoch', return_value=1000.0)
+class RuleEngineTests(SimpleTestCase):
+    """Stateful rule evaluation over ingest batches"""
+
+    def observe(self, engine, pks, timestamps, grip_forces):
+        return engine.observe(np.array(pks), np.array(timestamps, dtype=np.float64),
+                              {'grip_force': np.array(grip_forces, dtype=np.float64)})
+
+    def test_duration_spans_batches(self, now):
+        engine = RuleEngine([GRIP_RULE])
+        self.assertEqual(self.observe(engine, [1, 1], [10.0, 10.5], [99.0, 99.0]), [])
+        alert, = self.observe(engine, [1, 1], [11.0, 11.5], [99.0, 98.0])
+        self.assertEqual((alert['device'], alert['since'], alert['timestamp']), (1, 10.0, 11.0))
+        self.assertEqual((alert['value'], alert['count']), (99.0, 2))
+
+    def test_broken_run_starts_again(self, now):
+        engine = RuleEngine([GRIP_RULE])
+        self.assertEqual(self.observe(engine, [1, 1, 1], [10.0, 10.8, 11.2], [99.0, 50.0, 99.0]), [])
+        self.assertEqual(self.observe(engine, [1], [12.0], [10.0]), [])
+        self.assertEqual(self.observe(engine, [1], [12.9], [99.0]), [])
+        self.assertEqual(len(self.observe(engine, [1], [13.9], [99.0])), 1)
+
+    def test_cooldown(self, now):
+        engine = RuleEngine([GRIP_RULE._replace(duration=0.0)])
+        self.assertEqual(len(self.observe(engine, [1], [10.0], [99.0])), 1)
+        self.assertEqual(self.observe(engine, [1], [11.0], [99.0]), [])
+        now.return_value = 1300.0
+        self.assertEqual(len(self.observe(engine, [1], [12.0], [99.0])), 1)
+
+    def test_devices_have_their_own_state(self, now):
+        engine = RuleEngine([GRIP_RULE._replace(duration=0.0)])
+        # Readings of several devices arrive interleaved and out of order
+        alerts = self.observe(engine, [7, 3, 7, 3, 7], [12.0, 10.0, 11.0, 11.0, 10.0], [99.0, 50.0, 99.0, 99.0, 10.0])
+        self.assertEqual([(alert['device'], alert['timestamp'], alert['count']) for alert in alerts],
+                         [(3, 11.0, 1), (7, 11.0, 2)])
+        # Many devices grow the state arrays
+        self.assertEqual(len(self.observe(engine, list(range(100, 140)), [10.0] * 40, [99.0] * 40)), 40)
+        self.assertEqual(self.observe(engine, [3, 7], [13.0, 13.0], [99.0, 99.0]), [])
+
+    def test_empty_batches_and_rule_sets(self, now):
+        self.assertEqual(self.observe(RuleEngine([GRIP_RULE]), [], [], []), [])
+        self.assertEqual(self.observe(RuleEngine([]), [1], [10.0], [99.0]), [])
+
+
+class RuleNotificationTests(TestCase):
+    """Notifications raised for alert rules"""
+
+    def test_notifications_for_the_device_patient(self):
+        device = make_device('D1')
+        alerts = [
+            {'device': device.pk, 'rule': GRIP_RULE, 'value': 99.0, 'since': 10.0, 'timestamp': 12.0, 'count': 3},
+            {'device': device.pk + 1, 'rule': GRIP_RULE, 'value': 99.0, 'since': 10.0, 'timestamp': 12.0, 'count': 1},
+        ]
+        with self.assertNumQueries(1):
+            notifications = rule_notifications(alerts)
+        (device_id, notification), = notifications
+        self.assertEqual((device_id, notification.user_id), ('D1', device.patient.user_id))
+        self.assertEqual(notification.title, 'Grip overload on D1')
+        self.assertEqual(notification.message, 'Grip force is 99 (> 95) for 2 s (3 reading(s) in this batch).')
+        self.assertEqual(rule_notifications([]), [])
+
+    @mock.patch('dashboard.alert_rules.now_epoch', return_value=1000.0)
+    def test_check_rules_dispatches_the_notifications(self, now):
+        device = make_device('D1')
+        with mock.patch('dashboard.alert_rules._engine', RuleEngine([GRIP_RULE._replace(duration=0.0)])), \
+                mock.patch('dashboard.alert_rules.dispatch', side_effect=len) as dispatch:
+            self.assertEqual(check_rules(np.array([device.pk]), np.array([10.0]), {'grip_force': np.array([99.0])}), 1)
+        (events,), _ = dispatch.call_args
+        self.assertEqual(events[0][0], 'D1')
+
+    def test_system_health_warnings(self):
+        rules = [AlertRule('low', 'battery_level', '<', 90.0, title='Low battery')]
+        with mock.patch('dashboard.alert_rules._engine', RuleEngine(rules)):
+            health = self.client.get('/dashboard/api/system-health/').json()
+        self.assertEqual(health['overall_status'], 'warning')
+        self.assertEqual(health['alerts'], [{'type': 'warning', 'title': 'Low battery',
+                                             'message': 'Battery level is 85 (< 90)'}])
+        with mock.patch('dashboard.alert_rules._engine', RuleEngine(DEFAULT_ALERT_RULES)):
+            self.assertEqual(self.client.get('/dashboard/api/system-health/').json()['overall_status'], 'healthy')
+
+
+@override_settings(CACHES=NOTIFICATION_CACHES)
+class NotificationDispatcherTests(TestCase):
+    """Buffered, digesting notification writes"""
+
+    def setUp(self):
+        caches['notifications'].clear()
+        self.user = User.objects.create(username='patient')
+        self.dispatcher = NotificationDispatcher(flush_interval=3600, flush_size=100)
+        self.addCleanup(self.dispatcher.flush)
+
+    def event(self, title, device_id='D1', notification_type='error'):
+        return device_id, Notification(user=self.user, notification_type=notification_type, title=title,
+                                       message=f'{title}.')
+
+    def test_events_of_a_key_collapse_into_a_digest(self):
+        events = [self.event(f'Alert {index}') for index in range(3)]
+        events += [self.event('Other device', device_id='D2'), self.event('Battery', notification_type='battery_low')]
+        self.assertEqual(self.dispatcher.dispatch(events), 5)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(self.dispatcher.stats()['pending_digests'], 3)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.dispatcher.flush(), 3)
+        digest = Notification.objects.get(title='Alert 2 (x3)')
+        self.assertTrue(digest.message.startswith('Alert 2. Repeated 3 times in '))
+        self.assertEqual(set(Notification.objects.values_list('title', flat=True)),
+                         {'Alert 2 (x3)', 'Other device', 'Battery'})
+        self.assertEqual(self.dispatcher.stats(), {'pending_events': 0, 'pending_digests': 0, 'flushes': 1,
+                                                   'written': 3, 'collapsed': 2})
+        self.assertEqual(self.dispatcher.flush(), 0)
+
+    def test_flush_size_and_interval_trigger_a_flush(self):
+        dispatcher = NotificationDispatcher(flush_interval=3600, flush_size=2)
+        dispatcher.dispatch([self.event('First')])
+        self.assertFalse(Notification.objects.exists())
+        dispatcher.dispatch([self.event('Second', device_id='D2')])
+        self.assertEqual(Notification.objects.count(), 2)
+
+        dispatcher = NotificationDispatcher(flush_interval=0, flush_size=100)
+        dispatcher.dispatch([self.event('Third')])
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(dispatcher.dispatch([]), 0)
+        self.assertIsNone(dispatcher._timer)
+
+    def test_timer_flushes_a_lone_event(self):
+        dispatcher = NotificationDispatcher(flush_interval=0.05, flush_size=100)
+        flushed = threading.Event()
+        with mock.patch.object(dispatcher, 'flush', side_effect=flushed.set):
+            dispatcher.dispatch([self.event('Lone')])
+            self.assertTrue(flushed.wait(5))
+
+    def test_failed_flush_requeues_the_digests(self):
+        self.dispatcher.dispatch([self.event('First'), self.event('Second')])
+        with mock.patch.object(Notification.objects, 'bulk_create', side_effect=OperationalError('locked')), \
+                self.assertLogs('dashboard.notification_dispatch', 'WARNING'):
+            self.assertEqual(self.dispatcher.flush(), 0)
+        self.assertIsNotNone(self.dispatcher._timer)
+        self.dispatcher.dispatch([self.event('Third')])
+        self.assertEqual(self.dispatcher.stats()['pending_events'], 3)
+        self.assertEqual(self.dispatcher.flush(), 1)
+        digest, = Notification.objects.all()
+        self.assertEqual(digest.title, 'Third (x3)')
+        self.assertEqual(self.dispatcher.stats()['collapsed'], 2)
+
+    def test_flush_updates_the_poll_state(self):
+        self.assertEqual(unread_count(self.user.pk), 0)
+        token = state_token(self.user.pk)
+        self.dispatcher.dispatch([self.event('First'), self.event('Second', device_id='D2')])
+        self.dispatcher.flush()
+        self.assertEqual(unread_count(self.user.pk), 2)
+        self.assertNotEqual(state_token(self.user.pk), token)
+
+    def test_process_dispatcher_is_flushed_at_exit(self):
+        with mock.patch('dashboard.notification_dispatch._dispatcher', None), \
+                mock.patch('dashboard.notification_dispatch.atexit.register') as register:
+            dispatcher = get_dispatcher()
+            self.assertIs(get_dispatcher(), dispatcher)
+            register.assert_called_once_with(dispatcher.flush)
+            self.assertEqual(dispatch([self.event('First')]), 1)
+            self.assertEqual(dispatcher.flush(), 1)
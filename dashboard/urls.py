@@ -5,6 +5,7 @@ from .notification_views import (
     DeviceReconnectView, NotificationLogView, SystemHealthView,
     ActivityLogView
 )
+from . import stream_views, telemetry_views
 from .seo_utils import generate_sitemap, generate_robots_txt, generate_manifest_json
 
 urlpatterns = [
@@ -29,6 +30,17 @@ urlpatterns = [
     path('api/emergency-stop/', views.emergency_stop_api, name='emergency_stop_api'),
     path('api/device-control/', views.device_control_api, name='device_control_api'),
     
+    # Telemetry API endpoints
+    path('api/telemetry/ingest/', telemetry_views.telemetry_ingest_api, name='telemetry_ingest_api'),
+    path('api/analytics/response-time/', telemetry_views.response_time_api, name='response_time_api'),
+    path('api/devices/<str:device_id>/analytics/', telemetry_views.analytics_data_api, name='analytics_data_api'),
+    path('api/devices/<str:device_id>/history/', telemetry_views.sensor_history_api, name='sensor_history_api'),
+    path('api/devices/<str:device_id>/readings/', telemetry_views.sensor_readings_api, name='sensor_readings_api'),
+    path('api/devices/<str:device_id>/export/', telemetry_views.telemetry_export_api, name='telemetry_export_api'),
+    path('api/devices/<str:device_id>/stream/', stream_views.sensor_stream_api, name='sensor_stream_api'),
+    path('api/devices/<str:device_id>/live/', stream_views.live_readings_api, name='live_readings_api'),
+    path('api/live/hub/', stream_views.live_hub_stats_api, name='live_hub_stats_api'),
+    
     # Medical API endpoints
     path('api/xray-analysis/', views.xray_analysis_api, name='xray_analysis_api'),
     path('api/save-prescription/', views.save_prescription_api, name='save_prescription_api'),
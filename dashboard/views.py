@@ -11,6 +11,10 @@ from .models import (
     MedicalRecord, Prescription, Appointment, 
     DeviceAnalytics, Notification
 )
+from .live import latest_reading
+from api.commands import command_dict, enqueue
+from api.emergency import trigger
+from api.state import UnknownDevice, default_device_id
 import random
 import json
 import base64
@@ -63,6 +67,31 @@ def impact_view(request):
 
 # API endpoint for real-time sensor data
 def sensor_data_api(request):
+    # Latest ingested reading of ?device=<device_id>, served from the live ring buffer
+    device_id = request.GET.get('device')
+    if device_id:
+        reading = latest_reading(device_id)
+        if reading is None:
+            return JsonResponse({'status': 'error', 'message': 'No live data for this device'}, status=404)
+        status = 'Error' if reading['error_code'] else 'Normal' if reading['is_calibrated'] else 'Calibrating'
+        return JsonResponse({
+            'device_id': device_id,
+            'grip_force': reading['grip_force'],
+            'emg_signal': reading['emg_signal'],
+            'temperature': reading['temperature'],
+            'battery': reading['battery_level'],
+            'status': status,
+            'error_code': reading['error_code'],
+            'finger_sensors': {
+                'thumb': reading['thumb_flex'],
+                'index': reading['index_flex'],
+                'middle': reading['middle_flex'],
+                'ring': reading['ring_flex'],
+                'pinky': reading['pinky_flex']
+            },
+            'timestamp': reading['timestamp']
+        })
+
     # Simulated sensor data for demo purposes
     data = {
         'grip_force': round(random.uniform(0, 100), 1),
@@ -85,8 +114,15 @@ def sensor_data_api(request):
 @csrf_exempt
 def emergency_stop_api(request):
     if request.method == 'POST':
-        # In a real application, this would send a stop signal to the bionic hand
-        return JsonResponse({'status': 'success', 'message': 'Emergency stop activated'})
+        # Same stop as the /api/emergency-stop/ fast lane (api.emergency)
+        try:
+            data = json.loads(request.body or b'{}')
+        except json.JSONDecodeError:
+            data = {}
+        try:
+            return JsonResponse(trigger(data.get('device') or request.GET.get('device') or default_device_id()))
+        except UnknownDevice as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
 
 # API endpoint for device control
@@ -97,12 +133,18 @@ def device_control_api(request):
             data = json.loads(request.body)
             control_type = data.get('type')
             value = data.get('value')
-            
-            # In a real application, this would send control signals to the device
+            if not control_type:
+                return JsonResponse({'status': 'error', 'message': 'Control type is required'})
+
+            # Delivered to the device through its command queue (api.commands)
+            command = enqueue(data.get('device') or default_device_id(), control_type, {'value': value})
             return JsonResponse({
                 'status': 'success', 
-                'message': f'Control command sent: {control_type} = {value}'
+                'message': f'Control command queued: {control_type} = {value}',
+                'command': command_dict(command)
             })
+        except UnknownDevice as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)})
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
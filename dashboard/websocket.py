@@ -0,0 +1,195 @@
+"""
+WebSocket endpoint per device, served by the ASGI app at /ws/devices/<device_id>/
+One connection carries live telemetry down and control commands up, as
+JSON text messages:
+
+    down  {"type": "telemetry", "id": <ring cursor>, "readings": [...]}
+          {"type": "gap", "lost": <readings overwritten before they were sent>}
+          {"type": "state", "device_state": {...}}
+          {"type": "ack", "id": <command id>, "success": ..., "message": ..., "device_state": {...},
+           "queued": <DeviceCommand id the device receives the command as, or null>}
+          {"type": "pong", "id": <ping id>}
+          {"type": "error", "id": <message id or null>, "message": ...}
+    up    {"type": "command", "id": <command id>, "command": "start", "version": <optional>}
+          {"type": "ping", "id": <ping id>}
+
+Every command is acknowledged with its id. A command that changes the
+state is queued for the device (api.commands) like one sent over HTTP.
+State changes, whichever connection or HTTP request made them, reach all
+connections of the device through the channel layer. Connect with
+?last_event_id=<ring cursor> to resume telemetry after a reconnect.
+
+With ?format=compact telemetry messages carry a dashboard.compact frame as
+"frame" instead of "readings". With ?format=binary a {"type": "fields", ...}
+message with the compact header comes first and telemetry is sent as
+binary messages: the ring cursor as <Q>, then a binary compact frame.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import struct
+import time
+from urllib.parse import parse_qs, unquote
+
+from asgiref.sync import sync_to_async
+
+from api.commands import enqueue
+from api.emergency import get_executor, reserved_trigger
+from api.state import StateConflict, TRANSITIONS, apply_command, get_state
+
+from .channel_layers import device_group, get_channel_layer
+from .compact import CompactEncoder
+from .hub import get_hub
+from .models import BionicDevice
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_PATH = re.compile(r'^/ws/devices/(?P<device_id>[^/]+)/$')
+
+# Close codes: application-defined range 4000-4999
+CLOSE_NOT_FOUND = 4404
+
+BINARY_CURSOR = struct.Struct('<Q')
+
+dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+class DeviceSocket:
+    """One accepted WebSocket connection of a device"""
+
+    def __init__(self, device_id: str, scope, receive, send):
+        self.device_id = device_id
+        self.scope = scope
+        self._receive = receive
+        self._send = send
+        self._send_lock = asyncio.Lock()
+        self.layer = get_channel_layer()
+        self.group = device_group(device_id)
+        self.channel = None
+
+    async def send_json(self, message):
+        # Tasks share the socket; keep each message in one piece
+        async with self._send_lock:
+            await self._send({'type': 'websocket.send', 'text': dumps(message)})
+
+    async def run(self):
+        self.channel = await self.layer.new_channel()
+        await self.layer.group_add(self.group, self.channel)
+        tasks = []
+        try:
+            await self._send({'type': 'websocket.accept'})
+            await self.send_json({'type': 'state',
+                                  'device_state': await sync_to_async(get_state)(self.device_id)})
+            tasks = [asyncio.ensure_future(self.read_socket()),
+                     asyncio.ensure_future(self.pump_telemetry(self.resume_cursor())),
+                     asyncio.ensure_future(self.pump_layer())]
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    logger.error(f"WebSocket of {self.device_id} failed", exc_info=task.exception())
+                    await self._send({'type': 'websocket.close', 'code': 1011})
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.layer.group_discard(self.group, self.channel)
+
+    def resume_cursor(self):
+        values = parse_qs(self.scope.get('query_string', b'').decode()).get('last_event_id')
+        try:
+            return max(int(values[0]), 0) if values else None
+        except ValueError:
+            return None
+
+    async def read_socket(self):
+        """Handle client messages until the client disconnects"""
+        while True:
+            event = await self._receive()
+            if event['type'] == 'websocket.disconnect':
+                return
+            if event['type'] != 'websocket.receive':
+                continue
+            try:
+                message = json.loads(event.get('text') or event.get('bytes') or b'')
+            except ValueError:
+                await self.send_json({'type': 'error', 'id': None, 'message': 'Invalid JSON data'})
+                continue
+            if not isinstance(message, dict):
+                await self.send_json({'type': 'error', 'id': None, 'message': 'Expected a JSON object'})
+            elif message.get('type') == 'command':
+                await self.handle_command(message)
+            elif message.get('type') == 'ping':
+                await self.send_json({'type': 'pong', 'id': message.get('id')})
+            else:
+                await self.send_json({'type': 'error', 'id': message.get('id'),
+                                      'message': f"Unknown message type: {message.get('type')}"})
+
+    async def handle_command(self, message):
+        command_id = message.get('id')
+        command = message.get('command')
+        if command not in TRANSITIONS:
+            await self.send_json({'type': 'error', 'id': command_id, 'message': 'Unknown command'})
+            return
+        if command == 'emergency_stop':
+            stop = await asyncio.get_running_loop().run_in_executor(
+                get_executor(), reserved_trigger, self.device_id, time.time())
+            await self.send_json({'type': 'ack', 'id': command_id, 'success': stop['status'] == 'success',
+                                  'message': stop['message'], 'device_state': stop['device_state'],
+                                  'queued': stop['command']['command_id']})
+            return
+        try:
+            version = int(message['version']) if message.get('version') is not None else None
+            success, text, state = await sync_to_async(apply_command)(self.device_id, command, version)
+        except (StateConflict, TypeError, ValueError) as exc:
+            await self.send_json({'type': 'ack', 'id': command_id, 'success': False, 'message': str(exc),
+                                  'device_state': await sync_to_async(get_state)(self.device_id), 'queued': None})
+            return
+        queued = (await sync_to_async(enqueue)(self.device_id, command)).pk if success else None
+        await self.send_json({'type': 'ack', 'id': command_id, 'success': success, 'message': text,
+                              'device_state': state, 'queued': queued})
+        if success:
+            await self.layer.group_send(self.group, {'type': 'device.state', 'device_state': state})
+
+    async def pump_telemetry(self, cursor):
+        output = parse_qs(self.scope.get('query_string', b'').decode()).get('format', ['json'])[0]
+        encoder = CompactEncoder() if output in ('compact', 'binary') else None
+        if output == 'binary':
+            await self.send_json(dict(encoder.header(), type='fields'))
+        async for batch in get_hub().subscribe(self.device_id, cursor):
+            if batch is None:
+                # The server pings idle WebSockets itself
+                continue
+            if batch.lost:
+                await self.send_json({'type': 'gap', 'lost': batch.lost})
+            if not batch.parts:
+                continue
+            if output == 'binary':
+                body = BINARY_CURSOR.pack(batch.cursor) + encoder.encode_binary(batch.rows())
+                async with self._send_lock:
+                    await self._send({'type': 'websocket.send', 'bytes': body})
+            elif encoder is not None:
+                await self.send_json({'type': 'telemetry', 'id': batch.cursor, 'frame': encoder.encode(batch.rows())})
+            else:
+                await self.send_json({'type': 'telemetry', 'id': batch.cursor, 'readings': batch.records()})
+
+    async def pump_layer(self):
+        """Forward channel layer messages to the client"""
+        while True:
+            message = await self.layer.receive(self.channel)
+            if message.get('type') == 'device.state':
+                await self.send_json({'type': 'state', 'device_state': message['device_state']})
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for websocket connections"""
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+    match = WEBSOCKET_PATH.match(scope['path'])
+    device_id = unquote(match['device_id']) if match else None
+    if device_id is None or not await BionicDevice.objects.filter(device_id=device_id).aexists():
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    await DeviceSocket(device_id, scope, receive, send).run()
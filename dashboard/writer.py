@@ -0,0 +1,196 @@
+"""
+Single-writer batching thread for high-rate inserts
+SQLite allows one writer at a time. Rather than letting every request thread
+open its own write transaction and wait on the database lock, inserts are
+queued to one thread that commits everything queued within a short window
+in a single transaction (group commit).
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import List, Optional, Sequence
+
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from .db_profile import batch_writer_enabled
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _Write:
+    __slots__ = ('objects', 'batch_size', 'future')
+
+    def __init__(self, objects: Sequence[models.Model], batch_size: Optional[int]):
+        self.objects = list(objects)
+        self.batch_size = batch_size
+        self.future = Future()
+
+
+class BatchWriter:
+    """
+    Background thread committing queued bulk inserts in groups
+
+    A group is closed when it holds max_rows objects or max_delay seconds
+    after its first write arrived, whichever comes first. Objects of the
+    same model across the group are inserted with one bulk_create. If the
+    group transaction fails, each write is retried on its own so one bad
+    batch only fails its own future.
+    """
+
+    def __init__(self, max_rows: Optional[int] = None, max_delay: Optional[float] = None):
+        self.max_rows = max_rows or getattr(settings, 'DB_WRITER_MAX_ROWS', 5000)
+        self.max_delay = max_delay if max_delay is not None else getattr(settings, 'DB_WRITER_MAX_DELAY', 0.02)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.groups = 0
+        self.rows = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-batch-writer', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10):
+        """Commit everything queued so far, then end the thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, objects: Sequence[models.Model], batch_size: Optional[int] = None) -> Future:
+        """Queue objects for insertion; the future resolves to the row count once committed"""
+        write = _Write(objects, batch_size)
+        self.start()
+        self._queue.put(write)
+        return write.future
+
+    def _run(self):
+        try:
+            stopping = False
+            while not stopping:
+                first = self._queue.get()
+                if first is _STOP:
+                    break
+                group, rows = [first], len(first.objects)
+                deadline = time.monotonic() + self.max_delay
+                while rows < self.max_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        write = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if write is _STOP:
+                        stopping = True
+                        break
+                    group.append(write)
+                    rows += len(write.objects)
+                self._commit(group)
+        finally:
+            connection.close()
+
+    def _commit(self, group: List[_Write]):
+        # Writes whose caller gave up waiting (bulk_insert timed out) were cancelled and inserted by the caller
+        group = [write for write in group if write.future.set_running_or_notify_cancel()]
+        if not group:
+            return
+        try:
+            with transaction.atomic():
+                by_model = defaultdict(list)
+                for write in group:
+                    by_model[type(write.objects[0]) if write.objects else None].append(write)
+                for model, writes in by_model.items():
+                    if model is not None:
+                        model.objects.bulk_create([obj for write in writes for obj in write.objects],
+                                                  batch_size=writes[0].batch_size)
+        except Exception as e:
+            logger.error(f"Group commit of {len(group)} writes failed, retrying one by one: {e}")
+            for write in group:
+                self._commit_one(write)
+            return
+
+        self.groups += 1
+        for write in group:
+            self.rows += len(write.objects)
+            write.future.set_result(len(write.objects))
+
+    def _commit_one(self, write: _Write):
+        try:
+            with transaction.atomic():
+                if write.objects:
+                    type(write.objects[0]).objects.bulk_create(write.objects, batch_size=write.batch_size)
+        except Exception as e:
+            write.future.set_exception(e)
+        else:
+            self.rows += len(write.objects)
+            write.future.set_result(len(write.objects))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> BatchWriter:
+    """The process-wide writer, started on first use and flushed at exit"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = BatchWriter()
+            atexit.register(_writer.stop)
+        return _writer
+
+
+def bulk_insert(objects: Sequence[models.Model], batch_size: Optional[int] = None, wait: bool = True) -> int:
+    """
+    Insert model instances through the batching writer when the DB profile
+    enables it, or directly in one transaction otherwise
+
+    Inside a caller's transaction the insert always runs directly so that it
+    commits or rolls back with that transaction. With wait=False the call
+    returns as soon as the write is queued and a failure is only logged (for
+    log-style rows nobody reads back at once). A waiting call gives up on
+    the writer after DB_WRITER_TIMEOUT seconds: a write it has not picked
+    up yet is inserted directly instead, one it is committing raises
+    TimeoutError.
+    """
+    if not objects:
+        return 0
+    if not batch_writer_enabled() or connection.in_atomic_block:
+        with transaction.atomic():
+            type(objects[0]).objects.bulk_create(objects, batch_size=batch_size)
+        return len(objects)
+
+    future = get_writer().submit(objects, batch_size)
+    if not wait:
+        future.add_done_callback(_log_failure)
+        return len(objects)
+    timeout = getattr(settings, 'DB_WRITER_TIMEOUT', 30.0)
+    try:
+        return future.result(timeout)
+    except FutureTimeout:
+        pass
+    if future.cancel():
+        # Still queued, so the writer is stalled or gone: insert here instead
+        logger.warning(f"Batch writer did not take a write within {timeout} s; inserting directly")
+        with transaction.atomic():
+            type(objects[0]).objects.bulk_create(objects, batch_size=batch_size)
+        return len(objects)
+    # Already in a group commit; its outcome is unknown, so do not insert twice
+    raise TimeoutError(f"Batch writer did not commit a write within {timeout} s")
+
+
+def _log_failure(future: Future):
+    if future.exception() is not None:
+        logger.error(f"Queued write failed: {future.exception()}")